@@ -8,13 +8,150 @@ import numpy as np #pip install numpy
 import msgpack
 import time
 import math
+import copy
 import logging
 
+class RpcFuture:
+    """
+    Pending result of a call made through `VehicleClient.pipelined()`
+
+    `join()` blocks until the reply has arrived and returns the same value the blocking API would have returned
+    """
+    def __init__(self, future, decode = None):
+        self._future = future
+        self._decode = decode
+        self._is_done = False
+        self._value = None
+
+    def join(self):
+        if not self._is_done:
+            raw = self._future.get() if self._future is not None else None
+            self._value = self._decode(raw) if self._decode is not None else raw
+            self._is_done = True
+        return self._value
+
+class _DeferredCall(BaseException):
+    # BaseException so that a broad `except Exception` inside an API method doesn't swallow it
+    def __init__(self, future):
+        self.future = future
+
+class _CaptureTransport:
+    """Stands in for the msgpackrpc client while a pipelined call is issued, sending the first blocking call with call_async"""
+    def __init__(self, rpc_client):
+        self._rpc_client = rpc_client
+
+    def call(self, method, *args):
+        raise _DeferredCall(self._rpc_client.call_async(method, *args))
+
+    def __getattr__(self, name):
+        return getattr(self._rpc_client, name)
+
+class _ReplayTransport:
+    """Hands the already received reply to the API method so it can decode it, any further call goes out as usual"""
+    def __init__(self, rpc_client, reply):
+        self._rpc_client = rpc_client
+        self._reply = reply
+        self._is_replayed = False
+
+    def call(self, method, *args):
+        if not self._is_replayed:
+            self._is_replayed = True
+            return self._reply
+        return self._rpc_client.call(method, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._rpc_client, name)
+
+class PipelinedClient:
+    """
+    View of a client whose APIs return an `RpcFuture` instead of blocking
+
+    Requests are sent right away over the connection of the wrapped client, so independent calls overlap
+    and the total wait is close to that of the slowest call. Get one with `VehicleClient.pipelined()`:
+
+        pipe = client.pipelined()
+        state, collision = pipe.getMultirotorState(), pipe.simGetCollisionInfo()
+        state, collision = state.join(), collision.join()
+
+    The reply is decoded by the blocking API itself, so results are identical to the blocking calls.
+    Methods that make more than one RPC only pipeline the first one, the rest are made when joining.
+    Like the wrapped client, this must only be used from one thread.
+    """
+    def __init__(self, vehicle_client):
+        self._vehicle_client = vehicle_client
+
+    def __getattr__(self, name):
+        api = getattr(type(self._vehicle_client), name, None)
+        if not callable(api):
+            return getattr(self._vehicle_client, name)
+
+        def pipelined_api(*args, **kwargs):
+            return self._issue(api, args, kwargs)
+        pipelined_api.__name__ = name
+        pipelined_api.__doc__ = api.__doc__
+        return pipelined_api
+
+    def _with_transport(self, transport):
+        shadow = copy.copy(self._vehicle_client)
+        shadow.client = transport
+        return shadow
+
+    def _issue(self, api, args, kwargs):
+        rpc_client = self._vehicle_client.client
+        try:
+            result = api(self._with_transport(_CaptureTransport(rpc_client)), *args, **kwargs)
+        except _DeferredCall as deferred:
+            return RpcFuture(deferred.future,
+                             lambda reply: api(self._with_transport(_ReplayTransport(rpc_client, reply)), *args, **kwargs))
+
+        # the API didn't make a blocking call: either it is already a *Async API, or it never talks to the server
+        if isinstance(result, msgpackrpc.future.Future):
+            return RpcFuture(result)
+        return RpcFuture(None, lambda _: result)
+
 class VehicleClient:
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
+    def __init__(self, ip = "", port = 41451, timeout_value = 3600, compact_types = False):
+        """
+        Args:
+            ip (str, optional): IP address of the simulator, localhost if empty
+            port (int, optional): RPC port of the simulator
+            timeout_value (int, optional): Timeout of RPC calls in seconds
+            compact_types (bool, optional): Return the `__slots__` based types, e.g. `CompactPose`, from the state and pose
+                                            getters. They are cheaper to decode when polling at high rates, see `compact_type()`
+        """
         if (ip == ""):
             ip = "127.0.0.1"
         self.client = msgpackrpc.Client(msgpackrpc.Address(ip, port), timeout = timeout_value, pack_encoding = 'utf-8', unpack_encoding = 'utf-8')
+        self.compact_types = compact_types
+
+    def _state_type(self, msgpack_type):
+        return compact_type(msgpack_type) if self.compact_types else msgpack_type
+
+    def pipelined(self):
+        """
+        Returns a view of this client where every API returns an `RpcFuture` instead of waiting for the reply
+
+        The view shares this client's connection, see `PipelinedClient` for details
+
+        Returns:
+            PipelinedClient:
+        """
+        return PipelinedClient(self)
+
+    def close(self):
+        """
+        Closes the connection to the simulator, the client cannot make calls afterwards
+        """
+        self.client.close()
+        # msgpackrpc gives each client its own IO loop and never closes it, it is only reachable through private
+        # attributes, so they are looked up defensively in case msgpack-rpc-python changes them
+        loop = getattr(self.client, '_loop', None)
+        detach = getattr(loop, 'dettach_periodic_callback', None)
+        if detach is not None:
+            detach()
+        ioloop = getattr(loop, '_ioloop', None)
+        if ioloop is not None and hasattr(ioloop, 'close'):
+            ioloop.close(all_fds = True)
 
 #----------------------------------- Common vehicle APIs ---------------------------------------------
     def reset(self):
@@ -302,7 +439,7 @@ class VehicleClient:
 #camera control
 #simGetImage returns compressed png in array of bytes
 #image_type uses one of the ImageType members
-    def simGetImages(self, requests, vehicle_name = '', external = False):
+    def simGetImages(self, requests, vehicle_name = '', external = False, as_numpy = False):
         """
         Get multiple images
 
@@ -312,12 +449,14 @@ class VehicleClient:
             requests (list[ImageRequest]): Images required
             vehicle_name (str, optional): Name of vehicle associated with the camera
             external (bool, optional): Whether the camera is an External Camera
+            as_numpy (bool, optional): Decode pixels into NumPy arrays, see `ImageResponse.from_msgpack_numpy()`
 
         Returns:
             list[ImageResponse]:
         """
         responses_raw = self.client.call('simGetImages', requests, vehicle_name, external)
-        return [ImageResponse.from_msgpack(response_raw) for response_raw in responses_raw]
+        decode = ImageResponse.from_msgpack_numpy if as_numpy else ImageResponse.from_msgpack
+        return [decode(response_raw) for response_raw in responses_raw]
 
 
 
@@ -480,7 +619,7 @@ class VehicleClient:
             Pose:
         """
         pose = self.client.call('simGetVehiclePose', vehicle_name)
-        return Pose.from_msgpack(pose)
+        return self._state_type(Pose).from_msgpack(pose)
 
     def simSetTraceLine(self, color_rgba, thickness=1.0, vehicle_name = ''):
         """
@@ -506,7 +645,7 @@ class VehicleClient:
             Pose:
         """
         pose = self.client.call('simGetObjectPose', object_name)
-        return Pose.from_msgpack(pose)
+        return self._state_type(Pose).from_msgpack(pose)
 
     def simSetObjectPose(self, object_name, pose, teleport = True):
         """
@@ -525,6 +664,39 @@ class VehicleClient:
         """
         return self.client.call('simSetObjectPose', object_name, pose, teleport)
 
+    def simGetObjectPoses(self, object_names):
+        """
+        Batch version of `simGetObjectPose`
+
+        The requests are pipelined on this client's connection, so the total time is close to a single round trip
+        instead of growing with the number of objects
+
+        Args:
+            object_names (list[str]): Objects to get the Pose of
+
+        Returns:
+            list[Pose]: Poses in the order of object_names
+        """
+        pipeline = self.pipelined()
+        futures = [pipeline.simGetObjectPose(object_name) for object_name in object_names]
+        return [future.join() for future in futures]
+
+    def simSetObjectPoses(self, object_names, poses, teleport = True):
+        """
+        Batch version of `simSetObjectPose`, requests are pipelined like in `simGetObjectPoses`
+
+        Args:
+            object_names (list[str]): Names of the objects(actors) to move
+            poses (list[Pose] or PoseArray): Desired Pose of each object
+            teleport (bool, optional): Whether to move the objects immediately without affecting their velocity
+
+        Returns:
+            list[bool]: If each move was successful
+        """
+        pipeline = self.pipelined()
+        futures = [pipeline.simSetObjectPose(object_name, pose, teleport) for object_name, pose in zip(object_names, poses)]
+        return [future.join() for future in futures]
+
     def simGetObjectScale(self, object_name):
         """
         Gets scale of an object in the world
@@ -815,7 +987,7 @@ class VehicleClient:
             KinematicsState: Ground truth of the vehicle
         """
         kinematics_state = self.client.call('simGetGroundTruthKinematics', vehicle_name)
-        return KinematicsState.from_msgpack(kinematics_state)
+        return self._state_type(KinematicsState).from_msgpack(kinematics_state)
     simGetGroundTruthKinematics.__annotations__ = {'return': KinematicsState}
 
     def simSetKinematics(self, state, ignore_collision, vehicle_name = ''):
@@ -904,16 +1076,18 @@ class VehicleClient:
         """
         return DistanceSensorData.from_msgpack(self.client.call('getDistanceSensorData', distance_sensor_name, vehicle_name))
 
-    def getLidarData(self, lidar_name = '', vehicle_name = ''):
+    def getLidarData(self, lidar_name = '', vehicle_name = '', as_numpy = False):
         """
         Args:
             lidar_name (str, optional): Name of Lidar to get data from, specified in settings.json
             vehicle_name (str, optional): Name of vehicle to which the sensor corresponds to
+            as_numpy (bool, optional): Return the point cloud as an (N, 3) array, see `LidarData.from_msgpack_numpy()`
 
         Returns:
             LidarData:
         """
-        return LidarData.from_msgpack(self.client.call('getLidarData', lidar_name, vehicle_name))
+        lidar_data = self.client.call('getLidarData', lidar_name, vehicle_name)
+        return LidarData.from_msgpack_numpy(lidar_data) if as_numpy else LidarData.from_msgpack(lidar_data)
 
     def simGetLidarSegmentation(self, lidar_name = '', vehicle_name = ''):
         """
@@ -1126,8 +1300,8 @@ class VehicleClient:
 
 #----------------------------------- Multirotor APIs ---------------------------------------------
 class MultirotorClient(VehicleClient, object):
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
-        super(MultirotorClient, self).__init__(ip, port, timeout_value)
+    def __init__(self, ip = "", port = 41451, timeout_value = 3600, compact_types = False):
+        super(MultirotorClient, self).__init__(ip, port, timeout_value, compact_types)
 
     def takeoffAsync(self, timeout_sec = 20, vehicle_name = ''):
         """
@@ -1575,7 +1749,7 @@ class MultirotorClient(VehicleClient, object):
         Returns:
             MultirotorState:
         """
-        return MultirotorState.from_msgpack(self.client.call('getMultirotorState', vehicle_name))
+        return self._state_type(MultirotorState).from_msgpack(self.client.call('getMultirotorState', vehicle_name))
     getMultirotorState.__annotations__ = {'return': MultirotorState}
 #query rotor states
     def getRotorStates(self, vehicle_name = ''):
@@ -1594,8 +1768,8 @@ class MultirotorClient(VehicleClient, object):
 
 #----------------------------------- Car APIs ---------------------------------------------
 class CarClient(VehicleClient, object):
-    def __init__(self, ip = "", port = 41451, timeout_value = 3600):
-        super(CarClient, self).__init__(ip, port, timeout_value)
+    def __init__(self, ip = "", port = 41451, timeout_value = 3600, compact_types = False):
+        super(CarClient, self).__init__(ip, port, timeout_value, compact_types)
 
     def setCarControls(self, controls, vehicle_name = ''):
         """
@@ -0,0 +1,223 @@
+import collections
+import queue
+import threading
+import time
+
+from .client import VehicleClient
+from .types import ImageRequest
+
+Frame = collections.namedtuple('Frame', ['sequence', 'request_time', 'receive_time', 'responses'])
+Frame.__doc__ = """
+Images captured together by a FrameGrabber
+
+Attributes:
+    sequence (int): Increasing number of the capture
+    request_time (float): `time.time()` when the images were requested
+    receive_time (float): `time.time()` when all images were received
+    responses (list[list[ImageResponse]]): Responses of each request set, decoded with `as_numpy=True`
+"""
+
+FrameStats = collections.namedtuple('FrameStats', ['captured', 'dropped', 'consumed', 'fps', 'mean_latency', 'max_latency'])
+FrameStats.__doc__ = """
+Statistics of a FrameGrabber
+
+Attributes:
+    captured (int): Frames received from the simulator
+    dropped (int): Frames discarded because the queue was full, or skipped by `latest()`
+    consumed (int): Frames returned by `get()` or `latest()`
+    fps (float): Captured frames per second since `start()`
+    mean_latency (float): Mean time in seconds between requesting and receiving a frame
+    max_latency (float): Largest time in seconds between requesting and receiving a frame
+"""
+
+class FrameGrabber:
+    """
+    Captures images continuously on background threads, so consumers get frames without waiting on an RPC
+
+    Each worker thread has its own connection to the simulator and captures all request sets as one frame,
+    with the sets pipelined over that connection. Frames go to a bounded queue, and when it is full the oldest
+    frame is dropped, so consumers always see recent images. With more than one worker, frames are queued as
+    each worker receives them, so `get()` can return them out of sequence order; `latest()` returns the most
+    recent queued frame by `Frame.sequence`.
+
+        with FrameGrabber([airsim.ImageRequest("0", airsim.ImageType.Scene, False, False)]) as grabber:
+            frame = grabber.latest()
+            img = frame.responses[0][0].image_data_uint8
+
+    Args:
+        requests (list): Either a list of ImageRequest for the default vehicle, or a list of request sets, each a
+                         list of ImageRequest or a tuple (list of ImageRequest, vehicle_name, external)
+        ip (str, optional): IP address of the simulator
+        port (int, optional): RPC port of the simulator
+        num_workers (int, optional): Number of capture threads, each with its own connection
+        queue_size (int, optional): Number of frames kept for consumers
+        timeout_value (int, optional): RPC timeout of the worker connections
+    """
+    def __init__(self, requests, ip = "", port = 41451, num_workers = 1, queue_size = 2, timeout_value = 3600):
+        if not requests:
+            raise ValueError('FrameGrabber needs at least one ImageRequest')
+        if isinstance(requests[0], ImageRequest):
+            requests = [requests]
+        self.request_sets = [(s, '', False) if isinstance(s, list) else tuple(s) for s in requests]
+
+        self.ip = ip
+        self.port = port
+        self.num_workers = num_workers
+        self.timeout_value = timeout_value
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._workers = []
+        self._clients = []
+        self._error = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._sequence = 0
+        self._captured = 0
+        self._dropped = 0
+        self._consumed = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._start_time = time.time()
+
+    def start(self):
+        """
+        Connects the workers and starts capturing
+        """
+        if self._workers:
+            return self
+        self._stop_event.clear()
+        self._error = None
+        self._reset_stats()
+
+        # connect here so connection errors surface in the caller's thread
+        clients = [VehicleClient(self.ip, self.port, self.timeout_value) for _ in range(self.num_workers)]
+        for client in clients:
+            client.ping()
+        self._clients = clients
+        self._workers = [threading.Thread(target=self._capture_loop, args=(client,), daemon=True) for client in clients]
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        """
+        Stops capturing, waits for the workers to exit and closes their connections, frames already queued can still be read
+        """
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join()
+        for client in self._clients:
+            client.close()
+        self._workers = []
+        self._clients = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _capture_loop(self, client):
+        pipeline = client.pipelined()
+        try:
+            while not self._stop_event.is_set():
+                with self._lock:
+                    sequence = self._sequence
+                    self._sequence += 1
+
+                request_time = time.time()
+                futures = [pipeline.simGetImages(requests, vehicle_name, external, as_numpy = True)
+                           for requests, vehicle_name, external in self.request_sets]
+                responses = [future.join() for future in futures]
+                receive_time = time.time()
+
+                self._put(Frame(sequence, request_time, receive_time, responses))
+        except Exception as error:
+            self._error = error
+            self._stop_event.set()
+
+    def _put(self, frame):
+        latency = frame.receive_time - frame.request_time
+        with self._lock:
+            self._captured += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            while True:
+                try:
+                    self._queue.put_nowait(frame)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def get(self, timeout = None):
+        """
+        Returns the first queued frame, waiting for one if the queue is empty
+
+        Frames are queued in the order the workers receive them, which with several workers is not always their
+        sequence order.
+
+        Args:
+            timeout (float, optional): Seconds to wait, None to wait until a frame arrives
+
+        Returns:
+            Frame: The frame, or None on timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            self._check_error()
+            try:
+                frame = self._queue.get(timeout = 0.1 if deadline is None else max(0, min(0.1, deadline - time.time())))
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    return None
+                continue
+            with self._lock:
+                self._consumed += 1
+            return frame
+
+    def latest(self, timeout = None):
+        """
+        Returns the most recent frame, discarding older queued frames
+
+        Args:
+            timeout (float, optional): Seconds to wait if no frame is queued, None to wait until a frame arrives
+
+        Returns:
+            Frame: The frame, or None on timeout
+        """
+        frame = self.get(timeout)
+        if frame is None:
+            return None
+        while True:
+            try:
+                newer = self._queue.get_nowait()
+            except queue.Empty:
+                return frame
+            with self._lock:
+                self._dropped += 1
+            if newer.sequence > frame.sequence:
+                frame = newer
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            FrameStats: Capture statistics since `start()`
+        """
+        with self._lock:
+            elapsed = time.time() - self._start_time
+            return FrameStats(self._captured, self._dropped, self._consumed,
+                              self._captured / elapsed if elapsed > 0 else 0.0,
+                              self._total_latency / self._captured if self._captured else 0.0,
+                              self._max_latency)
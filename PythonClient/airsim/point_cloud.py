@@ -0,0 +1,216 @@
+import os
+import re
+import functools
+import numpy as np #pip install numpy
+
+from .types import ImageType, Pose, PoseArray, Vector3rArray, QuaternionrArray
+from .utils import get_pfm_array
+
+# headers have a fixed size whatever the point count, so the count can be rewritten in place once all chunks are written
+COUNT_WIDTH = 12
+COUNT_PATTERNS = {'ply': rb'element vertex (\d+)', 'pcd': rb'POINTS (\d+)', 'npy': rb"'shape': \((\d+),\)"}
+NPY_HEADER_SIZE = 256
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+class PointCloudWriter:
+    """
+    Streams point clouds to a binary PLY, PCD or NPY file
+
+    Points are written in bulk with `write()`, which can be called any number of times, e.g. once per Lidar scan.
+    The format is chosen from the file extension. Each point has float32 x, y, z and optionally a uint8 r, g, b color and an int32
+    segmentation label. NPY files hold a 1-d structured array with fields x, y, z, rgb and label, which `np.load` can memory-map.
+
+        with PointCloudWriter('scan.ply', with_color=True) as writer:
+            writer.write(points, colors)
+
+    Args:
+        filename (str): Output file, ending in .ply, .pcd or .npy
+        with_color (bool, optional): Whether points have a color
+        with_segmentation (bool, optional): Whether points have a segmentation label
+        append (bool, optional): Append to a file previously written by this class with the same fields, instead of overwriting it
+    """
+    def __init__(self, filename, with_color = False, with_segmentation = False, append = False):
+        self.format = os.path.splitext(filename)[1].lower().lstrip('.')
+        if self.format not in ('ply', 'pcd', 'npy'):
+            raise ValueError('Unsupported point cloud format: {}, use .ply, .pcd or .npy'.format(filename))
+
+        self.filename = filename
+        self.with_color = with_color
+        self.with_segmentation = with_segmentation
+        self.dtype = self._point_dtype()
+        self.num_points = 0
+
+        if append and os.path.isfile(filename):
+            self._file = open(filename, 'r+b')
+            try:
+                self.num_points = self._read_header_count()
+            except ValueError:
+                self._file.close()
+                raise
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(filename, 'wb')
+            self._file.write(self._header(0))
+
+    def _point_dtype(self):
+        fields = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')]
+        if self.with_color:
+            if self.format == 'ply':
+                fields += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+            elif self.format == 'pcd':
+                # PCL convention, 0x00RRGGBB packed into a float
+                fields += [('rgb', '<u4')]
+            else:
+                fields += [('rgb', 'u1', (3,))]
+        if self.with_segmentation:
+            fields += [('label', '<i4')]
+        return np.dtype(fields)
+
+    def _header(self, num_points):
+        count = str(num_points).zfill(COUNT_WIDTH)
+        if self.format == 'ply':
+            properties = ''.join('property {} {}\n'.format({'f': 'float', 'u': 'uchar', 'i': 'int'}[self.dtype[name].kind], name)
+                                 for name in self.dtype.names)
+            return ('ply\nformat binary_little_endian 1.0\nelement vertex {}\n{}end_header\n'.format(count, properties)).encode('ascii')
+
+        if self.format == 'pcd':
+            names = self.dtype.names
+            sizes = ' '.join(str(self.dtype[name].itemsize) for name in names)
+            types = ' '.join('F' if self.dtype[name].kind == 'f' or name == 'rgb' else 'I' for name in names)
+            return ('# .PCD v0.7 - Point Cloud Data file format\nVERSION 0.7\nFIELDS {}\nSIZE {}\nTYPE {}\nCOUNT {}\n'
+                    'WIDTH {}\nHEIGHT 1\nVIEWPOINT 0 0 0 1 0 0 0\nPOINTS {}\nDATA binary\n').format(
+                        ' '.join(names), sizes, types, ' '.join(['1'] * len(names)), count, count).encode('ascii')
+
+        # the npy header is padded with spaces instead, as it is parsed as a Python literal
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(np.lib.format.dtype_to_descr(self.dtype), num_points)
+        header_len = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2
+        return NPY_MAGIC + np.uint16(header_len).astype('<u2').tobytes() + header.ljust(header_len - 1).encode('latin1') + b'\n'
+
+    def _read_header_count(self):
+        existing = self._file.read(len(self._header(0)))
+        match = re.search(COUNT_PATTERNS[self.format], existing)
+        if match is None or existing != self._header(int(match.group(1))):
+            raise ValueError('{} was not written by PointCloudWriter with the same fields, cannot append to it'.format(self.filename))
+        return int(match.group(1))
+
+    def write(self, points, colors = None, segmentation = None):
+        """
+        Appends a chunk of points
+
+        Args:
+            points (numpy.ndarray): (N, 3) array of x, y, z, or a flat array of N * 3 values
+            colors (numpy.ndarray, optional): (N, 3) uint8 r, g, b, or a single color for all points. Required when with_color is set
+            segmentation (numpy.ndarray, optional): (N,) segmentation IDs. Required when with_segmentation is set
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        chunk = np.empty(points.shape[0], dtype=self.dtype)
+        chunk['x'], chunk['y'], chunk['z'] = points.T
+
+        if self.with_color:
+            if colors is None:
+                raise ValueError('colors are required, the writer was created with with_color=True')
+            colors = np.broadcast_to(np.asarray(colors, dtype=np.uint8), points.shape)
+            if self.format == 'ply':
+                chunk['red'], chunk['green'], chunk['blue'] = colors.T
+            elif self.format == 'pcd':
+                colors = colors.astype(np.uint32)
+                chunk['rgb'] = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+            else:
+                chunk['rgb'] = colors
+
+        if self.with_segmentation:
+            if segmentation is None:
+                raise ValueError('segmentation is required, the writer was created with with_segmentation=True')
+            chunk['label'] = np.broadcast_to(np.asarray(segmentation, dtype=np.int32).reshape(-1), points.shape[:1])
+
+        chunk.tofile(self._file)
+        self.num_points += points.shape[0]
+
+    def close(self):
+        """
+        Writes the final point count into the header and closes the file
+        """
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.num_points))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def write_point_cloud(filename, points, colors = None, segmentation = None):
+    """
+    Writes a whole point cloud at once, see `PointCloudWriter` for the formats and arguments
+    """
+    with PointCloudWriter(filename, with_color = colors is not None, with_segmentation = segmentation is not None) as writer:
+        writer.write(points, colors, segmentation)
+
+@functools.lru_cache(maxsize=16)
+def _camera_rays(width, height, fov_degrees, normalize):
+    """
+    Direction of every pixel's ray in camera frame (x forward, y right, z down), as an (H * W, 3) read-only array
+
+    Rays are scaled to x = 1, or to unit length if normalize is set. Cached since they only depend on the resolution and fov
+    """
+    focal = width / (2.0 * np.tan(np.radians(fov_degrees) / 2.0))
+    u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+    rays = np.stack((np.ones_like(u), (u - width / 2.0) / focal, (v - height / 2.0) / focal), axis=-1).reshape(-1, 3)
+    if normalize:
+        rays /= np.linalg.norm(rays, axis=1, keepdims=True)
+    rays.flags.writeable = False
+    return rays
+
+def depth_to_point_cloud(response, camera_info, max_depth = np.inf, world_frame = True):
+    """
+    Reprojects a float depth image to a point cloud in one vectorized pass
+
+    Args:
+        response (ImageResponse): DepthPlanar or DepthPerspective image requested with pixels_as_float
+        camera_info (CameraInfo): From `simGetCameraInfo()` for the same camera, gives the field of view
+        max_depth (float, optional): Pixels at this depth or further, e.g. the sky, are dropped
+        world_frame (bool, optional): Return points in world frame using the camera pose of the response,
+                                      otherwise in camera frame (x forward, y right, z down)
+
+    Returns:
+        numpy.ndarray: (N, 3) np.float32 array of the points of pixels with a valid depth
+    """
+    if response.image_type not in (ImageType.DepthPlanar, ImageType.DepthPerspective):
+        raise ValueError('Expected a DepthPlanar or DepthPerspective image, got image type {}'.format(response.image_type))
+
+    depth = get_pfm_array(response).reshape(-1)
+    rays = _camera_rays(response.width, response.height, float(camera_info.fov), response.image_type == ImageType.DepthPerspective)
+    valid = np.isfinite(depth) & (depth < max_depth)
+    points = rays[valid] * depth[valid, None]
+
+    if world_frame:
+        camera_pose = PoseArray.from_list([Pose(response.camera_position, response.camera_orientation)])
+        points = camera_pose.transform(Vector3rArray(points)).data
+    return points.astype(np.float32)
+
+def project_to_pixels(points, camera_info, width, height):
+    """
+    Projects world points to pixel coordinates of a camera, the inverse of `depth_to_point_cloud()`
+
+    Args:
+        points (numpy.ndarray): (N, 3) world points
+        camera_info (CameraInfo): From `simGetCameraInfo()`, gives the camera pose and field of view
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+
+    Returns:
+        tuple[numpy.ndarray]: (N, 2) u, v pixel coordinates, nan for points behind the camera, and (N,) planar depths
+    """
+    pose = camera_info.pose
+    inverse_orientation = QuaternionrArray.from_list([pose.orientation]).inverse()
+    local = (Vector3rArray(points) - pose.position).rotate(inverse_orientation).data
+
+    focal = width / (2.0 * np.tan(np.radians(float(camera_info.fov)) / 2.0))
+    depth = local[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pixels = np.stack((local[:, 1] / depth * focal + width / 2.0, local[:, 2] / depth * focal + height / 2.0), axis=-1)
+    pixels[depth <= 0] = np.nan
+    return pixels, depth
@@ -0,0 +1,181 @@
+import itertools
+import os
+import numpy as np #pip install numpy
+
+RECORDING_FILE = 'airsim_rec.txt'
+IMAGE_FOLDER = 'images'
+# rows parsed at a time, a chunk holds every column of its rows as a NumPy array
+READ_CHUNK_SIZE = 1 << 16
+# columns kept as integers, other columns are float64 when all their values parse as numbers, else str
+INTEGER_COLUMNS = ('TimeStamp',)
+IMAGE_COLUMNS = ('ImageFile', 'ImageName')
+
+class RecordingReader:
+    """
+    Reads the tab-separated airsim_rec.txt file written by the recorder into typed NumPy columns
+
+    The file is streamed a chunk of rows at a time, so a recording is never held as Python objects row by row.
+    The columns are the ones of the header line, e.g. VehicleName, TimeStamp, POS_X, ..., Q_Z, the vehicle specific
+    fields such as Throttle, Steering and Speed for cars, and ImageFile with the names of the images saved in the
+    `images` folder for the row, separated by ';'.
+
+        recording = RecordingReader('2021-06-01-12-00-00')
+        columns = recording.read(['TimeStamp', 'Steering', 'ImageFile'])
+        rows, steering = shifted_windows(columns['Steering'], (-1, 0, 1))
+
+    Args:
+        path (str): Recording folder holding airsim_rec.txt and images/, or the path of the txt file
+        vehicle_name (str, optional): Only read the rows of this vehicle, when several vehicles were recorded
+        chunk_size (int, optional): Rows parsed at a time
+    """
+    def __init__(self, path, vehicle_name = None, chunk_size = READ_CHUNK_SIZE):
+        if os.path.isdir(path):
+            path = os.path.join(path, RECORDING_FILE)
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive, got {}'.format(chunk_size))
+
+        self.filename = path
+        self.image_folder = os.path.join(os.path.dirname(path), IMAGE_FOLDER)
+        self.vehicle_name = vehicle_name
+        self.chunk_size = chunk_size
+        with open(path) as f:
+            self.columns = f.readline().rstrip('\r\n').split('\t')
+        if vehicle_name is not None and 'VehicleName' not in self.columns:
+            raise ValueError('{} has no VehicleName column to select {} with'.format(path, vehicle_name))
+        self.image_column = next((name for name in IMAGE_COLUMNS if name in self.columns), None)
+
+    def chunks(self, columns = None):
+        """
+        Parses the file a chunk of rows at a time
+
+        Args:
+            columns (list[str], optional): Columns to return, all of them if None
+
+        Returns:
+            Iterator[dict]: Column name to array of the chunk's rows, int64, float64 or str
+        """
+        columns = self._check_columns(columns)
+        indices = [self.columns.index(name) for name in columns]
+        vehicle_index = self.columns.index('VehicleName') if self.vehicle_name is not None else None
+        dtypes = {}
+        with open(self.filename) as f:
+            f.readline()
+            first_line = 2
+            while True:
+                lines = list(itertools.islice(f, self.chunk_size))
+                if not lines:
+                    break
+                fields = [line.rstrip('\r\n').split('\t') for line in lines if line.strip()]
+                if any(len(row) != len(self.columns) for row in fields):
+                    row = next(i for i, row in enumerate(fields) if len(row) != len(self.columns))
+                    raise ValueError('{} has a row with {} fields instead of {} near line {}'.format(
+                        self.filename, len(fields[row]), len(self.columns), first_line + row))
+                first_line += len(lines)
+                if not fields:
+                    continue
+
+                table = np.array(fields, dtype = str)
+                if vehicle_index is not None:
+                    table = table[table[:, vehicle_index] == self.vehicle_name]
+                yield {name: self._convert(name, table[:, index], dtypes) for name, index in zip(columns, indices)}
+
+    def read(self, columns = None):
+        """
+        Reads whole columns of the recording
+
+        Args:
+            columns (list[str], optional): Columns to return, all of them if None
+
+        Returns:
+            dict: Column name to array with one entry per row
+        """
+        columns = self._check_columns(columns)
+        parts = {name: [] for name in columns}
+        for chunk in self.chunks(columns):
+            for name in columns:
+                parts[name].append(chunk[name])
+        return {name: np.concatenate(parts[name]) if parts[name] else np.empty(0) for name in columns}
+
+    def records(self, columns = None, image_index = 0):
+        """
+        Lazily iterates over the rows as (image_path, state) pairs, parsing the file a chunk at a time
+
+        Args:
+            columns (list[str], optional): Columns of the state, all but the image column if None
+            image_index (int, optional): Which of the images saved for a row to return, in the order of the camera requests
+
+        Returns:
+            Iterator[tuple]: Path of the image, None if the row has no such image, and a dict of column name to value
+        """
+        if columns is None:
+            columns = [name for name in self.columns if name != self.image_column]
+        columns = self._check_columns(columns)
+        wanted = columns if self.image_column in columns + [None] else columns + [self.image_column]
+
+        for chunk in self.chunks(wanted):
+            values = [chunk[name].tolist() for name in columns]
+            image_files = chunk[self.image_column].tolist() if self.image_column is not None else itertools.repeat('')
+            for image_files_row, row in zip(image_files, zip(*values)):
+                yield self.image_path(image_files_row, image_index), dict(zip(columns, row))
+
+    def image_path(self, image_files, index = 0):
+        """
+        Returns:
+            str: Path of the index-th of the ';' separated image names of a row, None if the row has fewer images
+        """
+        names = image_files.split(';') if image_files else []
+        if index >= len(names):
+            return None
+        return os.path.join(self.image_folder, names[index]).replace('\\', '/')
+
+    def _check_columns(self, columns):
+        if columns is None:
+            return list(self.columns)
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise ValueError('{} has no column {}, its columns are {}'.format(self.filename, missing, self.columns))
+        return list(columns)
+
+    def _convert(self, name, values, dtypes):
+        # a column's type is settled by its first chunk so every chunk of it has the same dtype
+        dtype = dtypes.get(name)
+        if dtype is None:
+            dtype = np.int64 if name in INTEGER_COLUMNS else np.float64
+            if name in IMAGE_COLUMNS or name == 'VehicleName':
+                dtype = str
+            elif dtype is np.float64:
+                try:
+                    values.astype(np.float64)
+                except ValueError:
+                    dtype = str
+            dtypes[name] = dtype
+        if dtype is str:
+            return values
+        try:
+            return values.astype(dtype)
+        except ValueError:
+            raise ValueError('Column {} of {} holds a value that is not a number'.format(name, self.filename))
+
+def shifted_windows(values, offsets):
+    """
+    Stacks the values of each row together with those of the rows at the given offsets, without a Python loop
+
+    Rows whose window would run past either end of the array are left out, e.g. offsets (-1, 0, 1) return windows for
+    rows 1 to len(values) - 2.
+
+    Args:
+        values (np.ndarray): One value per row, or an (N, ...) array
+        offsets (list[int]): Row offsets of the window, e.g. (-1,) for the previous row
+
+    Returns:
+        tuple: (rows, windows), the indices of the rows that have a full window and the (len(rows), len(offsets), ...) windows
+    """
+    values = np.asarray(values)
+    offsets = list(offsets)
+    if not offsets:
+        raise ValueError('shifted_windows needs at least one offset')
+    start = max(0, -min(offsets))
+    stop = len(values) - max(0, max(offsets))
+    rows = np.arange(start, max(start, stop))
+    windows = np.stack([values[rows + offset] for offset in offsets], axis = 1)
+    return rows, windows
@@ -43,7 +43,9 @@ class Actor(BaseComponent):
     def from_vec(cls, data):
         start_pose = pose_from_vec(data[1:8])
         end_pose = pose_from_vec(data[8:15])
-        return cls(data[0], start_pose, end_pose, data[-1])    
+        # vectors hold the type value, the constructor takes its name
+        type_name = list(ACTOR_TYPE.keys())[list(ACTOR_TYPE.values()).index(data[0])]
+        return cls(type_name, start_pose, end_pose, data[-1])    
 
 
     @classmethod
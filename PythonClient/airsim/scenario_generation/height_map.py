@@ -0,0 +1,204 @@
+import json
+import os
+import numpy as np
+
+# height returned by simGetGroundHeight when its ray hits nothing, e.g. over holes or outside the level
+NO_GROUND_HEIGHT = -999.0
+
+
+class GroundHeightMap():
+    """
+    Ground heights of a region sampled once on a regular grid, with vectorized bilinear lookups.
+
+    The grid is filled from simGetGroundHeight, with the queries pipelined, or from the ray casts of a SceneMesh,
+    and can be kept in a memory-mapped .npy file next to a small .json file with the grid geometry, so later runs
+    load it without touching the simulator. Heights are NED z values, as returned by simGetGroundHeight.
+    Grid points that were sampled but have no ground below them hold -inf, and unsampled ones NaN.
+
+        height_map = GroundHeightMap.from_client(client, [0, 100], [0, 100], resolution=0.5, path='ground.npy')
+        z = height_map.height(xs, ys)
+
+    Args:
+        heights (np.ndarray): (ny, nx) ground heights, row j and column i at (x0 + i * resolution, y0 + j * resolution).
+        origin (tuple): (x0, y0) of the first grid point.
+        resolution (float): Spacing of the grid points in meters.
+
+    """
+
+    def __init__(self, heights, origin, resolution) -> None:
+        self.heights = heights
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.resolution = float(resolution)
+
+    @staticmethod
+    def grid_shape(x_range, y_range, resolution):
+        """
+        Returns:
+            tuple: (ny, nx) grid points covering the ranges, including both ends.
+
+        """
+        if resolution <= 0 or x_range[1] < x_range[0] or y_range[1] < y_range[0]:
+            raise ValueError('Invalid grid: x_range {}, y_range {}, resolution {}'.format(x_range, y_range, resolution))
+        return (int(np.floor((y_range[1] - y_range[0]) / resolution + 1e-9)) + 1,
+                int(np.floor((x_range[1] - x_range[0]) / resolution + 1e-9)) + 1)
+
+    @classmethod
+    def _create(cls, x_range, y_range, resolution, path):
+        shape = cls.grid_shape(x_range, y_range, resolution)
+        origin = (x_range[0], y_range[0])
+        if path is None:
+            return cls(np.full(shape, np.nan), origin, resolution)
+
+        # unfilled points are NaN, so an interrupted run resumes where it stopped
+        if os.path.isfile(path):
+            height_map = cls.load(path, mode='r+')
+            if height_map.heights.shape != shape or height_map.origin != origin or height_map.resolution != resolution:
+                raise ValueError('{} holds a different grid, delete it or use another path'.format(path))
+            return height_map
+        heights = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+        heights[:] = np.nan
+        with open(cls._metadata_path(path), 'w') as f:
+            json.dump({'origin': origin, 'resolution': resolution}, f)
+        return cls(heights, origin, resolution)
+
+    @classmethod
+    def from_client(cls, client, x_range, y_range, resolution=1.0, path=None, batch_size=1024):
+        """
+        Sample the ground heights with simGetGroundHeight, sending batch_size queries before waiting on any of them.
+
+        Args:
+            client: AirSim API client.
+            x_range (list): [min, max] x of the region.
+            y_range (list): [min, max] y of the region.
+            resolution (float): Spacing of the grid points in meters.
+            path (str): .npy file to keep the grid in, None to keep it in memory. Points already in the file are not sampled again.
+            batch_size (int): Number of queries in flight at once.
+
+        Returns:
+            GroundHeightMap: The sampled map.
+
+        """
+        height_map = cls._create(x_range, y_range, resolution, path)
+        flat = height_map.heights.reshape(-1)
+        missing = np.flatnonzero(np.isnan(flat))
+        xs, ys = height_map.grid_points()
+        xs, ys = xs.reshape(-1), ys.reshape(-1)
+
+        pipeline = client.pipelined()
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            futures = [pipeline.simGetGroundHeight(float(xs[i]), float(ys[i])) for i in batch]
+            heights = np.array([future.join() for future in futures], dtype=np.float64)
+            # -inf rather than NaN, so a resumed run does not query these points again
+            heights[heights == NO_GROUND_HEIGHT] = -np.inf
+            flat[batch] = heights
+        height_map.flush()
+        return height_map
+
+    @classmethod
+    def from_mesh(cls, mesh, x_range, y_range, resolution=1.0, path=None):
+        """
+        Sample the ground heights by casting rays down onto a SceneMesh, without querying the simulator.
+
+        Points where the rays hit nothing are -inf, as for from_client.
+
+        Args:
+            mesh (SceneMesh): Meshes of the level.
+            x_range (list): [min, max] x of the region.
+            y_range (list): [min, max] y of the region.
+            resolution (float): Spacing of the grid points in meters.
+            path (str): .npy file to keep the grid in, None to keep it in memory.
+
+        Returns:
+            GroundHeightMap: The sampled map.
+
+        """
+        height_map = cls._create(x_range, y_range, resolution, path)
+        xs, ys = height_map.grid_points()
+        # NED z is down, so the highest surface has the smallest z
+        top = mesh.bounds[0][2] - 1
+        origins = np.stack([xs.ravel(), ys.ravel(), np.full(xs.size, top)], axis=1)
+        hits = mesh.cast_rays(origins, (0, 0, 1))
+        height_map.heights[:] = np.where(hits.hit, hits.point[:, 2], -np.inf).reshape(xs.shape)
+        height_map.flush()
+        return height_map
+
+    @classmethod
+    def load(cls, path, mode='r'):
+        """
+        Load a map saved by from_client or from_mesh, memory-mapping the grid.
+
+        Returns:
+            GroundHeightMap: The loaded map.
+
+        """
+        with open(cls._metadata_path(path)) as f:
+            metadata = json.load(f)
+        return cls(np.load(path, mmap_mode=mode), metadata['origin'], metadata['resolution'])
+
+    @staticmethod
+    def _metadata_path(path):
+        return os.path.splitext(path)[0] + '.json'
+
+    def flush(self):
+        if isinstance(self.heights, np.memmap):
+            self.heights.flush()
+
+    @property
+    def x_range(self):
+        return [self.origin[0], self.origin[0] + (self.heights.shape[1] - 1) * self.resolution]
+
+    @property
+    def y_range(self):
+        return [self.origin[1], self.origin[1] + (self.heights.shape[0] - 1) * self.resolution]
+
+    def grid_points(self):
+        """
+        Returns:
+            tuple: (xs, ys), the (ny, nx) coordinates of the grid points.
+
+        """
+        ny, nx = self.heights.shape
+        return np.meshgrid(self.origin[0] + np.arange(nx) * self.resolution,
+                           self.origin[1] + np.arange(ny) * self.resolution)
+
+    def contains(self, x, y):
+        """
+        Returns:
+            np.ndarray: Whether each (x, y) lies inside the grid.
+
+        """
+        x, y = np.asarray(x), np.asarray(y)
+        x_range, y_range = self.x_range, self.y_range
+        return (x >= x_range[0]) & (x <= x_range[1]) & (y >= y_range[0]) & (y <= y_range[1])
+
+    def height(self, x, y):
+        """
+        Bilinearly interpolated ground height at each (x, y).
+
+        Args:
+            x: x coordinate, or an array of them.
+            y: y coordinate, or an array of them, broadcast with x.
+
+        Returns:
+            float or np.ndarray: Heights, NaN outside the grid or next to unsampled points or points without ground.
+
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        ny, nx = self.heights.shape
+        u = (x - self.origin[0]) / self.resolution
+        v = (y - self.origin[1]) / self.resolution
+        inside = (u >= 0) & (u <= nx - 1) & (v >= 0) & (v <= ny - 1)
+
+        # the cell of points on the last row or column is the one before it
+        i = np.clip(np.floor(np.where(inside, u, 0)).astype(np.int64), 0, max(nx - 2, 0))
+        j = np.clip(np.floor(np.where(inside, v, 0)).astype(np.int64), 0, max(ny - 2, 0))
+        fu, fv = np.where(inside, u - i, 0), np.where(inside, v - j, 0)
+        i1, j1 = np.minimum(i + 1, nx - 1), np.minimum(j + 1, ny - 1)
+
+        h = self.heights
+        with np.errstate(invalid='ignore'):
+            result = ((h[j, i] * (1 - fu) + h[j, i1] * fu) * (1 - fv)
+                      + (h[j1, i] * (1 - fu) + h[j1, i1] * fu) * fv)
+        result = np.where(inside & np.isfinite(result), result, np.nan)
+        return float(result) if result.ndim == 0 else result
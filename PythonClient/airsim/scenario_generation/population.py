@@ -0,0 +1,310 @@
+from .scenario import Scenario
+from .components.config import ACTOR_TYPE
+import numpy as np
+
+POSE_LEN = 7
+MARKER_LEN = 2 + POSE_LEN
+ACTOR_LEN = 1 + 2 * POSE_LEN + 1
+# bounds used by the per-object mutate() methods
+POSITION_BOUNDS = (-100, 100)
+WEATHER_BOUNDS = (0, 0.5)
+TIME_BOUNDS = (0, 1)
+
+
+class ScenarioLayout():
+    """
+    Column layout of a scenario encoded as a flat vector, following `Scenario.to_vec_dict`.
+
+    The vector is the tp marker, drone start pose, gps pose, radius, weather and time, followed by a count and a
+    fixed number of slots for the fp markers and for the actors. Slots past the count are ignored when decoding.
+
+    Args:
+        num_fp_markers (int): Number of fp marker slots.
+        num_actors (int): Number of actor slots.
+
+    Attributes:
+        size (int): Length of an encoded scenario.
+        segments (dict): Name to column slice of each part of the vector.
+
+    """
+
+    def __init__(self, num_fp_markers, num_actors) -> None:
+        self.num_fp_markers = num_fp_markers
+        self.num_actors = num_actors
+
+        lengths = [('tp_marker', MARKER_LEN), ('drone_start_pose', POSE_LEN), ('gps_pose', POSE_LEN), ('radius', 1),
+                   ('weather', 9), ('time', 2), ('num_fp_markers', 1), ('fp_markers', MARKER_LEN * num_fp_markers),
+                   ('num_actors', 1), ('actors', ACTOR_LEN * num_actors)]
+        self.segments = {}
+        start = 0
+        for name, length in lengths:
+            self.segments[name] = slice(start, start + length)
+            start += length
+        self.size = start
+
+        # x, y, z columns of every pose, for mutate_pose
+        pose_starts = [self.segments['tp_marker'].start + 2, self.segments['drone_start_pose'].start, self.segments['gps_pose'].start]
+        pose_starts += [self.segments['fp_markers'].start + MARKER_LEN * i + 2 for i in range(num_fp_markers)]
+        for i in range(num_actors):
+            actor_start = self.segments['actors'].start + ACTOR_LEN * i
+            pose_starts += [actor_start + 1, actor_start + 1 + POSE_LEN]
+        self.pose_positions = np.array(pose_starts, dtype=np.intp)[:, None] + np.arange(3)
+
+        self.actor_types = self.segments['actors'].start + ACTOR_LEN * np.arange(num_actors)
+        self.actor_speeds = self.actor_types + ACTOR_LEN - 1
+
+    def encode(self, scenario, out):
+        """
+        Write a scenario into a row of the population matrix.
+
+        Args:
+            scenario (Scenario): The scenario to encode.
+            out (numpy.ndarray): The row to write to.
+
+        """
+        vec_dict = scenario.to_vec_dict()
+        if len(vec_dict['fp_markers']) > self.num_fp_markers or len(vec_dict['actors']) > self.num_actors:
+            raise ValueError('Scenario has more fp markers or actors than the layout has slots for')
+
+        out[:] = 0
+        for name in ('tp_marker', 'drone_start_pose', 'gps_pose', 'radius', 'weather', 'time'):
+            out[self.segments[name]] = np.array(vec_dict[name], dtype=np.float64)
+        for name, length in (('fp_markers', MARKER_LEN), ('actors', ACTOR_LEN)):
+            items = vec_dict[name]
+            out[self.segments['num_' + name]] = len(items)
+            if items:
+                start = self.segments[name].start
+                out[start:start + length * len(items)] = np.array(items, dtype=np.float64).ravel()
+
+    def decode(self, row):
+        """
+        Build a scenario from a row of the population matrix.
+
+        Args:
+            row (numpy.ndarray): The encoded scenario.
+
+        Returns:
+            Scenario: The decoded scenario.
+
+        """
+        values = row.tolist()
+        vec_dict = {}
+        for name in ('tp_marker', 'drone_start_pose', 'gps_pose', 'weather', 'time'):
+            vec_dict[name] = values[self.segments[name]]
+        vec_dict['radius'] = values[self.segments['radius'].start]
+
+        markers = values[self.segments['fp_markers']]
+        count = int(values[self.segments['num_fp_markers'].start])
+        vec_dict['fp_markers'] = [markers[i * MARKER_LEN:(i + 1) * MARKER_LEN] for i in range(count)]
+        for marker_vec in [vec_dict['tp_marker']] + vec_dict['fp_markers']:
+            marker_vec[0] = int(round(marker_vec[0]))
+            # markers without a material are encoded as nan
+            marker_vec[1] = None if np.isnan(marker_vec[1]) else marker_vec[1]
+
+        actors = values[self.segments['actors']]
+        count = int(values[self.segments['num_actors'].start])
+        vec_dict['actors'] = [actors[i * ACTOR_LEN:(i + 1) * ACTOR_LEN] for i in range(count)]
+        for actor_vec in vec_dict['actors']:
+            actor_vec[0] = int(round(actor_vec[0]))
+
+        scenario = Scenario()
+        scenario.load_from_vec_dict(vec_dict)
+        return scenario
+
+
+class ScenarioPopulation():
+    """
+    Population of scenarios stored as the rows of one matrix.
+
+    Args:
+        genomes (numpy.ndarray): (N, layout.size) encoded scenarios.
+        layout (ScenarioLayout): Layout of the rows.
+
+    """
+
+    def __init__(self, genomes, layout) -> None:
+        self.genomes = genomes
+        self.layout = layout
+
+    @classmethod
+    def from_scenarios(cls, scenarios, layout=None):
+        """
+        Encode scenarios into a population.
+
+        Args:
+            scenarios (list): The scenarios to encode.
+            layout (ScenarioLayout): Layout to use, by default with as many slots as the largest scenario needs.
+
+        Returns:
+            ScenarioPopulation: The population.
+
+        """
+        scenarios = list(scenarios)
+        if layout is None:
+            layout = ScenarioLayout(max((len(s.fp_markers) for s in scenarios), default=0),
+                                    max((len(s.actors) for s in scenarios), default=0))
+        genomes = np.empty((len(scenarios), layout.size), dtype=np.float64)
+        for scenario, row in zip(scenarios, genomes):
+            layout.encode(scenario, row)
+        return cls(genomes, layout)
+
+    def to_scenarios(self):
+        """
+        Decode the population.
+
+        Returns:
+            list: One Scenario per row.
+
+        """
+        return [self.layout.decode(row) for row in self.genomes]
+
+    def __len__(self):
+        return self.genomes.shape[0]
+
+    def __getitem__(self, index):
+        return ScenarioPopulation(self.genomes[index].reshape(-1, self.layout.size), self.layout)
+
+
+class GeneticEngine():
+    """
+    Population level mutation, crossover and selection of scenarios.
+
+    Each operator works on a whole ScenarioPopulation at once with the same rules as the per-object `mutate` and
+    `crossover` methods of Scenario and its components, so a generation of thousands of scenarios costs a few
+    NumPy operations. Runs are reproducible given a seed.
+
+    Args:
+        seed (int): Seed of the random generator.
+        mutation_rate (float): Probability of mutating each component.
+        tournament_size (int): Number of candidates compared for each selected scenario.
+
+    """
+
+    def __init__(self, seed=None, mutation_rate=0.3, tournament_size=2) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.mutation_rate = mutation_rate
+        self.tournament_size = tournament_size
+
+    def _mask(self, shape):
+        return self.rng.random(shape) <= self.mutation_rate
+
+    def mutate(self, population):
+        """
+        Mutate a population.
+
+        Args:
+            population (ScenarioPopulation): The population to mutate.
+
+        Returns:
+            ScenarioPopulation: The mutated copy.
+
+        """
+        layout = population.layout
+        genomes = population.genomes.copy()
+        n = genomes.shape[0]
+        segments = layout.segments
+
+        # poses, see mutate_pose
+        positions = layout.pose_positions
+        deltas = self.rng.uniform(-1, 1, (n,) + positions.shape) * self._mask((n, positions.shape[0], 1))
+        genomes[:, positions] = np.clip(genomes[:, positions] + deltas, *POSITION_BOUNDS)
+
+        # weather and time, see Weather.mutate and Time.mutate
+        for name, bounds in (('weather', WEATHER_BOUNDS), ('time', TIME_BOUNDS)):
+            values = genomes[:, segments[name]]
+            deltas = self.rng.uniform(-0.1, 0.1, values.shape) * self._mask((n, 1))
+            genomes[:, segments[name]] = np.clip(values + deltas, *bounds)
+
+        radius = segments['radius'].start
+        genomes[:, radius] = np.maximum(genomes[:, radius] + self.rng.uniform(-3, 3, n) * self._mask(n), 0)
+
+        # actors can be dropped but not added, as in Scenario.mutate
+        num_actors = segments['num_actors'].start
+        change = self.rng.integers(-2, 3, n) * self._mask(n)
+        genomes[:, num_actors] = np.clip(genomes[:, num_actors] + np.minimum(change, 0), 0, None)
+
+        if layout.num_actors:
+            actor_types = [t for t in ACTOR_TYPE.values() if t != ACTOR_TYPE['marker']]
+            retype = self._mask((n, layout.num_actors))
+            genomes[:, layout.actor_types] = np.where(retype, self.rng.choice(actor_types, retype.shape), genomes[:, layout.actor_types])
+
+            # birds fly, keep them between 3 and 8 m over their start and end position
+            birds = retype & (genomes[:, layout.actor_types] == ACTOR_TYPE['bird'])
+            heights = self.rng.uniform(3, 8, retype.shape)
+            for offset in (1 + 2, 1 + POSE_LEN + 2):
+                columns = layout.actor_types + offset
+                genomes[:, columns] = np.where(birds, heights, genomes[:, columns])
+
+            genomes[:, layout.actor_speeds] = np.where(self._mask(retype.shape), self.rng.random(retype.shape),
+                                                       genomes[:, layout.actor_speeds])
+
+        return ScenarioPopulation(genomes, layout)
+
+    def crossover(self, population):
+        """
+        Cross over random pairs of a population.
+
+        Each component is split in half as in the component `crossover` methods, and the fp markers and actors are
+        swapped whole as in `Scenario.crossover`.
+
+        Args:
+            population (ScenarioPopulation): The parents.
+
+        Returns:
+            ScenarioPopulation: The children, as many as parents. With an odd count the last parent is copied.
+
+        """
+        layout = population.layout
+        order = self.rng.permutation(len(population))
+        genomes = population.genomes[order]
+        pairs = genomes.shape[0] // 2
+        parents_1, parents_2 = genomes[0:2 * pairs:2], genomes[1:2 * pairs:2]
+
+        # columns that come from the other parent
+        swapped = np.zeros(layout.size, dtype=bool)
+        for name in ('tp_marker', 'drone_start_pose', 'gps_pose', 'radius', 'weather', 'time'):
+            segment = layout.segments[name]
+            swapped[segment.start + (segment.stop - segment.start) // 2:segment.stop] = True
+        swapped[layout.segments['num_fp_markers'].start:] = True
+
+        children = genomes.copy()
+        children[0:2 * pairs:2] = np.where(swapped, parents_2, parents_1)
+        children[1:2 * pairs:2] = np.where(swapped, parents_1, parents_2)
+        return ScenarioPopulation(children, layout)
+
+    def select(self, population, fitness, num=None):
+        """
+        Tournament selection, higher fitness is better.
+
+        Args:
+            population (ScenarioPopulation): The candidates.
+            fitness (numpy.ndarray): (N,) fitness of each candidate.
+            num (int): Number of scenarios to select, by default the size of the population.
+
+        Returns:
+            ScenarioPopulation: The selected scenarios.
+
+        """
+        fitness = np.asarray(fitness, dtype=np.float64)
+        if fitness.shape != (len(population),):
+            raise ValueError('Expected one fitness value per scenario, got shape {}'.format(fitness.shape))
+        if num is None:
+            num = len(population)
+
+        candidates = self.rng.integers(0, len(population), (num, self.tournament_size))
+        winners = candidates[np.arange(num), np.argmax(fitness[candidates], axis=1)]
+        return ScenarioPopulation(population.genomes[winners], population.layout)
+
+    def step(self, population, fitness):
+        """
+        Produce the next generation by selection, crossover and mutation.
+
+        Args:
+            population (ScenarioPopulation): The current generation.
+            fitness (numpy.ndarray): (N,) fitness of each scenario.
+
+        Returns:
+            ScenarioPopulation: The next generation.
+
+        """
+        return self.mutate(self.crossover(self.select(population, fitness)))
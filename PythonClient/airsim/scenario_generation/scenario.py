@@ -5,7 +5,7 @@ from .components.weather import Weather
 from .components.time import Time
 from .components.marker import Marker
 from ..types import *
-from .components.utils import pose_to_dict, pose_from_vec, pose_from_dict
+from .components.utils import pose_to_dict, pose_to_vec, pose_from_vec, pose_from_dict
 
 class Scenario(object):
     def __init__(self, tp_marker=None, fp_markers=[], drone_start_pose=None, gps_pose=None, radius=None, actors=[], weather=None, time=None):
@@ -51,8 +51,8 @@ class Scenario(object):
     def to_vec_dict(self):
         vec_dict = {}
         vec_dict['tp_marker'] = self.tp_marker.to_vec()
-        vec_dict['drone_start_pose'] = self.drone_start_pose.to_vec()
-        vec_dict['gps_pose'] = self.gps_pose.to_vec()
+        vec_dict['drone_start_pose'] = pose_to_vec(self.drone_start_pose)
+        vec_dict['gps_pose'] = pose_to_vec(self.gps_pose)
         vec_dict['radius'] = self.radius
         vec_dict['weather'] = self.weather.to_vec()
         vec_dict['time'] = self.time.to_vec()
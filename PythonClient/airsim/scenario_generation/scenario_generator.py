@@ -1,6 +1,6 @@
 from ..client import MultirotorClient, VehicleClient
 from ..types import *
-from .utils import sample_position_on_circle, validate_marker_position
+from .utils import sample_position_on_circle, validate_marker_position, evaluate_marker_sites
 from ..utils import to_quaternion
 from .components.config import ACTOR_TYPE, BP_TYPE
 from .components.weather import Weather
@@ -8,21 +8,61 @@ from .components.actor import Actor
 from .components.time import Time
 from .components.marker import Marker
 import random
+import math
+import numpy as np
 from .scenario import Scenario
 from .scenario_manager import ScenarioManager
-
-
-
-
-def generate_random_scenario(client, x_range, y_range, radius, z_dist=None, tp_marker_id=0):
-    # set a random marker position
-    while True:
-        x = random.uniform(x_range[0], x_range[1])
-        y = random.uniform(y_range[0], y_range[1])
-        z = client.simGetGroundHeight(x, y)
-        marker_position = Vector3r(x, y, z)
-        if validate_marker_position(client, marker_position):
-            break
+from .height_map import NO_GROUND_HEIGHT
+
+
+
+
+def ground_height(client, x, y, height_map=None):
+    # looks the height up in the map when it covers (x, y), and asks the simulator otherwise
+    if height_map is not None:
+        z = height_map.height(x, y)
+        if not math.isnan(z):
+            return z
+    z = client.simGetGroundHeight(x, y)
+    if z == NO_GROUND_HEIGHT:
+        raise ValueError('No ground below ({}, {})'.format(x, y))
+    return z
+
+
+def sample_marker_site(height_map, x_range, y_range, batch_size=256, max_batches=100):
+    # candidates are checked a batch at a time against the height map, without rendering, and only drawn
+    # where the map covers the ranges, None if it does not cover them at all
+    x_range = [max(x_range[0], height_map.x_range[0]), min(x_range[1], height_map.x_range[1])]
+    y_range = [max(y_range[0], height_map.y_range[0]), min(y_range[1], height_map.y_range[1])]
+    if x_range[0] > x_range[1] or y_range[0] > y_range[1]:
+        return None
+
+    for _ in range(max_batches):
+        xs = np.array([random.uniform(x_range[0], x_range[1]) for _ in range(batch_size)])
+        ys = np.array([random.uniform(y_range[0], y_range[1]) for _ in range(batch_size)])
+        valid, _ = evaluate_marker_sites(height_map, xs, ys)
+        if valid.any():
+            i = int(np.argmax(valid))
+            return float(xs[i]), float(ys[i]), height_map.height(xs[i], ys[i])
+    raise ValueError('No flat marker site found in x_range {}, y_range {}'.format(x_range, y_range))
+
+
+def generate_random_scenario(client, x_range, y_range, radius, z_dist=None, tp_marker_id=0, height_map=None):
+    # set a random marker position, rendering candidates only when the height map does not cover the ranges
+    site = sample_marker_site(height_map, x_range, y_range) if height_map is not None else None
+    if site is not None:
+        marker_position = Vector3r(*site)
+    else:
+        while True:
+            x = random.uniform(x_range[0], x_range[1])
+            y = random.uniform(y_range[0], y_range[1])
+            z = client.simGetGroundHeight(x, y)
+            if z == NO_GROUND_HEIGHT:
+                continue
+            marker_position = Vector3r(x, y, z)
+            if validate_marker_position(client, marker_position):
+                break
+    z = marker_position.z_val
 
     tp_marker = Marker(tp_marker_id, None, Pose(marker_position), 'tp')
 
@@ -36,7 +76,7 @@ def generate_random_scenario(client, x_range, y_range, radius, z_dist=None, tp_m
 
     fp_markers= []
     drone_start_pose = Pose(Vector3r(0, 0, 0))
-    drone_start_ground_height = client.simGetGroundHeight(drone_start_pose.position.x_val, drone_start_pose.position.y_val)
+    drone_start_ground_height = ground_height(client, drone_start_pose.position.x_val, drone_start_pose.position.y_val, height_map)
     drone_start_pose.position.z_val = drone_start_ground_height - 0.5
     weather = Weather(*([random.uniform(0, 0.3)] * 9))
     time = Time(random.random(), random.random())
@@ -1,6 +1,7 @@
 from ..client import MultirotorClient
 from ..types import *
 from ..utils import *
+from ..segmentation import SegmentationPalette, SegmentationPlan
 from .components.config import ACTOR_TYPE, BP_TYPE
 import random
 import numpy as np
@@ -9,6 +10,13 @@ import math
 import time
 import cv2
 
+SEGMENTATION_OBJECTS = ['House', 'Fir', 'Fence', 'Car', 'Power_line', 'Roof', 'Swimming', 'Rock', 'Hedge', 'Wall', 'Tree', 'npc', 'SUV', 'Birch']
+MARKER_SEGMENTATION_ID = len(SEGMENTATION_OBJECTS) + 1
+SEGMENTATION_PLAN = SegmentationPlan(
+    [("[\\w]*{}[\\w]*".format(obj), seg_id) for seg_id, obj in enumerate(SEGMENTATION_OBJECTS, 1)] +
+    [("cube_marker{}".format(i), MARKER_SEGMENTATION_ID) for i in range(4)],
+    default_id=-1)
+
 class ScenarioManager():
     """
     Class for managing scenarios in AirSim simulation.
@@ -16,6 +24,7 @@ class ScenarioManager():
     Args:
         sim_mode (str): Simulation mode, either 'drone' or 'cv'.
         host_ip (str): IP address of the host machine.
+        settle_time (float): Seconds to wait in load_scenario after clearing the previous scenario.
 
     Attributes:
         sim_mode (str): Simulation mode.
@@ -25,17 +34,19 @@ class ScenarioManager():
 
     """
 
-    def __init__(self, client, sim_mode='drone') -> None:
+    def __init__(self, client, sim_mode='drone', settle_time=1.0) -> None:
         """
         Initializes the ScenarioManager object.
 
         Args:
             sim_mode (str): Simulation mode, either 'drone' or 'cv'.
             host_ip (str): IP address of the host machine.
+            settle_time (float): Seconds to wait in load_scenario after clearing the previous scenario.
 
         """
         self.client = client
         self.sim_mode = sim_mode
+        self.settle_time = settle_time
 
         if sim_mode == 'cv':
 
@@ -64,8 +75,7 @@ class ScenarioManager():
         for bp in bps:
             obj_pool = {}
             bp_objs = self.client.simListSceneObjects('{}.*'.format(bp))
-            for obj_name in bp_objs:
-                obj_pose = self.client.simGetObjectPose(obj_name)
+            for obj_name, obj_pose in zip(bp_objs, self.client.simGetObjectPoses(bp_objs)):
                 print(obj_name, obj_pose)
                 obj_pool[obj_name] = {"pose": obj_pose, "occupied": False}
             dynamic_objects_pool[bp] = obj_pool
@@ -132,11 +142,17 @@ class ScenarioManager():
         Reset the environment by resetting the dynamic objects and markers.
 
         """
+        pipeline = self.client.pipelined()
+        destroys = []
         for actors in (self.scenario_objects).values():
             # self.reset_npc(obj)
             for actor_name in actors.keys():
-                self.client.simDestroyObject(actor_name)
-                time.sleep(0.1)
+                destroys.append(pipeline.simDestroyObject(actor_name))
+
+        if destroys:
+            for destroy in destroys:
+                destroy.join()
+            time.sleep(0.1)
 
         self.scenario_objects = {}
 
@@ -156,69 +172,51 @@ class ScenarioManager():
 
         """
         if image_type == 0:
-            responses = self.client.simGetImages([ImageRequest(camera_name, image_type, False, False)], external=external)
+            responses = self.client.simGetImages([ImageRequest(camera_name, image_type, False, False)], external=external, as_numpy=True)
         else:
-            responses = self.client.simGetImages([ImageRequest(camera_name, image_type, True, False)], external=external)
+            responses = self.client.simGetImages([ImageRequest(camera_name, image_type, True, False)], external=external, as_numpy=True)
 
 
         response = responses[0]
         if image_type == 0:
-            img1d = np.fromstring(response.image_data_uint8, dtype=np.uint8) 
-            img = img1d.reshape(response.height, response.width, 3)
+            img = response.image_data_uint8
             if image_encoding == 'bgr':
                 img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         else:
-            img1d = np.array(response.image_data_float, dtype=np.float32)
-            img = img1d.reshape(response.height, response.width)
+            img = response.image_data_float
 
 
         camera_body_pose = Pose(response.camera_position, response.camera_orientation)
         
         return img, camera_body_pose
 
-    def get_segmentation_mapping(self):
+    def get_segmentation_mapping(self, num_ids=20):
         """
         Get the segmentation mapping for different objects in the scene.
 
+        Args:
+            num_ids (int): Number of segmentation IDs to map.
+
         Returns:
             dict: A dictionary containing the segmentation mapping.
 
         """
-        colors = {}
-        requests = ImageRequest("0", ImageType.Segmentation, False, False)
-
-        for cls_id in range(20):
-            self.client.simSetSegmentationObjectID(".*", cls_id, is_name_regex=True)
-            response = self.client.simGetImages([requests])[0]
-            img1d = np.frombuffer(response.image_data_uint8, dtype=np.uint8)
-            img_rgb = img1d.reshape(response.height, response.width, 3)
-
-            color = tuple(np.unique(img_rgb.reshape(-1, img_rgb.shape[-1]), axis=0)[0])
-            print(f"{cls_id}\t{color}")
-            colors[cls_id] = color
-        
-        return colors
+        palette = SegmentationPalette.default()
+        return {cls_id: palette.color(cls_id) for cls_id in range(num_ids)}
 
-    def set_segmentation(self):
+    def set_segmentation(self, map_name=None):
         """
         Set the segmentation for different objects in the scene.
 
+        Args:
+            map_name (str): Name of the loaded map, the object IDs are resolved once per map.
+
         Returns:
             int: The segmentation ID.
 
         """
-        self.client.simSetSegmentationObjectID("[\w]*", -1, True)
-
-        filtered_objs = ['House', 'Fir', 'Fence', 'Car', 'Power_line', 'Roof', 'Swimming', 'Rock', 'Hedge', 'Wall', 'Tree', 'npc', 'SUV', 'Birch']
-        seg_id = 1
-        for obj in filtered_objs:
-            self.client.simSetSegmentationObjectID("[\w]*{}[\w]*".format(obj), seg_id, True)
-            seg_id += 1
-
-        for i in range(4):
-            self.client.simSetSegmentationObjectID("cube_marker{}".format(i), seg_id)
-        
-        return seg_id
+        SEGMENTATION_PLAN.apply(self.client, map_name)
+        return MARKER_SEGMENTATION_ID
 
     def get_all_npcs(self):
         """
@@ -240,17 +238,33 @@ class ScenarioManager():
             scenario_pose: The pose of the scenario.
 
         """
-        if actor.type != ACTOR_TYPE['marker']:
-            npc_name = self.client.simSpawnObject(actor.name, BP_TYPE[actor.type], actor.start_pose, Vector3r(1, 1, 1), False, True)
-        else:
-            npc_name = self.client.simSpawnObject(actor.name, BP_TYPE[actor.type]+str(actor.id), actor.pose,
-                                                        Vector3r(1, 1, 1), False, True)
-        print(actor.name, npc_name)
-        
-        # scenario objects[actor_type][actor_name]
-        if BP_TYPE[actor.type] not in self.scenario_objects:
-            self.scenario_objects[BP_TYPE[actor.type]] = {}
-        self.scenario_objects[BP_TYPE[actor.type]][npc_name] = actor
+        self.add_actors([actor])
+
+    def add_actors(self, actors):
+        """
+        Spawn several actors, the spawn requests are pipelined so the time doesn't grow with the number of actors.
+
+        Args:
+            actors (list): The actors to spawn.
+
+        """
+        pipeline = self.client.pipelined()
+        spawns = []
+        for actor in actors:
+            if actor.type != ACTOR_TYPE['marker']:
+                spawns.append(pipeline.simSpawnObject(actor.name, BP_TYPE[actor.type], actor.start_pose, Vector3r(1, 1, 1), False, True))
+            else:
+                spawns.append(pipeline.simSpawnObject(actor.name, BP_TYPE[actor.type]+str(actor.id), actor.pose,
+                                                            Vector3r(1, 1, 1), False, True))
+
+        for actor, spawn in zip(actors, spawns):
+            npc_name = spawn.join()
+            print(actor.name, npc_name)
+
+            # scenario objects[actor_type][actor_name]
+            if BP_TYPE[actor.type] not in self.scenario_objects:
+                self.scenario_objects[BP_TYPE[actor.type]] = {}
+            self.scenario_objects[BP_TYPE[actor.type]][npc_name] = actor
 
 
         # for obj_name, obj_status in self.dynamic_objects_pool[npc_type].items():
@@ -332,22 +346,19 @@ class ScenarioManager():
             self.set_drone_pose(scenario.gps_pose)
 
         self.reset_env()
-        time.sleep(1)
+        if self.settle_time > 0:
+            time.sleep(self.settle_time)
 
-        self.add_actor(scenario.tp_marker)
         # self.set_marker(scenario.tp_marker.pose, marker_name='cube_marker{}'.format(scenario.tp_marker.id))
         # time.sleep(3)
         # print('set marker at: ', self.get_pose('cube_marker{}'.format(scenario.tp_marker.id)))
-        for marker in scenario.fp_markers:
-            self.add_actor(marker)
-        
+
         # set weather and time
         self.set_weather(scenario.weather.to_vec())
         self.set_time_of_day(scenario.time.to_vec())
 
-        # set dynamic actors
-        for actor in scenario.actors:
-            self.add_actor(actor)
+        # spawn the markers and dynamic actors together
+        self.add_actors([scenario.tp_marker] + list(scenario.fp_markers) + list(scenario.actors))
 
         
     # if the actors are not static, move them to the destination
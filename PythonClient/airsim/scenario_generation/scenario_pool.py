@@ -0,0 +1,133 @@
+from ..client import MultirotorClient, VehicleClient
+from .scenario_manager import ScenarioManager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+
+
+class ScenarioPool():
+    """
+    Pool of simulators for evaluating many scenarios in parallel.
+
+    Each worker is a ScenarioManager driving its own simulator instance through its own client. Scenarios are
+    dispatched to whichever worker is idle and results are collected as they finish, so throughput grows with
+    the number of simulators. Workers run on threads since they spend their time waiting on the simulators.
+
+    Args:
+        clients (list): One AirSim API client per simulator instance.
+        sim_mode (str): Simulation mode, either 'drone' or 'cv'.
+        settle_time (float): Passed to each ScenarioManager.
+
+    Attributes:
+        managers (list): The ScenarioManager of each worker.
+
+    """
+
+    def __init__(self, clients, sim_mode='drone', settle_time=1.0) -> None:
+        if not clients:
+            raise ValueError('ScenarioPool needs at least one client')
+
+        self.managers = [ScenarioManager(client, sim_mode=sim_mode, settle_time=settle_time) for client in clients]
+        self._idle = queue.Queue()
+        for manager in self.managers:
+            self._idle.put(manager)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.managers))
+
+    @classmethod
+    def from_ports(cls, ports, host_ip='', sim_mode='drone', settle_time=1.0):
+        """
+        Connect to simulator instances listening on different ports of the same host.
+
+        Args:
+            ports (list): The RPC port of each simulator instance.
+            host_ip (str): IP address of the host machine.
+            sim_mode (str): Simulation mode, either 'drone' or 'cv'.
+            settle_time (float): Passed to each ScenarioManager.
+
+        Returns:
+            ScenarioPool: The pool, with one worker per port.
+
+        """
+        client_class = VehicleClient if sim_mode == 'cv' else MultirotorClient
+        clients = []
+        for port in ports:
+            client = client_class(ip=host_ip, port=port)
+            client.confirmConnection()
+            clients.append(client)
+        return cls(clients, sim_mode=sim_mode, settle_time=settle_time)
+
+    def __len__(self):
+        return len(self.managers)
+
+    def _run(self, evaluate_fn, scenario):
+        manager = self._idle.get()
+        try:
+            manager.set_scenario(scenario)
+            manager.load_scenario()
+            return evaluate_fn(manager, scenario)
+        finally:
+            self._idle.put(manager)
+
+    def submit(self, scenario, evaluate_fn):
+        """
+        Queue a scenario to run on the next idle worker.
+
+        Args:
+            scenario (Scenario): The scenario to evaluate.
+            evaluate_fn (callable): Called as evaluate_fn(manager, scenario) once the scenario is loaded on a worker.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the result of evaluate_fn.
+
+        """
+        return self._executor.submit(self._run, evaluate_fn, scenario)
+
+    def evaluate(self, scenarios, evaluate_fn):
+        """
+        Evaluate scenarios across the workers, yielding results in the order they finish.
+
+        Args:
+            scenarios (list): The scenarios to evaluate.
+            evaluate_fn (callable): Called as evaluate_fn(manager, scenario) once a scenario is loaded on a worker.
+
+        Yields:
+            tuple: The index of the scenario in scenarios and the result of evaluate_fn.
+
+        """
+        futures = {self.submit(scenario, evaluate_fn): i for i, scenario in enumerate(scenarios)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def map(self, scenarios, evaluate_fn):
+        """
+        Evaluate scenarios across the workers.
+
+        Args:
+            scenarios (list): The scenarios to evaluate.
+            evaluate_fn (callable): Called as evaluate_fn(manager, scenario) once a scenario is loaded on a worker.
+
+        Returns:
+            list: The results of evaluate_fn, in the order of scenarios.
+
+        """
+        scenarios = list(scenarios)
+        results = [None] * len(scenarios)
+        for i, result in self.evaluate(scenarios, evaluate_fn):
+            results[i] = result
+        return results
+
+    def close(self):
+        """
+        Wait for the running scenarios and shut the worker threads down.
+
+        """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
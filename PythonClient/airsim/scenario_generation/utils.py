@@ -7,14 +7,90 @@ import math
 from ..types import *
 from ..utils import to_quaternion
 import numpy as np
+from collections import namedtuple
+from .height_map import NO_GROUND_HEIGHT
+
+SiteScores = namedtuple('SiteScores', ['spread', 'slope', 'roughness'])
+SiteScores.__doc__ = """
+Flatness of candidate marker sites, one entry per site, NaN where the ground is unknown.
+
+Attributes:
+    spread (np.ndarray): Largest height difference from the center of the site, in meters.
+    slope (np.ndarray): Slope of the plane fitted to the site, in degrees.
+    roughness (np.ndarray): RMS distance of the site to the fitted plane, in meters.
+"""
+
+
+def _site_stencil(radius, spacing):
+    steps = np.arange(-np.floor(radius / spacing), np.floor(radius / spacing) + 1) * spacing
+    dx, dy = [a.ravel() for a in np.meshgrid(steps, steps)]
+    inside = dx ** 2 + dy ** 2 <= radius ** 2 + 1e-9
+    return dx[inside], dy[inside]
+
+
+def _ground_heights(ground, x, y):
+    if hasattr(ground, 'height'):
+        return ground.height(x, y)
+    # a SceneMesh, cast rays down from above the scene
+    origins = np.stack([x.ravel(), y.ravel(), np.full(x.size, ground.bounds[0][2] - 1)], axis=1)
+    return ground.cast_rays(origins, (0, 0, 1)).point[:, 2].reshape(x.shape)
+
+
+def evaluate_marker_sites(ground, xs, ys, radius=1.0, spacing=0.25, max_spread=0.2, max_slope=None):
+    """
+    Check in one pass whether candidate marker sites are flat enough, without rendering.
+
+    The ground around each site is sampled on a grid of the given spacing within radius, from a GroundHeightMap
+    or a SceneMesh. A site is valid when the ground is known everywhere around it, no point is more than
+    max_spread away from the height at the center, and, if max_slope is given, the fitted plane is not steeper.
+
+    Args:
+        ground (GroundHeightMap or SceneMesh): Source of the ground heights.
+        xs (np.ndarray): x of the candidate sites.
+        ys (np.ndarray): y of the candidate sites.
+        radius (float): Radius of the area around each site that must be flat, in meters.
+        spacing (float): Spacing of the height samples, in meters.
+        max_spread (float): Largest accepted height difference from the center, in meters.
+        max_slope (float): Largest accepted slope in degrees, None to not check it.
+
+    Returns:
+        tuple: (valid, scores), a boolean mask of the sites and their SiteScores.
+
+    """
+    xs, ys = np.broadcast_arrays(np.atleast_1d(np.asarray(xs, dtype=np.float64)), np.atleast_1d(np.asarray(ys, dtype=np.float64)))
+    dx, dy = _site_stencil(radius, spacing)
+    heights = _ground_heights(ground, xs[:, np.newaxis] + dx, ys[:, np.newaxis] + dy)
+    center = _ground_heights(ground, xs, ys)
+
+    # least squares plane z = a + b dx + c dy, the stencil is the same for every site so its pseudo-inverse is shared
+    fit = np.linalg.pinv(np.stack([np.ones_like(dx), dx, dy], axis=1))
+    coefficients = heights @ fit.T
+    residuals = heights - coefficients @ np.stack([np.ones_like(dx), dx, dy])
+
+    scores = SiteScores(
+        spread=np.max(np.abs(heights - center[:, np.newaxis]), axis=1),
+        slope=np.degrees(np.arctan(np.hypot(coefficients[:, 1], coefficients[:, 2]))),
+        roughness=np.sqrt(np.mean(residuals ** 2, axis=1)),
+    )
+    # points without ground, including raw simGetGroundHeight misses, would make a patch of them look flat
+    known = (np.all(np.isfinite(heights) & (heights != NO_GROUND_HEIGHT), axis=1)
+             & np.isfinite(center) & (center != NO_GROUND_HEIGHT))
+    with np.errstate(invalid='ignore'):
+        valid = known & (scores.spread <= max_spread)
+        if max_slope is not None:
+            valid &= scores.slope <= max_slope
+    return valid, scores
+
+
+def validate_marker_position(client, position, camera_name='ext_cam', ground=None):
+    if ground is not None:
+        valid, _ = evaluate_marker_sites(ground, position.x_val, position.y_val)
+        return bool(valid[0])
 
-def validate_marker_position(client, position, camera_name='ext_cam'):
     client.simSetCameraPose(camera_name, Pose(Vector3r(position.x_val,
                                                                     position.y_val, position.z_val - 1), to_quaternion(math.radians(-90), 0, 0)), external=True)
-    responses = client.simGetImages([ImageRequest(camera_name, 5, True, False)], external=True)
-    response = responses[0]
-    depth_img = np.array(response.image_data_float, dtype=np.float32)
-    depth_img = depth_img.reshape(response.height, response.width)
+    responses = client.simGetImages([ImageRequest(camera_name, 5, True, False)], external=True, as_numpy=True)
+    depth_img = responses[0].image_data_float
     depth_diff = np.abs(depth_img - depth_img[int(position.y_val), int(position.x_val)])
     print(np.max(depth_diff), np.mean(depth_diff), np.min(depth_diff))
     if np.max(depth_diff) > 0.2:
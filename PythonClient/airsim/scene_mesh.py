@@ -0,0 +1,429 @@
+import collections
+import os
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), 'Documents', 'AirSim', 'mesh_cache')
+CACHE_VERSION = 2
+
+# pairs of rays or points and BVH nodes are expanded a chunk of queries at a time, to bound memory
+QUERY_CHUNK_SIZE = 2048
+
+RayHits = collections.namedtuple('RayHits', ['hit', 'distance', 'point', 'triangle', 'mesh'])
+RayHits.__doc__ = """
+Results of `SceneMesh.cast_rays()`, one entry per ray
+
+Attributes:
+    hit (np.ndarray): Whether the ray hit the scene
+    distance (np.ndarray): Distance along the ray to the first hit, inf if none
+    point (np.ndarray): (N, 3) first hit points, NaN if none
+    triangle (np.ndarray): Index of the hit triangle into `SceneMesh.triangles`, -1 if none
+    mesh (np.ndarray): Index of the hit mesh into `SceneMesh.names`, -1 if none
+"""
+
+SurfacePoints = collections.namedtuple('SurfacePoints', ['distance', 'point', 'triangle', 'mesh'])
+SurfacePoints.__doc__ = """
+Results of `SceneMesh.nearest_surface()`, one entry per query point
+
+Attributes:
+    distance (np.ndarray): Distance to the nearest surface, inf if none within max_distance
+    point (np.ndarray): (N, 3) nearest surface points, NaN if none
+    triangle (np.ndarray): Index of the nearest triangle into `SceneMesh.triangles`, -1 if none
+    mesh (np.ndarray): Index of the nearest mesh into `SceneMesh.names`, -1 if none
+"""
+
+def _morton_codes(points):
+    # 10 bits per axis, interleaved into 30 bit codes
+    lo, hi = points.min(axis = 0), points.max(axis = 0)
+    cells = ((points - lo) / np.maximum(hi - lo, 1e-9) * 1023).astype(np.uint32)
+    codes = np.zeros(len(points), dtype = np.uint32)
+    for bit in range(10):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> bit) & 1) << (3 * bit + 2 - axis)
+    return codes
+
+def _closest_points_on_triangles(p, a, b, c):
+    # Ericson, Real-Time Collision Detection 5.1.5, vectorized over pairs of points and triangles
+    ab, ac = b - a, c - a
+    ap, bp, cp = p - a, p - b, p - c
+    d1, d2 = np.einsum('ij,ij->i', ab, ap), np.einsum('ij,ij->i', ac, ap)
+    d3, d4 = np.einsum('ij,ij->i', ab, bp), np.einsum('ij,ij->i', ac, bp)
+    d5, d6 = np.einsum('ij,ij->i', ab, cp), np.einsum('ij,ij->i', ac, cp)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    result = np.empty_like(p)
+    done = np.zeros(len(p), dtype = bool)
+    def assign(mask, points):
+        mask &= ~done
+        result[mask] = points[mask]
+        done[mask] = True
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        assign((d1 <= 0) & (d2 <= 0), a)
+        assign((d3 >= 0) & (d4 <= d3), b)
+        assign((d6 >= 0) & (d5 <= d6), c)
+        assign((vc <= 0) & (d1 >= 0) & (d3 <= 0), a + (d1 / (d1 - d3))[:, np.newaxis] * ab)
+        assign((vb <= 0) & (d2 >= 0) & (d6 <= 0), a + (d2 / (d2 - d6))[:, np.newaxis] * ac)
+        assign((va <= 0) & (d4 >= d3) & (d5 >= d6), b + ((d4 - d3) / ((d4 - d3) + (d5 - d6)))[:, np.newaxis] * (c - b))
+        denom = 1 / (va + vb + vc)
+        assign(np.ones(len(p), dtype = bool), a + ab * (vb * denom)[:, np.newaxis] + ac * (vc * denom)[:, np.newaxis])
+    return result
+
+class SceneMesh:
+    """
+    Static meshes of a level, with a bounding volume hierarchy for ray casts, line-of-sight and nearest-surface queries
+
+    The meshes are fetched once with `simGetMeshPositionVertexBuffers()` and cached on disk per level, so queries run
+    locally instead of costing a simulator round trip each. Queries take batches of rays or points as NumPy arrays.
+
+        mesh = SceneMesh.from_client(client, level = 'Blocks')
+        visible = mesh.line_of_sight(drone_positions, targets)
+        hits = mesh.cast_rays(origins, directions, max_distance = 100)
+
+    Coordinates are NED in meters, like vehicle and object poses, relative to `unreal_origin` given to `from_client()`.
+    The BVH is a linear BVH: triangles are sorted along a Morton curve, grouped into leaves of leaf_size triangles, and
+    the leaves are the bottom of a complete binary tree, stored as arrays so queries traverse it level by level for all
+    rays or points at once. Triangles are two-sided.
+
+    Args:
+        vertices (np.ndarray): (V, 3) vertex positions
+        triangles (np.ndarray): (T, 3) vertex indices of each triangle
+        mesh_ids (np.ndarray, optional): (T,) index into names of the mesh of each triangle
+        names (list[str], optional): Name of each mesh
+        leaf_size (int, optional): Triangles per BVH leaf
+    """
+    def __init__(self, vertices, triangles, mesh_ids = None, names = None, leaf_size = 8, _bvh = None):
+        vertices = np.asarray(vertices, dtype = np.float32).reshape(-1, 3)
+        triangles = np.asarray(triangles, dtype = np.int64).reshape(-1, 3)
+        if len(triangles) == 0:
+            raise ValueError('SceneMesh needs at least one triangle')
+        mesh_ids = np.zeros(len(triangles), dtype = np.int32) if mesh_ids is None else np.asarray(mesh_ids, dtype = np.int32)
+
+        self.vertices = vertices
+        self.names = list(names) if names is not None else ['']
+        self.leaf_size = leaf_size
+        # Unreal coordinates of the NED origin the vertices were converted with, set by from_responses
+        self.unreal_origin = None
+
+        if _bvh is None:
+            # the BVH owns the triangle order, so triangles are kept sorted along the Morton curve
+            order = np.argsort(_morton_codes(vertices[triangles].mean(axis = 1)), kind = 'stable')
+            triangles, mesh_ids = triangles[order], mesh_ids[order]
+        self.triangles = triangles
+        self.mesh_ids = mesh_ids
+
+        corners = vertices[triangles].astype(np.float64)
+        self._v0 = corners[:, 0]
+        self._e1 = corners[:, 1] - corners[:, 0]
+        self._e2 = corners[:, 2] - corners[:, 0]
+
+        if _bvh is None:
+            self._build_bvh(corners)
+        else:
+            self.box_min, self.box_max = _bvh
+        self.num_leaves = (len(self.box_min) + 1) // 2
+        self.depth = int(np.log2(self.num_leaves))
+        self.leaf_triangles = np.full(self.num_leaves * leaf_size, -1, dtype = np.int64)
+        self.leaf_triangles[:len(triangles)] = np.arange(len(triangles))
+        self.leaf_triangles = self.leaf_triangles.reshape(self.num_leaves, leaf_size)
+
+    def _build_bvh(self, corners):
+        count = len(corners)
+        num_leaves = 1 << int(np.ceil(np.log2(max(1, -(-count // self.leaf_size)))))
+
+        # empty boxes are NaN, so they fail every test, and fmin/fmax ignore them when merging
+        tri_min = np.full((num_leaves * self.leaf_size, 3), np.nan)
+        tri_max = np.full((num_leaves * self.leaf_size, 3), np.nan)
+        tri_min[:count] = corners.min(axis = 1)
+        tri_max[:count] = corners.max(axis = 1)
+
+        # heap layout, the children of node i are 2i + 1 and 2i + 2, and leaves are the last num_leaves nodes
+        self.box_min = np.empty((2 * num_leaves - 1, 3))
+        self.box_max = np.empty((2 * num_leaves - 1, 3))
+        with np.errstate(invalid = 'ignore'):
+            self.box_min[num_leaves - 1:] = np.fmin.reduce(tri_min.reshape(num_leaves, self.leaf_size, 3), axis = 1)
+            self.box_max[num_leaves - 1:] = np.fmax.reduce(tri_max.reshape(num_leaves, self.leaf_size, 3), axis = 1)
+        width = num_leaves // 2
+        while width >= 1:
+            first = width - 1
+            children = np.arange(2 * first + 1, 2 * first + 1 + 2 * width)
+            self.box_min[first:first + width] = np.fmin(self.box_min[children[0::2]], self.box_min[children[1::2]])
+            self.box_max[first:first + width] = np.fmax(self.box_max[children[0::2]], self.box_max[children[1::2]])
+            width //= 2
+
+    @classmethod
+    def from_responses(cls, responses, unreal_origin = (0, 0, 0), leaf_size = 8):
+        """
+        Builds the scene from the result of `simGetMeshPositionVertexBuffers()`
+
+        Args:
+            responses (list[MeshPositionVertexBuffersResponse]):
+            unreal_origin (tuple, optional): Unreal coordinates in centimeters of the NED origin, i.e. of the PlayerStart
+            leaf_size (int, optional): Triangles per BVH leaf
+
+        Returns:
+            SceneMesh:
+        """
+        origin = np.asarray(unreal_origin, dtype = np.float64)
+        vertices, triangles, mesh_ids, names = [], [], [], []
+        offset = 0
+        for mesh in responses:
+            mesh_vertices = np.asarray(mesh.vertices, dtype = np.float64).reshape(-1, 3)
+            mesh_triangles = np.asarray(mesh.indices, dtype = np.int64).reshape(-1, 3)
+            if len(mesh_triangles) == 0:
+                continue
+            # Unreal is left handed with z up in centimeters, NED is z down in meters
+            ned = (mesh_vertices - origin) / 100
+            ned[:, 2] *= -1
+            vertices.append(ned)
+            triangles.append(mesh_triangles + offset)
+            mesh_ids.append(np.full(len(mesh_triangles), len(names), dtype = np.int32))
+            names.append(mesh.name)
+            offset += len(mesh_vertices)
+
+        if not triangles:
+            raise ValueError('The scene has no mesh with triangles')
+        scene = cls(np.concatenate(vertices), np.concatenate(triangles), np.concatenate(mesh_ids), names, leaf_size)
+        scene.unreal_origin = tuple(float(v) for v in origin)
+        return scene
+
+    @classmethod
+    def from_client(cls, client, level = None, cache_dir = DEFAULT_CACHE_DIR, unreal_origin = (0, 0, 0), leaf_size = 8, refresh = False):
+        """
+        Loads the scene of a level from the cache, or fetches it from the simulator and caches it
+
+        Args:
+            client (VehicleClient): Client connected to the simulator
+            level (str, optional): Name of the loaded level, used as cache key, None to skip the cache. A cached scene built
+                                   with another unreal_origin or leaf_size is rebuilt
+            cache_dir (str, optional): Directory of the cache files
+            unreal_origin (tuple, optional): Unreal coordinates in centimeters of the NED origin, i.e. of the PlayerStart
+            leaf_size (int, optional): Triangles per BVH leaf
+            refresh (bool, optional): Fetch from the simulator even if the level is cached
+
+        Returns:
+            SceneMesh:
+        """
+        path = os.path.join(cache_dir, '{}.npz'.format(level)) if level else None
+        if path and os.path.isfile(path) and not refresh:
+            try:
+                mesh = cls.load(path)
+            except ValueError:
+                mesh = None
+            origin = tuple(float(v) for v in unreal_origin)
+            if mesh is not None and mesh.leaf_size == leaf_size and mesh.unreal_origin == origin:
+                return mesh
+
+        mesh = cls.from_responses(client.simGetMeshPositionVertexBuffers(), unreal_origin, leaf_size)
+        if path:
+            os.makedirs(cache_dir, exist_ok = True)
+            mesh.save(path)
+        return mesh
+
+    def save(self, path):
+        """
+        Saves the meshes and the BVH, so `load()` does not need to rebuild it
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, version = CACHE_VERSION, vertices = self.vertices, triangles = self.triangles, mesh_ids = self.mesh_ids,
+                     names = np.array(self.names, dtype = str), leaf_size = self.leaf_size, box_min = self.box_min, box_max = self.box_max,
+                     unreal_origin = np.array(self.unreal_origin if self.unreal_origin is not None else [np.nan] * 3))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a scene saved with `save()`
+
+        Returns:
+            SceneMesh:
+        """
+        with np.load(path) as data:
+            if int(data['version']) != CACHE_VERSION:
+                raise ValueError('{} was saved by another version of SceneMesh'.format(path))
+            mesh = cls(data['vertices'], data['triangles'], data['mesh_ids'], data['names'].tolist(), int(data['leaf_size']),
+                       _bvh = (data['box_min'], data['box_max']))
+            origin = data['unreal_origin']
+            mesh.unreal_origin = None if np.isnan(origin).any() else tuple(float(v) for v in origin)
+            return mesh
+
+    @property
+    def bounds(self):
+        """
+        Returns:
+            tuple: (min, max) corners of the scene
+        """
+        return self.box_min[0], self.box_max[0]
+
+    def _leaf_pairs(self, count, node_test):
+        # walks the tree one level at a time for all queries, keeping the (query, node) pairs that pass node_test
+        queries = np.arange(count)
+        nodes = np.zeros(count, dtype = np.int64)
+        for level in range(self.depth + 1):
+            keep = node_test(queries, nodes)
+            queries, nodes = queries[keep], nodes[keep]
+            if level < self.depth:
+                queries = np.repeat(queries, 2)
+                nodes = (2 * nodes[:, np.newaxis] + (1, 2)).ravel()
+        return queries, nodes - (self.num_leaves - 1)
+
+    def _triangle_pairs(self, queries, leaves):
+        triangles = self.leaf_triangles[leaves]
+        queries = np.broadcast_to(queries[:, np.newaxis], triangles.shape)
+        valid = triangles >= 0
+        return queries[valid], triangles[valid]
+
+    def cast_rays(self, origins, directions, max_distance = np.inf):
+        """
+        Finds the first hit of each ray
+
+        Args:
+            origins (np.ndarray): (N, 3) ray origins, or a single origin for all rays
+            directions (np.ndarray): (N, 3) ray directions, need not be normalized, or a single direction for all rays
+            max_distance (float or np.ndarray, optional): Maximum hit distance, for all rays or per ray
+
+        Returns:
+            RayHits:
+        """
+        origins, directions = np.broadcast_arrays(np.atleast_2d(np.asarray(origins, dtype = np.float64)),
+                                                  np.atleast_2d(np.asarray(directions, dtype = np.float64)))
+        count = len(directions)
+        max_distance = np.broadcast_to(np.asarray(max_distance, dtype = np.float64), (count,))
+
+        distance = np.full(count, np.inf)
+        triangle = np.full(count, -1, dtype = np.int64)
+        for start in range(0, count, QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            distance[chunk], triangle[chunk] = self._cast_chunk(origins[chunk], directions[chunk], max_distance[chunk])
+
+        hit = triangle >= 0
+        norms = np.linalg.norm(directions, axis = 1)
+        with np.errstate(invalid = 'ignore'):
+            point = origins + directions * (distance / np.where(norms > 0, norms, 1))[:, np.newaxis]
+        point[~hit] = np.nan
+        return RayHits(hit, distance, point, triangle, np.where(hit, self.mesh_ids[triangle], -1))
+
+    def _cast_chunk(self, origins, directions, max_distance):
+        norms = np.linalg.norm(directions, axis = 1)
+        directions = directions / np.where(norms > 0, norms, 1)[:, np.newaxis]
+        # tiny components instead of zeros keep the slab test free of 0 * inf
+        inverse = 1 / np.where(np.abs(directions) < 1e-12, 1e-12, directions)
+
+        def ray_box_test(rays, nodes):
+            o, inv = origins[rays], inverse[rays]
+            t1 = (self.box_min[nodes] - o) * inv
+            t2 = (self.box_max[nodes] - o) * inv
+            near = np.minimum(t1, t2).max(axis = 1)
+            far = np.maximum(t1, t2).min(axis = 1)
+            return (near <= far) & (far >= 0) & (near <= max_distance[rays])
+
+        with np.errstate(invalid = 'ignore', over = 'ignore'):
+            rays, leaves = self._leaf_pairs(len(origins), ray_box_test)
+        rays, triangles = self._triangle_pairs(rays, leaves)
+
+        # Moller-Trumbore
+        d, e1, e2 = directions[rays], self._e1[triangles], self._e2[triangles]
+        p = np.cross(d, e2)
+        det = np.einsum('ij,ij->i', e1, p)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            inv_det = 1 / det
+            s = origins[rays] - self._v0[triangles]
+            u = np.einsum('ij,ij->i', s, p) * inv_det
+            q = np.cross(s, e1)
+            v = np.einsum('ij,ij->i', d, q) * inv_det
+            t = np.einsum('ij,ij->i', e2, q) * inv_det
+            valid = (np.abs(det) > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0) & (t <= max_distance[rays])
+
+        rays, triangles, t = rays[valid], triangles[valid], t[valid]
+        distance = np.full(len(origins), np.inf)
+        np.minimum.at(distance, rays, t)
+        triangle = np.full(len(origins), -1, dtype = np.int64)
+        first = t == distance[rays]
+        triangle[rays[first]] = triangles[first]
+        return distance, triangle
+
+    def line_of_sight(self, points1, points2):
+        """
+        Tests whether the segments between pairs of points are free of any surface, the local version of
+        `simTestLineOfSightBetweenPoints()`
+
+        Args:
+            points1 (np.ndarray): (N, 3) source points, or a single point for all pairs
+            points2 (np.ndarray): (N, 3) target points, or a single point for all pairs
+
+        Returns:
+            np.ndarray: (N,) True where the target is visible from the source
+        """
+        points1, points2 = np.broadcast_arrays(np.atleast_2d(np.asarray(points1, dtype = np.float64)),
+                                               np.atleast_2d(np.asarray(points2, dtype = np.float64)))
+        directions = points2 - points1
+        lengths = np.linalg.norm(directions, axis = 1)
+        # surfaces right at the target, e.g. the ground under a marker, do not block the view
+        hits = self.cast_rays(points1, directions, lengths * (1 - 1e-6))
+        return ~hits.hit
+
+    def nearest_surface(self, points, max_distance = np.inf):
+        """
+        Finds the nearest surface point to each query point
+
+        Args:
+            points (np.ndarray): (N, 3) query points
+            max_distance (float, optional): Only look for surfaces within this distance
+
+        Returns:
+            SurfacePoints:
+        """
+        points = np.atleast_2d(np.asarray(points, dtype = np.float64))
+        count = len(points)
+        distance = np.full(count, np.inf)
+        nearest = np.full((count, 3), np.nan)
+        triangle = np.full(count, -1, dtype = np.int64)
+        for start in range(0, count, QUERY_CHUNK_SIZE):
+            chunk = slice(start, start + QUERY_CHUNK_SIZE)
+            distance[chunk], nearest[chunk], triangle[chunk] = self._nearest_chunk(points[chunk], max_distance)
+
+        found = triangle >= 0
+        return SurfacePoints(distance, nearest, triangle, np.where(found, self.mesh_ids[triangle], -1))
+
+    def _triangle_distances(self, points, queries, triangles):
+        a = self._v0[triangles]
+        closest = _closest_points_on_triangles(points[queries], a, a + self._e1[triangles], a + self._e2[triangles])
+        return closest, np.linalg.norm(points[queries] - closest, axis = 1)
+
+    def _nearest_chunk(self, points, max_distance):
+        bound = np.full(len(points), float(max_distance))
+        queries = np.arange(len(points))
+
+        # the triangles of the leaf reached by always taking the nearer child give a tight starting bound
+        nodes = np.zeros(len(points), dtype = np.int64)
+        with np.errstate(invalid = 'ignore'):
+            for _ in range(self.depth):
+                children = 2 * nodes[:, np.newaxis] + (1, 2)
+                p = points[:, np.newaxis]
+                near = np.linalg.norm(p - np.clip(p, self.box_min[children], self.box_max[children]), axis = 2)
+                nodes = children[queries, np.argmin(np.where(np.isnan(near), np.inf, near), axis = 1)]
+        seed_queries, seed_triangles = self._triangle_pairs(queries, nodes - (self.num_leaves - 1))
+        np.fmin.at(bound, seed_queries, self._triangle_distances(points, seed_queries, seed_triangles)[1])
+
+        # a box holds at least one triangle, so the distance to its farthest corner also bounds the nearest distance
+        def point_box_test(queries, nodes):
+            p, lo, hi = points[queries], self.box_min[nodes], self.box_max[nodes]
+            near = np.linalg.norm(p - np.clip(p, lo, hi), axis = 1)
+            far = np.linalg.norm(np.maximum(np.abs(p - lo), np.abs(p - hi)), axis = 1)
+            np.fmin.at(bound, queries, far)
+            return near <= bound[queries]
+
+        with np.errstate(invalid = 'ignore'):
+            queries, leaves = self._leaf_pairs(len(points), point_box_test)
+        queries, triangles = self._triangle_pairs(queries, leaves)
+
+        closest, d = self._triangle_distances(points, queries, triangles)
+        valid = d <= max_distance
+        queries, triangles, closest, d = queries[valid], triangles[valid], closest[valid], d[valid]
+
+        distance = np.full(len(points), np.inf)
+        np.minimum.at(distance, queries, d)
+        first = d == distance[queries]
+        triangle = np.full(len(points), -1, dtype = np.int64)
+        nearest = np.full((len(points), 3), np.nan)
+        triangle[queries[first]] = triangles[first]
+        nearest[queries[first]] = closest[first]
+        return distance, nearest, triangle
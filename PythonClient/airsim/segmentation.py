@@ -0,0 +1,222 @@
+import functools
+import re
+import numpy as np
+
+# RGB color of each segmentation ID, as rendered by the engine (docs/seg_rgbs.txt)
+SEGMENTATION_COLORS = (
+    (0, 0, 0), (153, 108, 6), (112, 105, 191), (89, 121, 72), (190, 225, 64), (206, 190, 59), (81, 13, 36), (115, 176, 195),
+    (161, 171, 27), (135, 169, 180), (29, 26, 199), (102, 16, 239), (242, 107, 146), (156, 198, 23), (49, 89, 160), (68, 218, 116),
+    (11, 236, 9), (196, 30, 8), (121, 67, 28), (0, 53, 65), (146, 52, 70), (226, 149, 143), (151, 126, 171), (194, 39, 7),
+    (205, 120, 161), (212, 51, 60), (211, 80, 208), (189, 135, 188), (54, 72, 205), (103, 252, 157), (124, 21, 123), (19, 132, 69),
+    (195, 237, 132), (94, 253, 175), (182, 251, 87), (90, 162, 242), (199, 29, 1), (254, 12, 229), (35, 196, 244), (220, 163, 49),
+    (86, 254, 214), (152, 3, 129), (92, 31, 106), (207, 229, 90), (125, 75, 48), (98, 55, 74), (126, 129, 238), (222, 153, 109),
+    (85, 152, 34), (173, 69, 31), (37, 128, 125), (58, 19, 33), (134, 57, 119), (218, 124, 115), (120, 0, 200), (225, 131, 92),
+    (246, 90, 16), (51, 155, 241), (202, 97, 155), (184, 145, 182), (96, 232, 44), (133, 244, 133), (180, 191, 29), (1, 222, 192),
+    (99, 242, 104), (91, 168, 219), (65, 54, 217), (148, 66, 130), (203, 102, 204), (216, 78, 75), (234, 20, 250), (109, 206, 24),
+    (164, 194, 17), (157, 23, 236), (158, 114, 88), (245, 22, 110), (67, 17, 35), (181, 213, 93), (170, 179, 42), (52, 187, 148),
+    (247, 200, 111), (25, 62, 174), (100, 25, 240), (191, 195, 144), (252, 36, 67), (241, 77, 149), (237, 33, 141), (119, 230, 85),
+    (28, 34, 108), (78, 98, 254), (114, 161, 30), (75, 50, 243), (66, 226, 253), (46, 104, 76), (8, 234, 216), (15, 241, 102),
+    (93, 14, 71), (192, 255, 193), (253, 41, 164), (24, 175, 120), (185, 243, 231), (169, 233, 97), (243, 215, 145), (72, 137, 21),
+    (160, 113, 101), (214, 92, 13), (167, 140, 147), (101, 109, 181), (53, 118, 126), (3, 177, 32), (40, 63, 99), (186, 139, 153),
+    (88, 207, 100), (71, 146, 227), (236, 38, 187), (215, 4, 215), (18, 211, 66), (113, 49, 134), (47, 42, 63), (219, 103, 127),
+    (57, 240, 137), (227, 133, 211), (145, 71, 201), (217, 173, 183), (250, 40, 113), (208, 125, 68), (224, 186, 249), (69, 148, 46),
+    (239, 85, 20), (108, 116, 224), (56, 214, 26), (179, 147, 43), (48, 188, 172), (221, 83, 47), (155, 166, 218), (62, 217, 189),
+    (198, 180, 122), (201, 144, 169), (132, 2, 14), (128, 189, 114), (163, 227, 112), (45, 157, 177), (64, 86, 142), (118, 193, 163),
+    (14, 32, 79), (200, 45, 170), (74, 81, 2), (59, 37, 212), (73, 35, 225), (95, 224, 39), (84, 170, 220), (159, 58, 173),
+    (17, 91, 237), (31, 95, 84), (34, 201, 248), (63, 73, 209), (129, 235, 107), (231, 115, 40), (36, 74, 95), (238, 228, 154),
+    (61, 212, 54), (13, 94, 165), (141, 174, 0), (140, 167, 255), (117, 93, 91), (183, 10, 186), (165, 28, 61), (144, 238, 194),
+    (12, 158, 41), (76, 110, 234), (150, 9, 121), (142, 1, 246), (230, 136, 198), (5, 60, 233), (232, 250, 80), (143, 112, 56),
+    (187, 70, 156), (2, 185, 62), (138, 223, 226), (122, 183, 222), (166, 245, 3), (175, 6, 140), (240, 59, 210), (248, 44, 10),
+    (83, 82, 52), (223, 248, 167), (87, 15, 150), (111, 178, 117), (197, 84, 22), (235, 208, 124), (9, 76, 45), (176, 24, 50),
+    (154, 159, 251), (149, 111, 207), (168, 231, 15), (209, 247, 202), (80, 205, 152), (178, 221, 213), (27, 8, 38), (244, 117, 51),
+    (107, 68, 190), (23, 199, 139), (171, 88, 168), (136, 202, 58), (6, 46, 86), (105, 127, 176), (174, 249, 197), (172, 172, 138),
+    (228, 142, 81), (7, 204, 185), (22, 61, 247), (233, 100, 78), (127, 65, 105), (33, 87, 158), (139, 156, 252), (42, 7, 136),
+    (20, 99, 179), (79, 150, 223), (131, 182, 184), (110, 123, 37), (60, 138, 96), (210, 96, 94), (123, 48, 18), (137, 197, 162),
+    (188, 18, 5), (39, 219, 151), (204, 143, 135), (249, 79, 73), (77, 64, 178), (41, 246, 77), (16, 154, 4), (116, 134, 19),
+    (4, 122, 235), (177, 106, 230), (21, 119, 12), (104, 5, 98), (50, 130, 53), (30, 192, 25), (26, 165, 166), (10, 160, 82),
+    (106, 43, 131), (44, 216, 103), (255, 101, 221), (32, 151, 196), (213, 220, 89), (70, 209, 228), (97, 184, 83), (82, 239, 232),
+    (251, 164, 128), (193, 11, 245), (38, 27, 159), (229, 141, 203), (130, 56, 55), (147, 210, 11), (162, 203, 118), (255, 255, 255),
+)
+
+class SegmentationPalette:
+    """
+    Maps segmentation IDs to the RGB colors of Segmentation images and back, without querying the simulator
+
+    Colors are packed into 24-bit integers r << 16 | g << 8 | b. The sorted packed colors serve as the lookup array, so
+    `decode()` turns a whole frame into IDs with a single `np.searchsorted`.
+
+    Args:
+        colors (list, optional): RGB color of each ID, defaults to the engine palette
+    """
+    def __init__(self, colors = SEGMENTATION_COLORS):
+        self.colors = np.array(colors, dtype=np.uint8).reshape(-1, 3)
+        self.colors.flags.writeable = False
+
+        packed = self._pack(self.colors)
+        self._sorted_packed, first = np.unique(packed, return_index=True)
+        if len(self._sorted_packed) != len(packed):
+            raise ValueError('Segmentation palette colors must be unique')
+        self._sorted_ids = first.astype(np.int16)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def default(cls):
+        """
+        Returns:
+            SegmentationPalette: Shared instance for the engine palette
+        """
+        return cls()
+
+    @staticmethod
+    def _pack(rgb):
+        rgb = np.asarray(rgb)
+        return (rgb[..., 0].astype(np.int32) << 16) | (rgb[..., 1].astype(np.int32) << 8) | rgb[..., 2].astype(np.int32)
+
+    def __len__(self):
+        return len(self.colors)
+
+    def color(self, segmentation_id):
+        """
+        Args:
+            segmentation_id (int): Segmentation ID
+
+        Returns:
+            tuple: r, g, b color of the ID
+        """
+        return tuple(int(c) for c in self.colors[segmentation_id])
+
+    def id(self, color):
+        """
+        Args:
+            color (tuple): r, g, b color
+
+        Returns:
+            int: Segmentation ID of the color, -1 if it is not in the palette
+        """
+        return int(self.decode(np.asarray(color).reshape(1, 1, 3))[0, 0])
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Segmentation ID to r, g, b color, for every ID
+        """
+        return {segmentation_id: self.color(segmentation_id) for segmentation_id in range(len(self))}
+
+    def encode(self, id_map):
+        """
+        Colors an ID map like the engine renders it
+
+        Args:
+            id_map (numpy.ndarray): Array of segmentation IDs
+
+        Returns:
+            numpy.ndarray: uint8 RGB image of shape id_map.shape + (3,)
+        """
+        return self.colors[id_map]
+
+    def decode(self, image, bgr = False):
+        """
+        Converts a Segmentation image to segmentation IDs
+
+        Args:
+            image (numpy.ndarray): (H, W, 3) or (H, W, 4) uint8 image, e.g. `image_data_uint8` of a response from `simGetImages(..., as_numpy=True)`
+            bgr (bool, optional): Whether the channels are in BGR order, e.g. an image loaded with OpenCV
+
+        Returns:
+            numpy.ndarray: (H, W) np.int16 array of IDs, -1 for colors which are not in the palette
+        """
+        image = np.asarray(image)
+        if image.ndim != 3 or image.shape[2] < 3:
+            raise ValueError('Expected an (H, W, 3) or (H, W, 4) image, got shape {}'.format(image.shape))
+        rgb = image[..., 2::-1] if bgr else image[..., :3]
+
+        packed = self._pack(rgb)
+        index = np.searchsorted(self._sorted_packed, packed)
+        np.minimum(index, len(self._sorted_packed) - 1, out=index)
+        ids = self._sorted_ids[index]
+        ids[self._sorted_packed[index] != packed] = -1
+        return ids
+
+class SegmentationPlan:
+    """
+    Assigns segmentation IDs by name regex with one scene listing and one pipelined pass of exact-name RPCs
+
+    Setting IDs with `simSetSegmentationObjectID(regex, id, True)` makes the server match the regex against every mesh,
+    once per rule. A plan lists the scene objects once, matches the rules locally, and sends one exact-name call per object
+    whose ID changes, all pipelined. Rules are applied in order, so a later rule overrides an earlier one just like issuing
+    the regex calls in that order. As on the server, regexes must match the whole name and ignore case. Resolved assignments are
+    cached per map name, so applying the plan again after reloading a level only sends the assignments.
+
+    Names are matched against `simListSceneObjects()`, which lists actor names, so this relies on the default "OwnerName" mesh naming.
+
+        plan = SegmentationPlan([('House.*', 1), ('Tree.*', 2)], default_id=0)
+        plan.apply(client, map_name='Blocks')
+
+    Args:
+        rules (list): (name regex, segmentation ID) pairs in priority order
+        default_id (int, optional): ID first given to every mesh matching default_regex with a single regex call, None to leave other meshes as they are
+        default_regex (str, optional): Meshes which get default_id
+    """
+    def __init__(self, rules, default_id = None, default_regex = r'[\w]*'):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), int(object_id)) for pattern, object_id in rules]
+        self.default_id = default_id
+        self.default_regex = default_regex
+        self._default_pattern = re.compile(default_regex, re.IGNORECASE)
+        self._assignments = {}
+
+    def resolve(self, object_names):
+        """
+        Matches the rules against object names
+
+        Args:
+            object_names (list[str]): Names of the scene objects
+
+        Returns:
+            dict: Object name to segmentation ID, only for objects whose ID isn't already set by the default
+        """
+        assignments = {}
+        for name in object_names:
+            for pattern, object_id in reversed(self.rules):
+                if pattern.fullmatch(name):
+                    if object_id != self.default_id or not self._default_pattern.fullmatch(name):
+                        assignments[name] = object_id
+                    break
+        return assignments
+
+    def assignments(self, client, map_name = None):
+        """
+        Args:
+            client (VehicleClient): Client connected to the simulator
+            map_name (str, optional): Key for caching the assignments, None to always list the scene objects
+
+        Returns:
+            dict: Object name to segmentation ID, see `resolve()`
+        """
+        if map_name is not None and map_name in self._assignments:
+            return self._assignments[map_name]
+        assignments = self.resolve(client.simListSceneObjects())
+        if map_name is not None:
+            self._assignments[map_name] = assignments
+        return assignments
+
+    def apply(self, client, map_name = None):
+        """
+        Sets the segmentation IDs in the simulator
+
+        Args:
+            client (VehicleClient): Client connected to the simulator
+            map_name (str, optional): Key for caching the assignments, None to always list the scene objects
+
+        Returns:
+            dict: Object name to whether its mesh was found, plus default_regex if default_id is set
+        """
+        results = {}
+        if self.default_id is not None:
+            # must complete before the exact-name calls since the server handles requests concurrently
+            results[self.default_regex] = client.simSetSegmentationObjectID(self.default_regex, self.default_id, True)
+
+        pipeline = client.pipelined()
+        futures = {name: pipeline.simSetSegmentationObjectID(name, object_id) for name, object_id in self.assignments(client, map_name).items()}
+        for name, future in futures.items():
+            results[name] = future.join()
+        return results
@@ -0,0 +1,115 @@
+import collections
+import time
+
+StepResult = collections.namedtuple('StepResult', ['state', 'images', 'collision'])
+StepResult.__doc__ = """
+What was captured after a step, while the simulation was paused
+
+Attributes:
+    state: Result of the state API, e.g. MultirotorState or CarState, None if disabled
+    images (list[ImageResponse]): Responses to the image requests, decoded with `as_numpy=True`
+    collision (CollisionInfo): Collision info, None if disabled
+"""
+
+class SteppedSimulation:
+    """
+    Advances a paused simulation by fixed steps and captures state, images and collision between steps
+
+    The simulation only runs inside `step()`, for either dt seconds of simulation time or a number of rendered frames,
+    so rollouts run as fast as the simulator can go instead of at wall-clock speed, and the same commands give the
+    same steps. Commands such as `moveByVelocityAsync(...)` or `setCarControls(...)` should be sent before `step()`
+    without joining; they run during the step.
+
+        with SteppedSimulation(client, dt=0.1, image_requests=[airsim.ImageRequest("0", airsim.ImageType.Scene, False, False)]) as sim:
+            client.moveByVelocityAsync(1, 0, 0, 0.1)
+            result = sim.step()
+
+    The capture is pipelined, so state, images and collision cost a single round trip.
+
+    Args:
+        client (VehicleClient): Client connected to the simulator
+        dt (float, optional): Simulation seconds per step
+        frames (int, optional): Frames per step, instead of dt
+        image_requests (list[ImageRequest], optional): Images to capture after each step
+        vehicle_name (str, optional): Vehicle to capture
+        state_api (str, optional): Name of the client API returning the vehicle state, by default getMultirotorState or getCarState
+                                   depending on the client, None for no state
+        collision (bool, optional): Whether to capture collision info
+        poll_interval (float, optional): Seconds between checks for the end of a step
+    """
+    def __init__(self, client, dt = None, frames = None, image_requests = None, vehicle_name = '',
+                 state_api = 'auto', collision = True, poll_interval = 0.001):
+        if (dt is None) == (frames is None):
+            raise ValueError('Exactly one of dt and frames must be given')
+
+        if state_api == 'auto':
+            state_api = next((api for api in ('getMultirotorState', 'getCarState') if hasattr(client, api)), None)
+
+        self.client = client
+        self.dt = dt
+        self.frames = frames
+        self.image_requests = image_requests or []
+        self.vehicle_name = vehicle_name
+        self.state_api = state_api
+        self.collision = collision
+        self.poll_interval = poll_interval
+        self.steps = 0
+
+    def start(self):
+        """
+        Pauses the simulation, it then only runs inside `step()`
+        """
+        self.client.simPause(True)
+        return self
+
+    def stop(self):
+        """
+        Resumes the simulation in real time
+        """
+        self.client.simPause(False)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def advance(self):
+        """
+        Runs the simulation for one step and waits until it is paused again
+        """
+        if self.dt is not None:
+            self.client.simContinueForTime(self.dt)
+        else:
+            self.client.simContinueForFrames(self.frames)
+
+        # continuing returns right away, the simulator pauses itself at the end of the step
+        while not self.client.simIsPause():
+            time.sleep(self.poll_interval)
+        self.steps += 1
+
+    def capture(self):
+        """
+        Gets state, images and collision in one pipelined round trip
+
+        Returns:
+            StepResult:
+        """
+        pipeline = self.client.pipelined()
+        state = getattr(pipeline, self.state_api)(vehicle_name = self.vehicle_name) if self.state_api else None
+        images = pipeline.simGetImages(self.image_requests, vehicle_name = self.vehicle_name, as_numpy = True) if self.image_requests else None
+        collision = pipeline.simGetCollisionInfo(vehicle_name = self.vehicle_name) if self.collision else None
+
+        return StepResult(state.join() if state else None,
+                          images.join() if images else [],
+                          collision.join() if collision else None)
+
+    def step(self):
+        """
+        Advances one step and captures the result
+
+        Returns:
+            StepResult:
+        """
+        self.advance()
+        return self.capture()
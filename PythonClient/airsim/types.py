@@ -3,7 +3,52 @@ import msgpackrpc #install as admin: pip install msgpack-rpc-python
 import numpy as np #pip install numpy
 import math
 
+_msgpack_decoders = {}
+
+def _msgpack_fields(cls):
+    """Public data attributes of a MsgpackMixin type, mapped to their default values"""
+    fields = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if not (name.startswith('_') or callable(value) or isinstance(value, (staticmethod, classmethod, property))):
+                fields[name] = value
+    return fields
+
+def _build_msgpack_decoder(cls, fields, nested_types, is_compact):
+    """
+    Generates the decoding function of a MsgpackMixin type
+
+    Fields holding another MsgpackMixin type are decoded with that type's decoder, everything else is stored as received.
+    Dict backed types keep every key the server sent, compact types only fill their slots
+    """
+    namespace = {'new': object.__new__, 'cls': cls, 'missing': object(), 'empty': {}}
+    lines = ['def decode(encoded):', '    obj = new(cls)']
+    if is_compact:
+        lines.append('    get = encoded.get')
+        for name, default in fields.items():
+            namespace['default_' + name] = default
+            if name in nested_types:
+                namespace['decode_' + name] = nested_types[name].from_msgpack
+                lines.append('    value = get({0!r}, missing)'.format(name))
+                # a missing nested field gets its own default instance of the nested type
+                lines.append('    obj.{0} = decode_{0}(value) if type(value) is dict else (decode_{0}(empty) if value is missing else value)'.format(name))
+            else:
+                lines.append('    obj.{0} = get({0!r}, default_{0})'.format(name))
+    else:
+        lines.append('    state = dict(encoded)')
+        for name, nested_type in nested_types.items():
+            namespace['decode_' + name] = nested_type.from_msgpack
+            lines.append('    value = state.get({0!r})'.format(name))
+            lines.append('    if type(value) is dict:')
+            lines.append('        state[{0!r}] = decode_{0}(value)'.format(name))
+        lines.append('    obj.__dict__ = state')
+    lines.append('    return obj')
+    exec('\n'.join(lines), namespace)
+    return namespace['decode']
+
 class MsgpackMixin:
+    __slots__ = ()
+
     def __repr__(self):
         from pprint import pformat
         return "<" + type(self).__name__ + "> " + pformat(vars(self), indent=4, width=1)
@@ -11,13 +56,85 @@ class MsgpackMixin:
     def to_msgpack(self, *args, **kwargs):
         return self.__dict__
 
+    @classmethod
+    def _msgpack_decoder(cls):
+        # generated on first use of each type
+        decoder = _msgpack_decoders.get(cls)
+        if decoder is None:
+            fields = _msgpack_fields(cls)
+            nested_types = {name: type(value) for name, value in fields.items() if isinstance(value, MsgpackMixin)}
+            decoder = _msgpack_decoders[cls] = _build_msgpack_decoder(cls, fields, nested_types, is_compact = False)
+        return decoder
+
     @classmethod
     def from_msgpack(cls, encoded):
-        obj = cls()
-        #obj.__dict__ = {k.decode('utf-8'): (from_msgpack(v.__class__, v) if hasattr(v, "__dict__") else v) for k, v in encoded.items()}
-        obj.__dict__ = { k : (v if not isinstance(v, dict) else getattr(getattr(obj, k).__class__, "from_msgpack")(v)) for k, v in encoded.items()}
-        #return cls(**msgpack.unpack(encoded))
-        return obj
+        return cls._msgpack_decoder()(encoded)
+
+class CompactMsgpackMixin(MsgpackMixin):
+    """
+    Base of the `__slots__` based variants of MsgpackMixin types, see `compact_type()`
+
+    Instances have no `__dict__`, which makes them smaller and faster to create, but only the fields known to the
+    Python type are kept
+    """
+    __slots__ = ()
+
+    def __init__(self):
+        for name, default in self._defaults.items():
+            setattr(self, name, type(default).from_msgpack({}) if isinstance(default, MsgpackMixin) else default)
+
+    def __repr__(self):
+        from pprint import pformat
+        return "<" + type(self).__name__ + "> " + pformat(self.to_msgpack(), indent=4, width=1)
+
+    def to_msgpack(self, *args, **kwargs):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def _msgpack_decoder(cls):
+        decoder = _msgpack_decoders.get(cls)
+        if decoder is None:
+            nested_types = {name: compact_type(type(value)) for name, value in cls._defaults.items() if isinstance(value, MsgpackMixin)}
+            decoder = _msgpack_decoders[cls] = _build_msgpack_decoder(cls, cls._defaults, nested_types, is_compact = True)
+        return decoder
+
+_compact_types = {}
+
+def compact_type(msgpack_type):
+    """
+    Returns the `__slots__` based variant of a MsgpackMixin type, e.g. `CompactVector3r` for `Vector3r`
+
+    The variant has the same methods and fields, and decodes nested fields into compact types when one exists.
+    Types without a compact variant are returned unchanged
+
+    Args:
+        msgpack_type (type): A MsgpackMixin type
+
+    Returns:
+        type:
+    """
+    return _compact_types.get(msgpack_type, msgpack_type)
+
+def _is_same_type(obj, other):
+    """Whether two objects have the same MsgpackMixin type, a compact variant counting as its regular type"""
+    return getattr(type(obj), '_msgpack_type', type(obj)) is getattr(type(other), '_msgpack_type', type(other))
+
+def _variant_of(obj, msgpack_type):
+    """msgpack_type, or its compact variant if obj is compact, for objects built by the methods of obj"""
+    return compact_type(msgpack_type) if isinstance(obj, CompactMsgpackMixin) else msgpack_type
+
+def _make_compact_type(msgpack_type):
+    fields = _msgpack_fields(msgpack_type)
+    namespace = {name: value for name, value in vars(msgpack_type).items()
+                    if name not in fields and name not in ('__dict__', '__weakref__', '__qualname__')}
+    namespace['__slots__'] = tuple(fields)
+    # nested defaults are compact too when their type has a compact variant, so compact objects are never mixed with regular ones
+    namespace['_defaults'] = {name: compact_type(type(value)).from_msgpack({}) if isinstance(value, MsgpackMixin) else value
+                                for name, value in fields.items()}
+    namespace['_msgpack_type'] = msgpack_type
+    compact = type('Compact' + msgpack_type.__name__, (CompactMsgpackMixin,), namespace)
+    _compact_types[msgpack_type] = compact
+    return compact
 
 class _ImageType(type):
     @property
@@ -104,33 +221,33 @@ class Vector3r(MsgpackMixin):
         return (math.isnan(self.x_val) or math.isnan(self.y_val) or math.isnan(self.z_val))
 
     def __add__(self, other):
-        return Vector3r(self.x_val + other.x_val, self.y_val + other.y_val, self.z_val + other.z_val)
+        return type(self)(self.x_val + other.x_val, self.y_val + other.y_val, self.z_val + other.z_val)
 
     def __sub__(self, other):
-        return Vector3r(self.x_val - other.x_val, self.y_val - other.y_val, self.z_val - other.z_val)
+        return type(self)(self.x_val - other.x_val, self.y_val - other.y_val, self.z_val - other.z_val)
 
     def __truediv__(self, other):
         if type(other) in [int, float] + np.sctypes['int'] + np.sctypes['uint'] + np.sctypes['float']:
-            return Vector3r( self.x_val / other, self.y_val / other, self.z_val / other)
+            return type(self)( self.x_val / other, self.y_val / other, self.z_val / other)
         else:
             raise TypeError('unsupported operand type(s) for /: %s and %s' % ( str(type(self)), str(type(other))) )
 
     def __mul__(self, other):
         if type(other) in [int, float] + np.sctypes['int'] + np.sctypes['uint'] + np.sctypes['float']:
-            return Vector3r(self.x_val*other, self.y_val*other, self.z_val*other)
+            return type(self)(self.x_val*other, self.y_val*other, self.z_val*other)
         else:
             raise TypeError('unsupported operand type(s) for *: %s and %s' % ( str(type(self)), str(type(other))) )
 
     def dot(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             return self.x_val*other.x_val + self.y_val*other.y_val + self.z_val*other.z_val
         else:
             raise TypeError('unsupported operand type(s) for \'dot\': %s and %s' % ( str(type(self)), str(type(other))) )
 
     def cross(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             cross_product = np.cross(self.to_numpy_array(), other.to_numpy_array())
-            return Vector3r(cross_product[0], cross_product[1], cross_product[2])
+            return type(self)(cross_product[0], cross_product[1], cross_product[2])
         else:
             raise TypeError('unsupported operand type(s) for \'cross\': %s and %s' % ( str(type(self)), str(type(other))) )
 
@@ -141,7 +258,7 @@ class Vector3r(MsgpackMixin):
         return ( (self.x_val-other.x_val)**2 + (self.y_val-other.y_val)**2 + (self.z_val-other.z_val)**2 )**0.5
 
     def to_Quaternionr(self):
-        return Quaternionr(self.x_val, self.y_val, self.z_val, 0)
+        return _variant_of(self, Quaternionr)(self.x_val, self.y_val, self.z_val, 0)
 
     def to_numpy_array(self):
         return np.array([self.x_val, self.y_val, self.z_val], dtype=np.float32)
@@ -169,16 +286,16 @@ class Quaternionr(MsgpackMixin):
         return (math.isnan(self.w_val) or math.isnan(self.x_val) or math.isnan(self.y_val) or math.isnan(self.z_val))
 
     def __add__(self, other):
-        if type(self) == type(other):
-            return Quaternionr( self.x_val+other.x_val, self.y_val+other.y_val, self.z_val+other.z_val, self.w_val+other.w_val )
+        if _is_same_type(self, other):
+            return type(self)( self.x_val+other.x_val, self.y_val+other.y_val, self.z_val+other.z_val, self.w_val+other.w_val )
         else:
             raise TypeError('unsupported operand type(s) for +: %s and %s' % ( str(type(self)), str(type(other))) )
 
     def __mul__(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             t, x, y, z = self.w_val, self.x_val, self.y_val, self.z_val
             a, b, c, d = other.w_val, other.x_val, other.y_val, other.z_val
-            return Quaternionr( w_val = a*t - b*x - c*y - d*z,
+            return type(self)( w_val = a*t - b*x - c*y - d*z,
                                 x_val = b*t + a*x + d*y - c*z,
                                 y_val = c*t + a*y + b*z - d*x,
                                 z_val = d*t + z*a + c*x - b*y)
@@ -186,33 +303,33 @@ class Quaternionr(MsgpackMixin):
             raise TypeError('unsupported operand type(s) for *: %s and %s' % ( str(type(self)), str(type(other))) )
 
     def __truediv__(self, other):
-        if type(other) == type(self):
+        if _is_same_type(self, other):
             return self * other.inverse()
         elif type(other) in [int, float] + np.sctypes['int'] + np.sctypes['uint'] + np.sctypes['float']:
-            return Quaternionr( self.x_val / other, self.y_val / other, self.z_val / other, self.w_val / other)
+            return type(self)( self.x_val / other, self.y_val / other, self.z_val / other, self.w_val / other)
         else:
             raise TypeError('unsupported operand type(s) for /: %s and %s' % ( str(type(self)), str(type(other))) )
 
     def dot(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             return self.x_val*other.x_val + self.y_val*other.y_val + self.z_val*other.z_val + self.w_val*other.w_val
         else:
             raise TypeError('unsupported operand type(s) for \'dot\': %s and %s' % ( str(type(self)), str(type(other))) )
 
     def cross(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             return (self * other - other * self) / 2
         else:
             raise TypeError('unsupported operand type(s) for \'cross\': %s and %s' % ( str(type(self)), str(type(other))) )
 
     def outer_product(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             return ( self.inverse()*other - other.inverse()*self ) / 2
         else:
             raise TypeError('unsupported operand type(s) for \'outer_product\': %s and %s' % ( str(type(self)), str(type(other))) )
 
     def rotate(self, other):
-        if type(self) == type(other):
+        if _is_same_type(self, other):
             if other.get_length() == 1:
                 return other * self * other.inverse()
             else:
@@ -221,7 +338,7 @@ class Quaternionr(MsgpackMixin):
             raise TypeError('unsupported operand type(s) for \'rotate\': %s and %s' % ( str(type(self)), str(type(other))) )
 
     def conjugate(self):
-        return Quaternionr(-self.x_val, -self.y_val, -self.z_val, self.w_val)
+        return type(self)(-self.x_val, -self.y_val, -self.z_val, self.w_val)
 
     def star(self):
         return self.conjugate()
@@ -246,8 +363,8 @@ class Pose(MsgpackMixin):
     orientation = Quaternionr()
 
     def __init__(self, position_val = None, orientation_val = None):
-        position_val = position_val if position_val is not None else Vector3r()
-        orientation_val = orientation_val if orientation_val is not None else Quaternionr()
+        position_val = position_val if position_val is not None else _variant_of(self, Vector3r)()
+        orientation_val = orientation_val if orientation_val is not None else _variant_of(self, Quaternionr)()
         self.position = position_val
         self.orientation = orientation_val
 
@@ -335,6 +452,26 @@ class ImageResponse(MsgpackMixin):
     height = 0
     image_type = ImageType.Scene
 
+    @classmethod
+    def from_msgpack_numpy(cls, encoded):
+        """
+        Same as `from_msgpack`, but pixels are decoded into NumPy arrays
+
+        Float images become a (H, W) np.float32 array in `image_data_float`, uncompressed uint8 images become
+        a read-only (H, W, C) view over the received bytes in `image_data_uint8`. Compressed images are left as PNG bytes
+        """
+        response = cls.from_msgpack(encoded)
+        num_pixels = response.height * response.width
+        if response.pixels_as_float:
+            response.image_data_float = np.asarray(response.image_data_float, dtype=np.float32)
+            if num_pixels > 0:
+                response.image_data_float = response.image_data_float.reshape(response.height, response.width)
+        elif not response.compress:
+            response.image_data_uint8 = np.frombuffer(response.image_data_uint8, dtype=np.uint8)
+            if num_pixels > 0:
+                response.image_data_uint8 = response.image_data_uint8.reshape(response.height, response.width, -1)
+        return response
+
 class CarControls(MsgpackMixin):
     throttle = 0.0
     steering = 0.0
@@ -420,6 +557,18 @@ class LidarData(MsgpackMixin):
     pose = Pose()
     segmentation = 0
 
+    @classmethod
+    def from_msgpack_numpy(cls, encoded):
+        """
+        Same as `from_msgpack`, but `point_cloud` becomes an (N, 3) np.float32 array and `segmentation` an (N,) np.int32 array
+        """
+        lidar_data = cls.from_msgpack(encoded)
+        point_cloud = np.asarray(lidar_data.point_cloud, dtype=np.float32).reshape(-1)
+        # the server sends a single 0 when there are no points
+        lidar_data.point_cloud = point_cloud[:point_cloud.size // 3 * 3].reshape(-1, 3)
+        lidar_data.segmentation = np.asarray(lidar_data.segmentation, dtype=np.int32).reshape(-1)
+        return lidar_data
+
 class ImuData(MsgpackMixin):
     time_stamp = np.uint64(0)
     orientation = Quaternionr()
@@ -578,3 +727,236 @@ class MeshPositionVertexBuffersResponse(MsgpackMixin):
     vertices = 0.0
     indices = 0.0
     name = ''
+
+CompactVector3r = _make_compact_type(Vector3r)
+CompactQuaternionr = _make_compact_type(Quaternionr)
+CompactPose = _make_compact_type(Pose)
+CompactKinematicsState = _make_compact_type(KinematicsState)
+CompactMultirotorState = _make_compact_type(MultirotorState)
+
+class Vector3rArray:
+    """
+    Batch of Vector3r stored as an (N, 3) float64 NumPy array in x, y, z order
+
+    Operations work on the whole batch at once and broadcast a batch of length 1 against any other length
+    """
+    def __init__(self, data = None):
+        self.data = np.zeros((0, 3)) if data is None else np.asarray(data, dtype=np.float64).reshape(-1, 3)
+
+    @classmethod
+    def from_list(cls, vectors):
+        return cls([(v.x_val, v.y_val, v.z_val) for v in vectors])
+
+    def to_list(self):
+        return [Vector3r(x, y, z) for x, y, z in self.data.tolist()]
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Vector3r(*self.data[index].tolist())
+        return Vector3rArray(self.data[index])
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __add__(self, other):
+        return Vector3rArray(self.data + _batch_data(other))
+
+    def __sub__(self, other):
+        return Vector3rArray(self.data - _batch_data(other))
+
+    def __mul__(self, other):
+        return Vector3rArray(self.data * _batch_scalars(other))
+
+    def __truediv__(self, other):
+        return Vector3rArray(self.data / _batch_scalars(other))
+
+    def dot(self, other):
+        return np.einsum('ij,ij->i', *np.broadcast_arrays(self.data, _batch_data(other)))
+
+    def cross(self, other):
+        return Vector3rArray(np.cross(self.data, _batch_data(other)))
+
+    def get_length(self):
+        return np.linalg.norm(self.data, axis=1)
+
+    def distance_to(self, other):
+        return np.linalg.norm(self.data - _batch_data(other), axis=1)
+
+    def rotate(self, quaternions):
+        """
+        Rotates the vectors by unit quaternions, i.e. q * v * q.inverse() for each pair
+
+        Args:
+            quaternions (QuaternionrArray or Quaternionr): Rotations, one per vector or a single one for all
+
+        Returns:
+            Vector3rArray:
+        """
+        q = _batch_data(quaternions)
+        u, w = q[:, :3], q[:, 3:]
+        t = 2 * np.cross(u, self.data)
+        return Vector3rArray(self.data + w * t + np.cross(u, t))
+
+    def to_numpy_array(self):
+        return self.data
+
+class QuaternionrArray:
+    """
+    Batch of Quaternionr stored as an (N, 4) float64 NumPy array in x, y, z, w order, same as `Quaternionr.to_numpy_array()`
+    """
+    def __init__(self, data = None):
+        self.data = np.zeros((0, 4)) if data is None else np.asarray(data, dtype=np.float64).reshape(-1, 4)
+
+    @classmethod
+    def from_list(cls, quaternions):
+        return cls([(q.x_val, q.y_val, q.z_val, q.w_val) for q in quaternions])
+
+    def to_list(self):
+        return [Quaternionr(x, y, z, w) for x, y, z, w in self.data.tolist()]
+
+    @classmethod
+    def from_eularian_angles(cls, pitch, roll, yaw):
+        """
+        Batch version of `to_quaternion()`, angles are in radians and broadcast against each other
+        """
+        pitch, roll, yaw = np.broadcast_arrays(np.asarray(pitch, dtype=np.float64), np.asarray(roll, dtype=np.float64),
+                                               np.asarray(yaw, dtype=np.float64))
+        t0, t1 = np.cos(yaw * 0.5), np.sin(yaw * 0.5)
+        t2, t3 = np.cos(roll * 0.5), np.sin(roll * 0.5)
+        t4, t5 = np.cos(pitch * 0.5), np.sin(pitch * 0.5)
+
+        return cls(np.stack((t0 * t3 * t4 - t1 * t2 * t5,
+                             t0 * t2 * t5 + t1 * t3 * t4,
+                             t1 * t2 * t4 - t0 * t3 * t5,
+                             t0 * t2 * t4 + t1 * t3 * t5), axis=-1))
+
+    def to_eularian_angles(self):
+        """
+        Batch version of `to_eularian_angles()`
+
+        Returns:
+            tuple[np.ndarray]: pitch, roll and yaw in radians
+        """
+        x, y, z, w = self.data.T
+        ysqr = y * y
+
+        roll = np.arctan2(2.0 * (w*x + y*z), 1.0 - 2.0*(x*x + ysqr))
+        pitch = np.arcsin(np.clip(2.0 * (w*y - z*x), -1.0, 1.0))
+        yaw = np.arctan2(2.0 * (w*z + x*y), 1.0 - 2.0 * (ysqr + z*z))
+
+        return (pitch, roll, yaw)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Quaternionr(*self.data[index].tolist())
+        return QuaternionrArray(self.data[index])
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __mul__(self, other):
+        x, y, z, t = np.broadcast_arrays(*self.data.T)
+        b, c, d, a = _batch_data(other).T
+        return QuaternionrArray(np.stack((b*t + a*x + d*y - c*z,
+                                          c*t + a*y + b*z - d*x,
+                                          d*t + z*a + c*x - b*y,
+                                          a*t - b*x - c*y - d*z), axis=-1))
+
+    def conjugate(self):
+        return QuaternionrArray(self.data * (-1.0, -1.0, -1.0, 1.0))
+
+    def inverse(self):
+        return QuaternionrArray(self.conjugate().data / np.einsum('ij,ij->i', self.data, self.data)[:, None])
+
+    def get_length(self):
+        return np.linalg.norm(self.data, axis=1)
+
+    def sgn(self):
+        return QuaternionrArray(self.data / self.get_length()[:, None])
+
+    def rotate(self, other):
+        """
+        Same as `Quaternionr.rotate()`, rotates each quaternion by the unit quaternions in other
+        """
+        other = QuaternionrArray(_batch_data(other))
+        return other * self * other.inverse()
+
+    def to_numpy_array(self):
+        return self.data
+
+class PoseArray:
+    """
+    Batch of Pose, made of a Vector3rArray of positions and a QuaternionrArray of orientations
+    """
+    def __init__(self, positions = None, orientations = None):
+        self.positions = positions if isinstance(positions, Vector3rArray) else Vector3rArray(positions)
+        if orientations is None:
+            orientations = np.tile((0.0, 0.0, 0.0, 1.0), (len(self.positions), 1))
+        self.orientations = orientations if isinstance(orientations, QuaternionrArray) else QuaternionrArray(orientations)
+
+    @classmethod
+    def from_list(cls, poses):
+        return cls(Vector3rArray.from_list([pose.position for pose in poses]),
+                   QuaternionrArray.from_list([pose.orientation for pose in poses]))
+
+    def to_list(self):
+        return [Pose(position, orientation) for position, orientation in zip(self.positions.to_list(), self.orientations.to_list())]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Pose(self.positions[index], self.orientations[index])
+        return PoseArray(self.positions[index], self.orientations[index])
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def transform(self, points):
+        """
+        Maps points given in the frames of these poses into the parent frame, e.g. lidar points into world frame
+
+        Args:
+            points (Vector3rArray): Points, one per pose or any number of points for a single pose
+
+        Returns:
+            Vector3rArray:
+        """
+        return points.rotate(self.orientations) + self.positions
+
+    def compose(self, other):
+        """
+        Chains the poses, the result maps other's frame into the parent frame of self
+
+        Args:
+            other (PoseArray or Pose): Poses expressed in the frames of these poses
+
+        Returns:
+            PoseArray:
+        """
+        if isinstance(other, Pose):
+            other = PoseArray.from_list([other])
+        return PoseArray(self.transform(other.positions), self.orientations * other.orientations)
+
+    def inverse(self):
+        inverse_orientations = self.orientations.inverse()
+        return PoseArray((self.positions * -1.0).rotate(inverse_orientations), inverse_orientations)
+
+def _batch_data(value):
+    if isinstance(value, (Vector3rArray, QuaternionrArray)):
+        return value.data
+    if isinstance(value, (Vector3r, Quaternionr)):
+        # not to_numpy_array(), which would round to float32
+        return np.array([tuple(value)], dtype=np.float64)
+    return np.asarray(value, dtype=np.float64)
+
+def _batch_scalars(value):
+    value = np.asarray(value, dtype=np.float64)
+    return value[:, None] if value.ndim == 1 else value
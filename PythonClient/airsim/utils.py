@@ -24,6 +24,22 @@ def get_pfm_array(response):
     return list_to_2d_float_array(response.image_data_float, response.width, response.height)
 
     
+def to_world_frame(lidar_data):
+    """
+    Transforms the points of a Lidar scan by the Lidar pose, e.g. from sensor frame into world frame
+    for Lidars using 'SensorLocalFrame' as DataFrame
+
+    Args:
+        lidar_data (LidarData): Scan from `getLidarData()`, with or without `as_numpy`
+
+    Returns:
+        numpy.ndarray: (N, 3) np.float32 array of the transformed points
+    """
+    point_cloud = np.asarray(lidar_data.point_cloud, dtype=np.float32).reshape(-1)
+    points = Vector3rArray(point_cloud[:point_cloud.size // 3 * 3])
+    return PoseArray.from_list([lidar_data.pose]).transform(points).data.astype(np.float32)
+
+    
 def get_public_fields(obj):
     return [attr for attr in dir(obj)
                             if not (attr.startswith("_") 
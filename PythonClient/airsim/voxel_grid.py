@@ -0,0 +1,353 @@
+import collections
+import numpy as np
+
+from .types import Vector3r
+
+# bytes of run-length pairs decoded at a time, a pair expands to at most 255 voxels
+DECODE_CHUNK_SIZE = 1 << 16
+
+VoxelHits = collections.namedtuple('VoxelHits', ['hit', 'distance', 'voxel'])
+VoxelHits.__doc__ = """
+Results of `VoxelGrid.cast_rays()`, one entry per ray
+
+Attributes:
+    hit (np.ndarray): Whether the ray reached an occupied voxel
+    distance (np.ndarray): Distance along the ray to where it enters the first occupied voxel, inf if none
+    voxel (np.ndarray): (N, 3) indices of the first occupied voxel, -1 if none
+"""
+
+def read_binvox_header(f):
+    """
+    Reads the text header of a binvox file, leaving the file at the start of the run-length data
+
+    Returns:
+        dict: dim (list[int]), translate (list[float]) and scale (float), as written in the file
+    """
+    if not f.readline().startswith(b'#binvox'):
+        raise ValueError('Not a binvox file')
+    header = {}
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError('binvox header has no data line')
+        fields = line.decode('ascii').split()
+        if not fields:
+            continue
+        if fields[0] == 'data':
+            break
+        if fields[0] == 'dim':
+            header['dim'] = [int(v) for v in fields[1:4]]
+        elif fields[0] == 'translate':
+            header['translate'] = [float(v) for v in fields[1:4]]
+        elif fields[0] == 'scale':
+            header['scale'] = float(fields[1])
+    if 'dim' not in header:
+        raise ValueError('binvox header has no dim line')
+    return header
+
+def decode_binvox_runs(f, count, out, chunk_size = DECODE_CHUNK_SIZE):
+    """
+    Decodes the (value, length) byte pairs of a binvox file into bit-packed occupancy, a chunk at a time
+
+    Args:
+        f (file): Binary file positioned at the start of the run-length data
+        count (int): Number of voxels in the grid
+        out (np.ndarray): uint8 array of (count + 7) // 8 bytes receiving the bits, in the bit order of np.packbits
+        chunk_size (int, optional): Bytes of run-length data decoded at a time
+    """
+    chunk_size += chunk_size % 2
+    position = 0
+    carry = np.empty(0, dtype = np.uint8)
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        if len(data) % 2:
+            data += f.read(1)
+        pairs = np.frombuffer(data, dtype = np.uint8)
+        if len(pairs) % 2:
+            raise ValueError('binvox data ends in the middle of a run')
+        pairs = pairs.reshape(-1, 2)
+
+        bits = np.repeat((pairs[:, 0] != 0).astype(np.uint8), pairs[:, 1])
+        position += len(bits)
+        if position > count:
+            raise ValueError('binvox data holds more than the {} voxels of its dim line'.format(count))
+
+        # whole bytes are packed right away, the remaining bits wait for the next chunk
+        bits = np.concatenate([carry, bits])
+        whole = len(bits) // 8
+        start = (position - len(bits)) // 8
+        out[start:start + whole] = np.packbits(bits[:whole * 8])
+        carry = bits[whole * 8:]
+
+    if position != count:
+        raise ValueError('binvox data holds {} voxels instead of {}'.format(position, count))
+    if len(carry):
+        out[-1] = np.packbits(carry)[0]
+
+class VoxelGrid:
+    """
+    Occupancy grid written by `simCreateVoxelGrid()`, kept bit-packed, with vectorized queries
+
+    The simulator centers the grid on the requested position, and the file only holds the occupancy, so the position
+    and resolution of the request are needed to place it in the world:
+
+        client.simCreateVoxelGrid(center, 100, 100, 100, 0.5, 'map.binvox')
+        grid = VoxelGrid.read_binvox('map.binvox', center, 0.5)
+        free = ~grid.occupied(waypoints)
+
+    Voxel (i, j, k) is centered at NED position + ((i - nx // 2) * res, (j - ny // 2) * res, -(k - nz // 2) * res), so k
+    counts up like the Unreal z axis. Occupancy uses one bit per voxel; with `memmap_path` the bits live in a file, so
+    grids larger than memory can be queried.
+
+    Args:
+        packed (np.ndarray): Bit-packed occupancy, in the voxel order of the binvox files of AirSim
+        shape (tuple): (nx, ny, nz) voxels along each axis
+        position (Vector3r): NED position the grid was centered on
+        res (float): Voxel size in meters
+    """
+    def __init__(self, packed, shape, position, res):
+        self.packed = packed
+        self.shape = tuple(int(n) for n in shape)
+        self.res = float(res)
+        if isinstance(position, Vector3r):
+            position = position.to_numpy_array()
+        self.position = np.asarray(position, dtype = np.float64)
+        nx, ny, nz = self.shape
+        self._center_index = np.array([nx // 2, ny // 2, nz // 2], dtype = np.float64)
+
+    @classmethod
+    def read_binvox(cls, path, position, res, memmap_path = None, chunk_size = DECODE_CHUNK_SIZE):
+        """
+        Reads a binvox file written by `simCreateVoxelGrid()`, decoding it a chunk at a time
+
+        Args:
+            path (str): binvox file
+            position (Vector3r): Position passed to `simCreateVoxelGrid()`
+            res (float): Resolution passed to `simCreateVoxelGrid()`
+            memmap_path (str, optional): File to keep the bit-packed occupancy in, None to keep it in memory
+            chunk_size (int, optional): Bytes of run-length data decoded at a time
+
+        Returns:
+            VoxelGrid:
+        """
+        with open(path, 'rb') as f:
+            header = read_binvox_header(f)
+            # AirSim writes dim as x, z, y, and stores voxels with x fastest, then z, then y
+            nx, nz, ny = header['dim']
+            count = nx * ny * nz
+            size = (count + 7) // 8
+            if memmap_path is None:
+                packed = np.zeros(size, dtype = np.uint8)
+            else:
+                packed = np.lib.format.open_memmap(memmap_path, mode = 'w+', dtype = np.uint8, shape = (size,))
+            decode_binvox_runs(f, count, packed, chunk_size)
+        if isinstance(packed, np.memmap):
+            packed.flush()
+        return cls(packed, (nx, ny, nz), position, res)
+
+    @classmethod
+    def from_client(cls, client, position, x, y, z, res, path, memmap_path = None):
+        """
+        Creates the grid with `simCreateVoxelGrid()` and reads it, the simulator must be able to write to path
+
+        Returns:
+            VoxelGrid:
+        """
+        if not client.simCreateVoxelGrid(position, x, y, z, res, path):
+            raise RuntimeError('simCreateVoxelGrid could not write {}'.format(path))
+        return cls.read_binvox(path, position, res, memmap_path)
+
+    @property
+    def count(self):
+        nx, ny, nz = self.shape
+        return nx * ny * nz
+
+    def world_to_voxel(self, points):
+        """
+        Args:
+            points (np.ndarray): (N, 3) NED positions
+
+        Returns:
+            np.ndarray: (N, 3) integer indices of the voxels containing the points, possibly outside the grid
+        """
+        return np.floor(self._continuous_index(points)).astype(np.int64)
+
+    def voxel_to_world(self, voxels):
+        """
+        Args:
+            voxels (np.ndarray): (N, 3) voxel indices
+
+        Returns:
+            np.ndarray: (N, 3) NED positions of the voxel centers
+        """
+        offsets = (np.asarray(voxels, dtype = np.float64) - self._center_index) * self.res
+        return self.position + offsets * (1, 1, -1)
+
+    def _continuous_index(self, points):
+        # voxel (i, j, k) spans [i, i + 1) along each axis of this index space
+        offsets = (np.asarray(points, dtype = np.float64) - self.position) * (1, 1, -1) / self.res
+        return offsets + self._center_index + 0.5
+
+    def inside(self, voxels):
+        """
+        Returns:
+            np.ndarray: Whether each voxel index lies inside the grid
+        """
+        voxels = np.asarray(voxels)
+        return np.all((voxels >= 0) & (voxels < self.shape), axis = -1)
+
+    def _flat(self, voxels):
+        nx, ny, nz = self.shape
+        return voxels[..., 0] + nx * (voxels[..., 2] + nz * voxels[..., 1])
+
+    def voxel_occupied(self, voxels):
+        """
+        Args:
+            voxels (np.ndarray): (N, 3) voxel indices
+
+        Returns:
+            np.ndarray: (N,) occupancy, False outside the grid
+        """
+        voxels = np.atleast_2d(np.asarray(voxels, dtype = np.int64))
+        inside = self.inside(voxels)
+        flat = self._flat(np.where(inside[:, np.newaxis], voxels, 0))
+        bits = (self.packed[flat >> 3] >> (7 - (flat & 7))) & 1
+        return inside & (bits == 1)
+
+    def occupied(self, points):
+        """
+        Args:
+            points (np.ndarray): (N, 3) NED positions
+
+        Returns:
+            np.ndarray: (N,) whether the voxel containing each point is occupied, False outside the grid
+        """
+        return self.voxel_occupied(self.world_to_voxel(np.atleast_2d(points)))
+
+    def to_dense(self):
+        """
+        Returns:
+            np.ndarray: (nx, ny, nz) bool occupancy, indexed by voxel (i, j, k)
+        """
+        nx, ny, nz = self.shape
+        bits = np.unpackbits(self.packed, count = self.count).view(bool)
+        return bits.reshape(ny, nz, nx).transpose(2, 0, 1)
+
+    def occupied_points(self):
+        """
+        Returns:
+            np.ndarray: (M, 3) NED centers of the occupied voxels
+        """
+        return self.voxel_to_world(np.argwhere(self.to_dense()))
+
+    def cast_rays(self, origins, directions, max_distance = np.inf):
+        """
+        Walks rays through the grid voxel by voxel and finds the first occupied voxel of each
+
+        Args:
+            origins (np.ndarray): (N, 3) NED ray origins, or a single origin for all rays
+            directions (np.ndarray): (N, 3) ray directions, need not be normalized, or a single direction for all rays
+            max_distance (float or np.ndarray, optional): Maximum distance in meters, for all rays or per ray
+
+        Returns:
+            VoxelHits:
+        """
+        origins, directions = np.broadcast_arrays(np.atleast_2d(np.asarray(origins, dtype = np.float64)),
+                                                  np.atleast_2d(np.asarray(directions, dtype = np.float64)))
+        count = len(origins)
+        max_distance = np.broadcast_to(np.asarray(max_distance, dtype = np.float64), (count,))
+        norms = np.linalg.norm(directions, axis = 1)
+        directions = directions / np.where(norms > 0, norms, 1)[:, np.newaxis]
+
+        # in index space, where voxels are unit cubes, t stays in meters along the ray
+        start = self._continuous_index(origins)
+        step_dir = directions * (1, 1, -1) / self.res
+        shape = np.array(self.shape, dtype = np.float64)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            inverse = 1 / step_dir
+            t1, t2 = (0 - start) * inverse, (shape - start) * inverse
+            t_near = np.nanmax(np.minimum(t1, t2), axis = 1)
+            t_far = np.nanmin(np.maximum(t1, t2), axis = 1)
+        t_enter = np.maximum(t_near, 0)
+        active = (t_enter <= t_far) & (t_enter <= max_distance) & (norms > 0)
+
+        step = np.sign(step_dir).astype(np.int64)
+        entry = start + step_dir * t_enter[:, np.newaxis]
+        voxel = np.clip(np.floor(entry).astype(np.int64), 0, np.array(self.shape) - 1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            t_delta = np.abs(inverse)
+            t_next = t_enter[:, np.newaxis] + (voxel + (step > 0) - entry) * inverse
+        t_next[step == 0] = np.inf
+        t_current = t_enter.copy()
+
+        hit = np.zeros(count, dtype = bool)
+        distance = np.full(count, np.inf)
+        hit_voxel = np.full((count, 3), -1, dtype = np.int64)
+        rays = np.flatnonzero(active)
+        while len(rays):
+            occupied = self.voxel_occupied(voxel[rays])
+            found = rays[occupied]
+            hit[found] = True
+            distance[found] = t_current[found]
+            hit_voxel[found] = voxel[found]
+            rays = rays[~occupied]
+
+            # Amanatides and Woo, step into the neighbor across the nearest voxel face
+            axis = np.argmin(t_next[rays], axis = 1)
+            t_current[rays] = t_next[rays, axis]
+            voxel[rays, axis] += step[rays, axis]
+            t_next[rays, axis] += t_delta[rays, axis]
+            inside = (voxel[rays, axis] >= 0) & (voxel[rays, axis] < shape[axis]) & (t_current[rays] <= max_distance[rays])
+            rays = rays[inside]
+
+        return VoxelHits(hit, distance, hit_voxel)
+
+    def line_of_sight(self, points1, points2):
+        """
+        Tests whether the segments between pairs of points cross no occupied voxel, other than the one containing the target
+
+        Args:
+            points1 (np.ndarray): (N, 3) NED source points, or a single point for all pairs
+            points2 (np.ndarray): (N, 3) NED target points, or a single point for all pairs
+
+        Returns:
+            np.ndarray: (N,) True where the target is visible from the source
+        """
+        points1, points2 = np.broadcast_arrays(np.atleast_2d(np.asarray(points1, dtype = np.float64)),
+                                               np.atleast_2d(np.asarray(points2, dtype = np.float64)))
+        hits = self.cast_rays(points1, points2 - points1, np.linalg.norm(points2 - points1, axis = 1))
+        at_target = np.all(hits.voxel == self.world_to_voxel(points2), axis = 1)
+        return ~hits.hit | at_target
+
+    def distance_transform(self, max_distance = None):
+        """
+        Euclidean distance from every voxel center to the nearest occupied voxel center
+
+        Computed exactly with separable min-plus passes along each axis. Each pass looks max_distance away, so distances
+        above max_distance are reported as max_distance; a small max_distance, e.g. the clearance a planner cares
+        about, makes it much faster on large grids.
+
+        Args:
+            max_distance (float, optional): Largest distance of interest in meters, None for no limit
+
+        Returns:
+            np.ndarray: (nx, ny, nz) float32 distances in meters, indexed by voxel (i, j, k), inf if nothing is occupied
+        """
+        occupancy = self.to_dense()
+        reach = max(self.shape) if max_distance is None else int(np.ceil(max_distance / self.res))
+        squared = np.where(occupancy, 0, np.inf).astype(np.float32)
+
+        for axis in range(3):
+            view = np.moveaxis(squared, axis, 0)
+            source = view.copy()
+            for offset in range(1, min(reach, view.shape[0] - 1) + 1):
+                penalty = np.float32(offset * offset)
+                np.minimum(view[offset:], source[:-offset] + penalty, out = view[offset:])
+                np.minimum(view[:-offset], source[offset:] + penalty, out = view[:-offset])
+
+        distances = np.sqrt(squared, out = squared) * np.float32(self.res)
+        if max_distance is not None:
+            np.minimum(distances, np.float32(max_distance), out = distances)
+        return distances
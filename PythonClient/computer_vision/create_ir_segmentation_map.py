@@ -5,6 +5,7 @@ import sys
 import os
 import random
 from airsim import *
+from airsim.segmentation import SegmentationPlan
 
 def radiance(absoluteTemperature, emissivity, dx=0.01, response=None):
     """
@@ -127,22 +128,23 @@ def set_segmentation_ids(segIdDict, tempEmissivityNew, client):
         Elizabeth Bondi
     """
 
-    #First set everything to 0.
-    success = client.simSetSegmentationObjectID("[\w]*", 0, True);
-    if not success:
-        print('There was a problem setting all segmentation object IDs to 0. ')
-        sys.exit(1)
-
-    #Next set all objects of interest provided to corresponding object IDs
+    #Resolve all objects of interest locally, then set everything to 0 and
+    #push the resolved object IDs in one pipelined pass.
     #segIdDict values MUST match tempEmissivityNew labels.
+    rules = []
     for key in segIdDict:
         objectID = int(tempEmissivityNew[numpy.where(tempEmissivityNew == \
                                                      segIdDict[key])[0],1][0])
+        rules.append(("[\w]*"+key+"[\w]*", objectID))
+
+    results = SegmentationPlan(rules, default_id=0).apply(client)
+    if not results.pop("[\w]*"):
+        print('There was a problem setting all segmentation object IDs to 0. ')
+        sys.exit(1)
 
-        success = client.simSetSegmentationObjectID("[\w]*"+key+"[\w]*", 
-                                                    objectID, True);
+    for name, success in results.items():
         if not success:
-            print('There was a problem setting {0} segmentation object ID to {1!s}, or no {0} was found.'.format(key, objectID))
+            print('There was a problem setting the segmentation object ID of {0}.'.format(name))
             
     time.sleep(0.1)
 
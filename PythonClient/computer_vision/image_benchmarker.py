@@ -1,5 +1,6 @@
 import setup_path
 import airsim
+from airsim.frame_grabber import FrameGrabber
 from argparse import ArgumentParser
 import time
 import threading
@@ -43,7 +44,8 @@ class ImageBenchmarker():
             img_benchmark_type = 'simGetImages',
             viz_image_cv2 = False,
             save_images = False,
-            img_type = "scene"):
+            img_type = "scene",
+            num_workers = 1):
         self.airsim_client = airsim.VehicleClient()
         self.airsim_client.confirmConnection()
         self.image_benchmark_num_images = 0
@@ -59,6 +61,11 @@ class ImageBenchmarker():
             self.image_callback_thread = threading.Thread(target=self.repeat_timer_img, args=(self.image_callback_benchmark_simGetImage, 0.001))
         if img_benchmark_type == "simGetImages":
             self.image_callback_thread = threading.Thread(target=self.repeat_timer_img, args=(self.image_callback_benchmark_simGetImages, 0.001))
+        self.frame_grabber = None
+        if img_benchmark_type == "FrameGrabber":
+            # latest() blocks until a frame is ready, so there is no need to sleep between frames
+            self.frame_grabber = FrameGrabber([airsim.ImageRequest(CAM_NAME, self.img_type, False, False)], num_workers=num_workers)
+            self.image_callback_thread = threading.Thread(target=self.repeat_timer_img, args=(self.image_callback_benchmark_FrameGrabber, 0))
         self.is_image_thread_active = False
 
         if self.save_images:
@@ -73,6 +80,8 @@ class ImageBenchmarker():
     def start_img_benchmark_thread(self):
         if not self.is_image_thread_active:
             self.is_image_thread_active = True
+            if self.frame_grabber is not None:
+                self.frame_grabber.start()
             self.benchmark_start_time = time.time()
             self.image_callback_thread.start()
             print("Started img image_callback thread")
@@ -81,13 +90,17 @@ class ImageBenchmarker():
         if self.is_image_thread_active:
             self.is_image_thread_active = False
             self.image_callback_thread.join()
+            if self.frame_grabber is not None:
+                self.frame_grabber.stop()
+                print(f"Frame grabber: {self.frame_grabber.stats}")
             print("Stopped image callback thread.")
             print(f"FPS: {self.avg_fps} for {self.image_benchmark_num_images} images")
 
     def repeat_timer_img(self, task, period):
         while self.is_image_thread_active:
             task()
-            time.sleep(period)
+            if period > 0:
+                time.sleep(period)
 
     def update_benchmark_results(self):
         self.image_benchmark_total_time = time.time() - self.benchmark_start_time
@@ -134,10 +147,27 @@ class ImageBenchmarker():
             filename = os.path.join(self.tmp_dir, str(self.image_benchmark_num_images))
             saveImage(response, filename)
 
+    def image_callback_benchmark_FrameGrabber(self):
+        frame = self.frame_grabber.latest(timeout=1)
+        if frame is None:
+            return
+        self.image_benchmark_num_images += 1
+        response = frame.responses[0][0]
+
+        self.update_benchmark_results()
+
+        if self.viz_image_cv2:
+            cv2.imshow("img", response.image_data_uint8)
+            cv2.waitKey(1)
+
+        if self.save_images:
+            filename = os.path.join(self.tmp_dir, str(self.image_benchmark_num_images))
+            cv2.imwrite(os.path.normpath(filename + '.png'), response.image_data_uint8)
+
 
 def main(args):
     image_benchmarker = ImageBenchmarker(img_benchmark_type=args.img_benchmark_type, viz_image_cv2=args.viz_image_cv2,
-                                      save_images=args.save_images, img_type=args.img_type)
+                                      save_images=args.save_images, img_type=args.img_type, num_workers=args.num_workers)
 
     image_benchmarker.start_img_benchmark_thread()
     time.sleep(args.time)
@@ -145,10 +175,11 @@ def main(args):
 
 if __name__ == "__main__":
     parser = ArgumentParser()
-    parser.add_argument('--img_benchmark_type', type=str, choices=["simGetImage", "simGetImages"], default="simGetImages")
+    parser.add_argument('--img_benchmark_type', type=str, choices=["simGetImage", "simGetImages", "FrameGrabber"], default="simGetImages")
     parser.add_argument('--enable_viz_image_cv2', dest='viz_image_cv2', action='store_true', default=False)
     parser.add_argument('--save_images', dest='save_images', action='store_true', default=False)
     parser.add_argument('--img_type', type=str, choices=cameraTypeMap.keys(), default="scene")
+    parser.add_argument('--num_workers', help="Capture threads of the FrameGrabber benchmark", type=int, default=1)
     parser.add_argument('--time', help="Time in secs to run the benchmark for", type=int, default=30)
 
     args = parser.parse_args()
@@ -0,0 +1,207 @@
+import numpy as np
+from collections import namedtuple
+
+# File layout, all little endian:
+#   header    HEADER_TYPE, patched with the totals and the index offset on close
+#   chunks    count (u8), then the t (f8), x (u2), y (u2), p (i1) columns, padded to 8 bytes
+#   index     INDEX_TYPE per chunk, so a time window maps to chunks without touching the data
+# Files that were not closed have no index, readers rebuild it by walking the chunk counts.
+MAGIC = b"AIRSIMEV"
+VERSION = 1
+HEADER_TYPE = np.dtype(
+    [("magic", "S8"), ("version", "<u4"), ("chunk_size", "<u4"), ("num_chunks", "<u8"), ("num_events", "<u8"), ("index_offset", "<u8")]
+)
+INDEX_TYPE = np.dtype([("offset", "<u8"), ("count", "<u8"), ("t_start", "<f8"), ("t_end", "<f8")])
+COLUMNS = (("t", "<f8"), ("x", "<u2"), ("y", "<u2"), ("p", "i1"))
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+Events = namedtuple("Events", [name for name, _ in COLUMNS])
+
+
+def _chunk_layout(count):
+    # Offset of each column from the start of a chunk, and the size of the chunk
+    offsets = {}
+    position = 8
+    for name, dtype in COLUMNS:
+        offsets[name] = position
+        position += count * np.dtype(dtype).itemsize
+    return offsets, (position + 7) // 8 * 8
+
+
+class EventFileWriter:
+    """
+    Writes events to a binary file made of fixed-size chunks of t/x/y/p columns with a timestamp index
+
+    Events must be written in timestamp order, as EventSimulator produces them. Can be passed as the
+    sink of an EventSimulator.
+
+        with EventFileWriter("events.bin") as writer:
+            writer.write(events)
+    """
+    def __init__(self, filename, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.num_events = 0
+        self.index = []
+        self.last_time = -np.inf
+
+        self._buffer = {name: np.empty(chunk_size, dtype=dtype) for name, dtype in COLUMNS}
+        self._buffered = 0
+        self._file = open(filename, "wb")
+        self._write_header(0)
+
+    def _write_header(self, index_offset):
+        header = np.zeros(1, dtype=HEADER_TYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["chunk_size"] = self.chunk_size
+        header["num_chunks"] = len(self.index)
+        header["num_events"] = self.num_events
+        header["index_offset"] = index_offset
+        self._file.write(header.tobytes())
+
+    def write(self, events):
+        """
+        Appends events, given as an EVENT_TYPE array or an Events tuple of columns
+        """
+        if isinstance(events, np.ndarray):
+            events = Events(events["timestamp"], events["x"], events["y"], events["polarity"])
+        count = len(events.t)
+        if count == 0:
+            return
+        if events.t[0] < self.last_time:
+            raise ValueError("Events must be written in timestamp order, got {} after {}".format(events.t[0], self.last_time))
+        self.last_time = events.t[count - 1]
+
+        written = 0
+        while written < count:
+            n = min(count - written, self.chunk_size - self._buffered)
+            for name, column in zip(Events._fields, events):
+                self._buffer[name][self._buffered:self._buffered + n] = column[written:written + n]
+            self._buffered += n
+            written += n
+            if self._buffered == self.chunk_size:
+                self._flush()
+
+    def _flush(self):
+        count = self._buffered
+        if count == 0:
+            return
+        offset = self._file.tell()
+        _, size = _chunk_layout(count)
+
+        self._file.write(np.uint64(count).astype("<u8").tobytes())
+        for name, _ in COLUMNS:
+            self._buffer[name][:count].tofile(self._file)
+        self._file.write(b"\0" * (offset + size - self._file.tell()))
+
+        self.index.append((offset, count, self._buffer["t"][0], self._buffer["t"][count - 1]))
+        self.num_events += count
+        self._buffered = 0
+
+    def close(self):
+        """
+        Writes the last chunk and the index
+        """
+        if self._file.closed:
+            return
+        self._flush()
+        index_offset = self._file.tell()
+        np.array(self.index, dtype=INDEX_TYPE).tofile(self._file)
+        self._file.seek(0)
+        self._write_header(index_offset)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class EventFileReader:
+    """
+    Memory-mapped reader of files written by EventFileWriter
+
+    Reads return an Events tuple of t/x/y/p columns. Reads within one chunk are views into the
+    memory map, reads spanning chunks are copied into new arrays.
+
+        reader = EventFileReader("events.bin")
+        window = reader.read_time(0.5, 0.6)
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._map = np.memmap(filename, dtype=np.uint8, mode="r")
+
+        header = np.frombuffer(self._map, dtype=HEADER_TYPE, count=1)[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError("{} is not an event file".format(filename))
+        self.chunk_size = int(header["chunk_size"])
+
+        if header["index_offset"]:
+            self.index = np.frombuffer(self._map, dtype=INDEX_TYPE, count=int(header["num_chunks"]), offset=int(header["index_offset"]))
+        else:
+            self.index = self._rebuild_index()
+
+        self._starts = np.zeros(len(self.index) + 1, dtype=np.int64)
+        np.cumsum(self.index["count"], out=self._starts[1:])
+        self.num_events = int(self._starts[-1])
+
+    def _rebuild_index(self):
+        index = []
+        offset = HEADER_TYPE.itemsize
+        while offset + 8 <= self._map.size:
+            count = int(np.frombuffer(self._map, dtype="<u8", count=1, offset=offset)[0])
+            columns, size = _chunk_layout(count)
+            if count == 0 or offset + size > self._map.size:
+                break
+            t = np.frombuffer(self._map, dtype="<f8", count=count, offset=offset + columns["t"])
+            index.append((offset, count, t[0], t[-1]))
+            offset += size
+        return np.array(index, dtype=INDEX_TYPE)
+
+    def __len__(self):
+        return self.num_events
+
+    def chunk(self, i):
+        """
+        Returns the events of chunk i as views into the memory map
+        """
+        offset, count = int(self.index[i]["offset"]), int(self.index[i]["count"])
+        columns, _ = _chunk_layout(count)
+        return Events(*(np.frombuffer(self._map, dtype=dtype, count=count, offset=offset + columns[name]) for name, dtype in COLUMNS))
+
+    def read(self, start, stop):
+        """
+        Returns events start to stop, by position in the file
+        """
+        start, stop = max(start, 0), min(stop, self.num_events)
+        if start >= stop:
+            return Events(*(np.empty(0, dtype=dtype) for _, dtype in COLUMNS))
+
+        first = int(np.searchsorted(self._starts, start, side="right")) - 1
+        last = int(np.searchsorted(self._starts, stop, side="left")) - 1
+        parts = []
+        for i in range(first, last + 1):
+            events = self.chunk(i)
+            lo, hi = max(start - self._starts[i], 0), min(stop - self._starts[i], len(events.t))
+            parts.append(Events(*(column[lo:hi] for column in events)))
+
+        if len(parts) == 1:
+            return parts[0]
+        return Events(*(np.concatenate(columns) for columns in zip(*parts)))
+
+    def read_time(self, t_start, t_end):
+        """
+        Returns the events with t_start <= t < t_end
+        """
+        return self.read(self.time_to_position(t_start), self.time_to_position(t_end))
+
+    def time_to_position(self, t):
+        """
+        Returns the position of the first event with a timestamp of at least t
+        """
+        i = int(np.searchsorted(self.index["t_end"], t, side="left"))
+        if i == len(self.index):
+            return self.num_events
+        return int(self._starts[i] + np.searchsorted(self.chunk(i).t, t, side="left"))
@@ -1,7 +1,7 @@
 from numba.np.ufunc import parallel
 import numpy as np
 from types import SimpleNamespace
-from numba import njit, prange, set_num_threads
+from numba import njit, prange, set_num_threads, get_num_threads
 
 EVENT_TYPE = np.dtype(
     [("timestamp", "f8"), ("x", "u2"), ("y", "u2"), ("polarity", "b")], align=True
@@ -16,27 +16,28 @@ CONFIG = SimpleNamespace(
         "sigma_contrast_thresholds": (0.0, 0.0),
         "refractory_period_ns": 1000,
         "max_events_per_frame": 200000,
+        "ring_buffer_size": 4,
     }
 )
 
 
 @njit(parallel=True)
-def esim(
-    x_end,
+def count_spikes(
     current_image,
     previous_image,
     delta_time,
     crossings,
-    last_time,
-    output_events,
+    spike_counts,
+    polarities,
     spikes,
     refractory_period_ns,
-    max_events_per_frame,
-    n_pix_row,
 ):
-    count = 0
+    # Every pixel only writes its own entries, so the loop is race free
     max_spikes = int(delta_time / (refractory_period_ns * 1e-3))
-    for x in prange(x_end):
+    for x in prange(current_image.size):
+        spike_counts[x] = 0
+        spikes[x] = 0
+
         itdt = np.log(current_image[x])
         it = np.log(previous_image[x])
         deltaL = itdt - it
@@ -47,7 +48,7 @@ def esim(
         pol = np.sign(deltaL)
 
         cross_update = pol * TOL
-        crossings[x] = np.log(crossings[x]) + cross_update
+        crossings[x] = it + cross_update
 
         lb = crossings[x] - it
         ub = crossings[x] - itdt
@@ -59,40 +60,109 @@ def esim(
         cross_check = pos_check + neg_check
         spike_nums = np.abs(int(spike_nums * cross_check))
 
-        crossings[x] = itdt - cross_update
         if spike_nums > 0:
             spikes[x] = pol
 
-        spike_nums = max_spikes if spike_nums > max_spikes else spike_nums
-
-        current_time = last_time
-        for i in range(spike_nums):
-            output_events[count].x = x % n_pix_row
-            output_events[count].y = x // n_pix_row
-            output_events[count].timestamp = np.round(current_time * 1e-6, 6)
-            output_events[count].polarity = 1 if pol > 0 else -1
+        spike_counts[x] = max_spikes if spike_nums > max_spikes else spike_nums
+        polarities[x] = 1 if pol > 0 else -1
 
-            count += 1
-            current_time += (delta_time) / spike_nums
 
-            if count == max_events_per_frame:
-                return count
-
-    return count
+@njit(parallel=True)
+def emit_events(
+    spike_counts,
+    polarities,
+    offsets,
+    slab_bounds,
+    count,
+    last_time,
+    delta_time,
+    n_pix_row,
+    timestamps,
+    xs,
+    ys,
+    ps,
+    order,
+):
+    # Each slab is a contiguous range of pixels, writing to its own range of the scratch
+    # columns given by the prefix sum of the spike counts
+    for s in prange(slab_bounds.size - 1):
+        start = min(offsets[slab_bounds[s]], count)
+        end = min(offsets[slab_bounds[s + 1]], count)
+
+        for x in range(slab_bounds[s], slab_bounds[s + 1]):
+            index = offsets[x]
+            if index >= end:
+                break
+
+            spike_nums = spike_counts[x]
+            current_time = last_time
+            for i in range(spike_nums):
+                if index >= end:
+                    break
+                timestamps[index] = np.round(current_time * 1e-6, 6)
+                xs[index] = x % n_pix_row
+                ys[index] = x // n_pix_row
+                ps[index] = polarities[x]
+
+                index += 1
+                current_time += (delta_time) / spike_nums
+
+        # Stable, so events with equal timestamps stay in pixel order
+        order[start:end] = np.argsort(timestamps[start:end], kind="mergesort") + start
+
+
+@njit
+def merge_slabs(offsets, slab_bounds, count, timestamps, xs, ys, ps, order, output_events):
+    n_slabs = slab_bounds.size - 1
+    heads = np.empty(n_slabs, dtype=np.int64)
+    ends = np.empty(n_slabs, dtype=np.int64)
+    for s in range(n_slabs):
+        heads[s] = min(offsets[slab_bounds[s]], count)
+        ends[s] = min(offsets[slab_bounds[s + 1]], count)
+
+    for i in range(count):
+        # Ties go to the lower slab, i.e. the lower pixel index
+        best = -1
+        best_time = np.inf
+        for s in range(n_slabs):
+            if heads[s] < ends[s] and (best < 0 or timestamps[order[heads[s]]] < best_time):
+                best = s
+                best_time = timestamps[order[heads[s]]]
+
+        j = order[heads[best]]
+        heads[best] += 1
+
+        output_events[i].timestamp = timestamps[j]
+        output_events[i].x = xs[j]
+        output_events[i].y = ys[j]
+        output_events[i].polarity = ps[j]
 
 
 class EventSimulator:
-    def __init__(self, W, H, first_image=None, first_time=None, config=CONFIG):
+    """
+    Event camera simulator
+
+    Events of a frame are computed in parallel over slabs of pixels, each sorted on its own and then
+    merged in timestamp order, so the output does not depend on the number of threads. Events with
+    equal timestamps are ordered by pixel index.
+
+    All buffers are allocated once. The events and spikes returned for a frame are views into a ring of
+    config.ring_buffer_size buffers, so they stay valid for the next ring_buffer_size - 1 frames, copy
+    them to keep them longer. If a sink, e.g. an EventFileWriter, is given, the events of every frame are
+    also passed to sink.write().
+    """
+    def __init__(self, W, H, first_image=None, first_time=None, config=CONFIG, num_slabs=None, sink=None):
         self.H = H
         self.W = W
         self.config = config
+        self.sink = sink
+        self.npix = H * W
+        self.num_slabs = num_slabs or get_num_threads()
         self.last_image = None
         if first_image is not None:
             assert first_time is not None
             self.init(first_image, first_time)
 
-        self.npix = H * W
-
     def init(self, first_image, first_time):
         print("Initialized event camera simulator with sensor size:", first_image.shape)
 
@@ -101,18 +171,35 @@ class EventSimulator:
         # We ignore the 2D nature of the problem as it is not relevant here
         # It makes multi-core processing more straightforward
         first_image = first_image.reshape(-1)
+        npix = first_image.size
+        max_events = self.config.max_events_per_frame
+        ring_size = getattr(self.config, "ring_buffer_size", CONFIG.ring_buffer_size)
 
         # Allocations
         self.last_image = first_image.copy()
         self.current_image = first_image.copy()
+        self.crossings = np.empty_like(first_image)
 
         self.last_time = first_time
 
-        self.output_events = np.zeros(
-            (self.config.max_events_per_frame), dtype=EVENT_TYPE
-        )
+        self.spike_counts = np.zeros(npix, dtype=np.int64)
+        self.polarities = np.zeros(npix, dtype=np.int8)
+        self.offsets = np.zeros(npix + 1, dtype=np.int64)
+        self.slab_bounds = np.linspace(0, npix, min(self.num_slabs, npix) + 1).astype(np.int64)
+
+        self.timestamps = np.zeros(max_events, dtype=np.float64)
+        self.xs = np.zeros(max_events, dtype=np.uint16)
+        self.ys = np.zeros(max_events, dtype=np.uint16)
+        self.ps = np.zeros(max_events, dtype=np.int8)
+        self.order = np.zeros(max_events, dtype=np.int64)
+
+        self.output_ring = np.zeros((ring_size, max_events), dtype=EVENT_TYPE)
+        self.spikes_ring = np.zeros((ring_size, npix))
+        self.ring_index = 0
+
+        self.output_events = self.output_ring[0]
+        self.spikes = self.spikes_ring[0]
         self.event_count = 0
-        self.spikes = np.zeros((self.npix))
 
     def image_callback(self, new_image, new_time):
         if self.last_image is None:
@@ -128,30 +215,75 @@ class EventSimulator:
         delta_time = new_time - self.last_time
 
         config = self.config
-        self.output_events = np.zeros(
-            (self.config.max_events_per_frame), dtype=EVENT_TYPE
-        )
-        self.spikes = np.zeros((self.npix))
+        self.ring_index = (self.ring_index + 1) % self.output_ring.shape[0]
+        self.output_events = self.output_ring[self.ring_index]
+        self.spikes = self.spikes_ring[self.ring_index]
 
-        self.crossings = self.last_image.copy()
-        self.event_count = esim(
-            self.current_image.size,
+        count_spikes(
             self.current_image,
             self.last_image,
             delta_time,
             self.crossings,
-            self.last_time,
-            self.output_events,
+            self.spike_counts,
+            self.polarities,
             self.spikes,
             config.refractory_period_ns,
-            config.max_events_per_frame,
+        )
+
+        # Events past max_events_per_frame are dropped in pixel order
+        np.cumsum(self.spike_counts, out=self.offsets[1:])
+        self.event_count = int(min(self.offsets[-1], config.max_events_per_frame))
+
+        emit_events(
+            self.spike_counts,
+            self.polarities,
+            self.offsets,
+            self.slab_bounds,
+            self.event_count,
+            self.last_time,
+            delta_time,
             self.W,
+            self.timestamps,
+            self.xs,
+            self.ys,
+            self.ps,
+            self.order,
+        )
+        merge_slabs(
+            self.offsets,
+            self.slab_bounds,
+            self.event_count,
+            self.timestamps,
+            self.xs,
+            self.ys,
+            self.ps,
+            self.order,
+            self.output_events,
         )
 
         np.copyto(self.last_image, self.current_image)
         self.last_time = new_time
 
         result = self.output_events[: self.event_count]
-        result.sort(order=["timestamp"], axis=0)
+        if self.sink is not None:
+            self.sink.write(result)
 
         return self.spikes, result
+
+    def stream(self, frames):
+        """
+        Yields the events of a sequence of frames
+
+        The first frame initializes the simulator and yields nothing. See the class docstring for how
+        long the yielded arrays stay valid.
+
+        Args:
+            frames: Iterable of (image, time) pairs, with times in microseconds
+
+        Yields:
+            (spikes, events) for each frame after the first
+        """
+        for image, time in frames:
+            spikes, events = self.image_callback(image, time)
+            if events is not None:
+                yield spikes, events
@@ -6,8 +6,8 @@ import matplotlib.pyplot as plt
 import argparse
 import sys, signal
 import pandas as pd
-import pickle
 from event_simulator import *
+from event_file import EventFileWriter
 
 parser = argparse.ArgumentParser(description="Simulate event data from AirSim")
 parser.add_argument("--debug", action="store_true")
@@ -18,7 +18,8 @@ parser.add_argument("--width", type=int, default=256)
 
 class AirSimEventGen:
     def __init__(self, W, H, save=False, debug=False):
-        self.ev_sim = EventSimulator(W, H)
+        self.event_file = EventFileWriter("events.bin") if save else None
+        self.ev_sim = EventSimulator(W, H, sink=self.event_file)
         self.H = H
         self.W = W
 
@@ -35,9 +36,6 @@ class AirSimEventGen:
         self.debug = debug
         self.save = save
 
-        self.event_file = open("events.pkl", "ab")
-        self.event_fmt = "%1.7f", "%d", "%d", "%d"
-
         if debug:
             self.fig, self.ax = plt.subplots(1, 1)
 
@@ -58,7 +56,8 @@ class AirSimEventGen:
 
     def _stop_event_gen(self, signal, frame):
         print("\nCtrl+C received. Stopping event sim...")
-        self.event_file.close()
+        if self.event_file is not None:
+            self.event_file.close()
         sys.exit(0)
 
 
@@ -102,11 +101,7 @@ if __name__ == "__main__":
         # Event sim keeps track of previous image automatically
         event_img, events = event_generator.ev_sim.image_callback(img, ts_delta)
 
+        # With --save, the event sim writes the events to events.bin itself
         if events is not None and events.shape[0] > 0:
-            if event_generator.save:
-                # Using pickle dump in a per-frame fashion to save time, instead of savetxt
-                # Optimizations possible
-                pickle.dump(events, event_generator.event_file)
-
             if event_generator.debug:
                 event_generator.visualize_events(event_img)
@@ -2,16 +2,19 @@ import random
 import csv
 from PIL import Image
 import numpy as np
-import pandas as pd
 import sys
 import os
 import errno
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import h5py
 from pathlib import Path
 import copy
 import re
 
+import setup_path
+from airsim.recording import RecordingReader, shifted_windows
 
 # This constant is used as an upper bound  for normalizing the car's speed to be between 0 and 1 
 MAX_SPEED = 70.0
@@ -82,10 +85,11 @@ def splitTrainValidationAndTestData(all_data_mappings, split_ratio=(0.7, 0.2, 0.
 
     return [train_data_mappings, validation_data_mappings, test_data_mappings]
     
-def generateDataMapAirSim(folders):
+def generateDataMapAirSim(folders, seed=None):
     """ Data map generator for simulator(AirSim) data. Reads the driving_log csv file and returns a list of 'center camera image name - label(s)' tuples
            Inputs:
                folders: list of folders to collect data from
+               seed: seed of the shuffle of the mappings, None to use the global random state
 
            Returns:
                mappings: All data mappings as a dictionary. Key is the image filepath, the values are a 2-tuple:
@@ -96,130 +100,212 @@ def generateDataMapAirSim(folders):
     all_mappings = {}
     for folder in folders:
         print('Reading data from {0}...'.format(folder))
-        current_df = pd.read_csv(os.path.join(folder, 'airsim_rec.txt'), sep='\t')
-        
-        for i in range(1, current_df.shape[0] - 1): 
-
-            
-            if current_df.iloc[i-1]['Brake'] != 0:   # Consider only training examples without breaks
-                continue
+        recording = RecordingReader(folder)
+        speed_column = 'Speed (kmph)' if 'Speed (kmph)' in recording.columns else 'Speed'
+        columns = recording.read(['Steering', 'Throttle', 'Brake', speed_column, recording.image_column])
 
+        speed = columns[speed_column]
+        if speed_column == 'Speed':
+            speed = speed * 3.6  # Newer recordings log the speed in m/s
 
-            norm_steering = [ (float(current_df.iloc[i-1][['Steering']]) + 1) / 2.0 ]  # Normalize steering: between 0 and 1
-            norm_throttle = [ float(current_df.iloc[i-1][['Throttle']]) ]
-            norm_speed = [ float(current_df.iloc[i-1][['Speed (kmph)']]) / MAX_SPEED ]  # Normalize speed: between 0 and 1
+        norm_steering = (columns['Steering'] + 1) / 2.0  # Normalize steering: between 0 and 1
 
+        # Rows 1 to n - 2, with the steering of the previous, current and next recorded images
+        rows, steering_windows = shifted_windows(norm_steering, (-1, 0, 1))
 
-            previous_state = norm_steering + norm_throttle + norm_speed   # Append lists
+        keep = columns['Brake'][rows - 1] == 0  # Consider only training examples without breaks
+        rows, steering_windows = rows[keep], steering_windows[keep]
 
+        previous_state = np.stack([norm_steering[rows - 1],
+                                   columns['Throttle'][rows - 1],
+                                   speed[rows - 1] / MAX_SPEED], axis=1)  # Normalize speed: between 0 and 1
 
-            #compute average steering over 3 consecutive recorded images, this will serve as the label
+        #compute average steering over 3 consecutive recorded images, this will serve as the label
+        labels = steering_windows.sum(axis=1) / 3.0
 
-            norm_steering0 = (float(current_df.iloc[i][['Steering']]) + 1) / 2.0
-            norm_steering1 = (float(current_df.iloc[i+1][['Steering']]) + 1) / 2.0
+        image_names = columns[recording.image_column][rows]
+        for image_name, current_label, state in zip(image_names, labels[:, np.newaxis].tolist(), previous_state.tolist()):
+            image_filepath = recording.image_path(image_name)
 
-            temp_sum_steering = norm_steering[0] + norm_steering0 + norm_steering1
-            average_steering = temp_sum_steering / 3.0
-
-            current_label = [average_steering]
-            
-            image_filepath = os.path.join(os.path.join(folder, 'images'), current_df.iloc[i]['ImageName']).replace('\\', '/')
-            
             if (image_filepath in all_mappings):
                 print('Error: attempting to add image {0} twice.'.format(image_filepath))
-            
-            all_mappings[image_filepath] = (current_label, previous_state)
+
+            all_mappings[image_filepath] = (current_label, state)
 
     mappings = [(key, all_mappings[key]) for key in all_mappings]
     
-    random.shuffle(mappings) 
+    if seed is None:
+        random.shuffle(mappings)
+    else:
+        random.Random(seed).shuffle(mappings)
     
     return mappings
 
 
-def generatorForH5py(data_mappings, chunk_size=32):
+def generatorForH5py(data_mappings, chunk_size=32, start=0):
     """
-    This function batches the data for saving to the H5 file
+    This function batches the data for saving to the H5 file, from row start on. Rows of a last, partial chunk are dropped.
     """
-    for chunk_id in range(0, len(data_mappings), chunk_size):
+    for chunk_id in range(start, len(data_mappings) - chunk_size + 1, chunk_size):
         # Data is expected to be a dict of <image: (label, previousious_state)>
         data_chunk = data_mappings[chunk_id:chunk_id + chunk_size]
-        if (len(data_chunk) == chunk_size):
-            image_names_chunk = [a for (a, b) in data_chunk]
-            labels_chunk = np.asarray([b[0] for (a, b) in data_chunk])
-            previous_state_chunk = np.asarray([b[1] for (a, b) in data_chunk])
-            
-            #Flatten and yield as tuple
-            yield (image_names_chunk, labels_chunk.astype(float), previous_state_chunk.astype(float))
-            if chunk_id + chunk_size > len(data_mappings):
-                raise StopIteration
-    raise StopIteration
-    
-    
-def saveH5pyData(data_mappings, target_file_path, chunk_size):
+        image_names_chunk = [a for (a, b) in data_chunk]
+        labels_chunk = np.asarray([b[0] for (a, b) in data_chunk])
+        previous_state_chunk = np.asarray([b[1] for (a, b) in data_chunk])
+
+        #Flatten and yield as tuple
+        yield (image_names_chunk, labels_chunk.astype(float), previous_state_chunk.astype(float))
+
+
+def readImagesChunk(image_names):
+    """ Decodes a chunk of images into a single array. Runs in the worker processes of saveH5pyData.
+           Inputs:
+                image_names: list of image names
+           Returns:
+                Array of all images of the chunk
     """
-    Saves H5 data to file
+    return np.asarray(readImagesFromPath(image_names))
+
+
+def mappingDigest(data_mappings):
+    """ Fingerprint of the image order of a data mapping, so that a run is only resumed with the mapping it started with.
     """
-    gen = generatorForH5py(data_mappings,chunk_size)
+    digest = hashlib.sha1()
+    for image_name, _ in data_mappings:
+        digest.update(image_name.encode('utf-8') + b'\n')
+    return digest.hexdigest()
 
-    image_names_chunk, labels_chunk, previous_state_chunk = next(gen)
-    images_chunk = np.asarray(readImagesFromPath(image_names_chunk))
-    row_count = images_chunk.shape[0]
 
-    checkAndCreateDir(target_file_path)
-    with h5py.File(target_file_path, 'w') as f:
+def decodedChunks(data_mappings, chunk_size, start, num_workers, max_pending):
+    """ Decodes the images of each chunk in a process pool, in order, with at most max_pending chunks decoded ahead of the writer.
+            Inputs:
+                data_mappings: mappings to read the chunks of
+                chunk_size: rows per chunk
+                start: first row to read
+                num_workers: number of decoding processes
+                max_pending: number of chunks queued or decoded but not yet written
 
-        # Initialize a resizable dataset to hold the output
-        images_chunk_maxshape = (None,) + images_chunk.shape[1:]
-        labels_chunk_maxshape = (None,) + labels_chunk.shape[1:]
-        previous_state_maxshape = (None,) + previous_state_chunk.shape[1:]
+            Returns:
+                Generator of (images, labels, previous states) chunks
+    """
+    chunks = generatorForH5py(data_mappings, chunk_size, start)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        for image_names_chunk, labels_chunk, previous_state_chunk in chunks:
+            pending.append((pool.submit(readImagesChunk, image_names_chunk), labels_chunk, previous_state_chunk))
+            if len(pending) >= max_pending:
+                images_future, labels_chunk, previous_state_chunk = pending.popleft()
+                yield images_future.result(), labels_chunk, previous_state_chunk
+        while pending:
+            images_future, labels_chunk, previous_state_chunk = pending.popleft()
+            yield images_future.result(), labels_chunk, previous_state_chunk
+
+
+def saveH5pyData(data_mappings, target_file_path, chunk_size, num_workers=None, max_pending=None,
+                 h5_chunk_rows=None, compression=None, compression_opts=None, resume=False):
+    """
+    Saves H5 data to file. Images are decoded by a pool of processes while this process writes the chunks in order.
+            Inputs:
+                data_mappings: mappings to save
+                target_file_path: h5 file to write
+                chunk_size: rows decoded and written at a time
+                num_workers: number of decoding processes, all cores if None
+                max_pending: number of chunks decoded ahead of the writer, twice num_workers if None
+                h5_chunk_rows: rows per HDF5 storage chunk, chunk_size if None
+                compression: HDF5 compression filter of the datasets, e.g. 'gzip' or 'lzf', None to store them uncompressed
+                compression_opts: options of the compression filter, e.g. the gzip level from 0 to 9
+                resume: keep the rows of a previous, interrupted run on the same data mappings and write the remaining ones
+    """
+    if len(data_mappings) < chunk_size:
+        raise ValueError('{0} would hold no data: {1} rows is less than one chunk of {2}.'.format(
+            target_file_path, len(data_mappings), chunk_size))
 
-        dset_images = f.create_dataset('image', shape=images_chunk.shape, maxshape=images_chunk_maxshape,
-                                chunks=images_chunk.shape, dtype=images_chunk.dtype)
+    num_workers = num_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * num_workers
+    h5_chunk_rows = h5_chunk_rows or chunk_size
+    digest = mappingDigest(data_mappings)
 
-        dset_labels = f.create_dataset('label', shape=labels_chunk.shape, maxshape=labels_chunk_maxshape,
-                                       chunks=labels_chunk.shape, dtype=labels_chunk.dtype)
-        
-        dset_previous_state = f.create_dataset('previous_state', shape=previous_state_chunk.shape, maxshape=previous_state_maxshape,
-                                       chunks=previous_state_chunk.shape, dtype=previous_state_chunk.dtype)
-                                       
-        dset_images[:] = images_chunk
-        dset_labels[:] = labels_chunk
-        dset_previous_state[:] = previous_state_chunk
-
-        for image_names_chunk, label_chunk, previous_state_chunk in gen:
-            image_chunk = np.asarray(readImagesFromPath(image_names_chunk))
-            
-            # Resize the dataset to accommodate the next chunk of rows
-            dset_images.resize(row_count + image_chunk.shape[0], axis=0)
-            dset_labels.resize(row_count + label_chunk.shape[0], axis=0)
-            dset_previous_state.resize(row_count + previous_state_chunk.shape[0], axis=0)
-            # Create the next chunk
-            dset_images[row_count:] = image_chunk
-            dset_labels[row_count:] = label_chunk
-            dset_previous_state[row_count:] = previous_state_chunk
+    checkAndCreateDir(target_file_path)
+    mode = 'a' if resume else 'w'
+    with h5py.File(target_file_path, mode) as f:
+        row_count = 0
+        if 'image' in f:
+            if f.attrs.get('mapping_digest') != digest:
+                raise ValueError('{0} was written from different data mappings and cannot be resumed.'.format(target_file_path))
+            # Rows of a chunk that was only partly written when the run stopped are written again
+            row_count = min(f[name].shape[0] for name in ('image', 'label', 'previous_state'))
+            row_count -= row_count % chunk_size
+            for name in ('image', 'label', 'previous_state'):
+                f[name].resize(row_count, axis=0)
+            print('Resuming {0} at row {1}.'.format(target_file_path, row_count))
+        else:
+            f.attrs['mapping_digest'] = digest
+        f.attrs['complete'] = False
+
+        for images_chunk, labels_chunk, previous_state_chunk in decodedChunks(data_mappings, chunk_size, row_count,
+                                                                              num_workers, max_pending):
+            if 'image' not in f:
+                # Initialize resizable datasets to hold the output
+                for name, chunk in (('image', images_chunk), ('label', labels_chunk), ('previous_state', previous_state_chunk)):
+                    f.create_dataset(name, shape=(0,) + chunk.shape[1:], maxshape=(None,) + chunk.shape[1:],
+                                     chunks=(h5_chunk_rows,) + chunk.shape[1:], dtype=chunk.dtype,
+                                     compression=compression, compression_opts=compression_opts)
+
+            # Labels and previous states first, so that the image count is the number of complete rows
+            for name, chunk in (('label', labels_chunk), ('previous_state', previous_state_chunk), ('image', images_chunk)):
+                dset = f[name]
+                dset.resize(row_count + chunk.shape[0], axis=0)
+                dset[row_count:] = chunk
 
             # Increment the row count
-            row_count += image_chunk.shape[0]
-            
-            
-def cook(folders, output_directory, train_eval_test_split, chunk_size):
+            row_count += images_chunk.shape[0]
+            f.flush()
+
+        f.attrs['complete'] = True
+
+
+def cook(folders, output_directory, train_eval_test_split, chunk_size, num_workers=None, compression=None,
+         compression_opts=None, resume=False, seed=None):
     """ Primary function for data pre-processing. Reads and saves all data as h5 files.
             Inputs:
                 folders: a list of all data folders
                 output_directory: location for saving h5 files
                 train_eval_test_split: dataset split ratio
+                chunk_size: rows decoded and written at a time
+                num_workers: number of image decoding processes, all cores if None
+                compression: HDF5 compression filter, e.g. 'gzip' or 'lzf'
+                compression_opts: options of the compression filter
+                resume: finish the h5 files of an interrupted run instead of skipping preprocessing, needs the seed of that run
+                seed: seed of the shuffle of the data, so that runs split and order the data the same way
     """
     output_files = [os.path.join(output_directory, f) for f in ['train.h5', 'eval.h5', 'test.h5']]
-    if (any([os.path.isfile(f) for f in output_files])):
+    existing_files = [f for f in output_files if os.path.isfile(f)]
+    if resume and existing_files and seed is None:
+        print("Error: resuming preprocessing needs the seed of the interrupted run.")
+        sys.exit()
+
+    if existing_files and not resume:
        print("Preprocessed data already exists at: {0}. Skipping preprocessing.".format(output_directory))
 
     else:
-        all_data_mappings = generateDataMapAirSim(folders)
+        all_data_mappings = generateDataMapAirSim(folders, seed)
         
         split_mappings = splitTrainValidationAndTestData(all_data_mappings, split_ratio=train_eval_test_split)
         
         for i in range(0, len(split_mappings)-1, 1):
+            if resume and isCooked(output_files[i]):
+                print('{0} is complete. Skipping.'.format(output_files[i]))
+                continue
             print('Processing {0}...'.format(output_files[i]))
-            saveH5pyData(split_mappings[i], output_files[i], chunk_size)
-            print('Finished saving {0}.'.format(output_files[i]))
\ No newline at end of file
+            saveH5pyData(split_mappings[i], output_files[i], chunk_size, num_workers=num_workers,
+                         compression=compression, compression_opts=compression_opts, resume=resume)
+            print('Finished saving {0}.'.format(output_files[i]))
+
+
+def isCooked(file_path):
+    """ Checks whether a h5 file was completely written by saveH5pyData.
+    """
+    if not os.path.isfile(file_path):
+        return False
+    with h5py.File(file_path, 'r') as f:
+        return bool(f.attrs.get('complete', False))
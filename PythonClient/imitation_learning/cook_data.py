@@ -12,6 +12,16 @@ import Cooking
 # chunk size for training batches
 chunk_size = 32
 
+# number of processes decoding images, None to use all cores
+num_workers = None
+
+# HDF5 compression of the cooked data, e.g. 'gzip' or 'lzf', None to store it uncompressed
+compression = None
+
+# Seed of the data shuffle. Set RESUME to True to finish the .h5 files of an interrupted run with the same seed
+seed = 42
+RESUME = False
+
 # No test set needed, since testing in our case is running the model on an unseen map in AirSim
 train_eval_test_split = [0.8, 0.2, 0.0]
 
@@ -30,9 +40,12 @@ data_folders = []
 # data_folder.append('folder_name1')
 # data_folder.append('folder_name2')
 # ...
-if COOK_ALL_DATA:
-	data_folders = [name for name in os.listdir(RAW_DATA_DIR)]
+# Images are decoded in worker processes, which import this script again on Windows, so cooking only runs as the main script
+if __name__ == '__main__':
+	if COOK_ALL_DATA:
+		data_folders = [name for name in os.listdir(RAW_DATA_DIR)]
 
 
-full_path_raw_folders = [os.path.join(RAW_DATA_DIR, f) for f in data_folders]
-Cooking.cook(full_path_raw_folders, COOKED_DATA_DIR, train_eval_test_split, chunk_size)
\ No newline at end of file
+	full_path_raw_folders = [os.path.join(RAW_DATA_DIR, f) for f in data_folders]
+	Cooking.cook(full_path_raw_folders, COOKED_DATA_DIR, train_eval_test_split, chunk_size, num_workers=num_workers,
+				 compression=compression, resume=RESUME, seed=seed)
\ No newline at end of file
@@ -52,6 +52,7 @@
 '''
 import setup_path 
 import airsim
+from airsim.point_cloud import PointCloudWriter
 import numpy as np
 
 class LidarTest:
@@ -66,22 +67,16 @@ class LidarTest:
     def execute(self,vehicle_name,lidar_names):
         print('Scanning Has Started\n')
         print('Use Keyboard Interrupt \'CTRL + C\' to Stop Scanning\n')
-        existing_data_cleared = False   #change to true to superimpose new scans onto existing .asc files
+        existing_data_cleared = False   #change to true to superimpose new scans onto existing .ply files
         try:
             while True:
                 for lidar_name in lidar_names:
-                    filename = f"{vehicle_name}_{lidar_name}_pointcloud.asc"
-                    if not existing_data_cleared:
-                        f = open(filename,'w')
-                    else:
-                        f = open(filename,'a')
-                    lidar_data = self.client.getLidarData(lidar_name=lidar_name,vehicle_name=vehicle_name)
+                    filename = f"{vehicle_name}_{lidar_name}_pointcloud.ply"
+                    lidar_data = self.client.getLidarData(lidar_name=lidar_name,vehicle_name=vehicle_name,as_numpy=True)
 
-                    for i in range(0, len(lidar_data.point_cloud), 3):
-                        xyz = lidar_data.point_cloud[i:i+3]
-                        
-                        f.write("%f %f %f %d %d %d \n" % (xyz[0],xyz[1],xyz[2],255,255,0))
-                    f.close()
+                    points = lidar_data.point_cloud
+                    with PointCloudWriter(filename, with_color=True, append=existing_data_cleared) as writer:
+                        writer.write(points, colors=(255,255,0))
                 existing_data_cleared = True
         except KeyboardInterrupt:
             airsim.wait_key('Press any key to stop running this script')
@@ -7,14 +7,32 @@ import time
 import gym
 from gym import spaces
 from airgym.envs.airsim_env import AirSimEnv
+from airgym.envs.observation import DepthObservation
+from airgym.envs.path import Polyline
+from airsim.stepped_simulation import SteppedSimulation
+
+
+PATH = Polyline(
+    [
+        (x, y, 0)
+        for x, y in [
+            (0, -1), (130, -1), (130, 125), (0, 125),
+            (0, -1), (130, -1), (130, -128), (0, -128),
+            (0, -1),
+        ]
+    ]
+)
 
 
 class AirSimCarEnv(AirSimEnv):
-    def __init__(self, ip_address, image_shape):
+    def __init__(self, ip_address, image_shape, sim_step=None):
         super().__init__(image_shape)
 
         self.image_shape = image_shape
         self.start_ts = 0
+        # with sim_step, each step advances the paused simulation by sim_step seconds instead of sleeping for one second
+        self.sim_step = sim_step
+        self.step_result = None
 
         self.state = {
             "position": np.zeros(3),
@@ -30,10 +48,15 @@ class AirSimCarEnv(AirSimEnv):
         self.image_request = airsim.ImageRequest(
             "0", airsim.ImageType.DepthPerspective, True, False
         )
+        self.observation = DepthObservation(image_shape)
 
         self.car_controls = airsim.CarControls()
         self.car_state = None
 
+        self.sim = None
+        if sim_step is not None:
+            self.sim = SteppedSimulation(self.car, dt=sim_step, image_requests=[self.image_request]).start()
+
     def _setup_car(self):
         self.car.reset()
         self.car.enableApiControl(True)
@@ -62,29 +85,28 @@ class AirSimCarEnv(AirSimEnv):
             self.car_controls.steering = -0.25
 
         self.car.setCarControls(self.car_controls)
-        time.sleep(1)
+        if self.sim is not None:
+            self.step_result = self.sim.step()
+        else:
+            time.sleep(1)
 
     def transform_obs(self, response):
-        img1d = np.array(response.image_data_float, dtype=np.float)
-        img1d = 255 / np.maximum(np.ones(img1d.size), img1d)
-        img2d = np.reshape(img1d, (response.height, response.width))
-
-        from PIL import Image
-
-        image = Image.fromarray(img2d)
-        im_final = np.array(image.resize((84, 84)).convert("L"))
-
-        return im_final.reshape([84, 84, 1])
+        return self.observation(response)
 
     def _get_obs(self):
-        responses = self.car.simGetImages([self.image_request])
+        if self.sim is not None:
+            result = self.step_result or self.sim.capture()
+            self.step_result = None
+            responses, self.car_state, collision_info = result.images, result.state, result.collision
+        else:
+            responses = self.car.simGetImages([self.image_request], as_numpy=True)
+            self.car_state = self.car.getCarState()
+            collision_info = self.car.simGetCollisionInfo()
         image = self.transform_obs(responses[0])
 
-        self.car_state = self.car.getCarState()
-
         self.state["prev_pose"] = self.state["pose"]
         self.state["pose"] = self.car_state.kinematics_estimated
-        self.state["collision"] = self.car.simGetCollisionInfo().has_collided
+        self.state["collision"] = collision_info.has_collided
 
         return image
 
@@ -94,25 +116,8 @@ class AirSimCarEnv(AirSimEnv):
         THRESH_DIST = 3.5
         BETA = 3
 
-        pts = [
-            np.array([x, y, 0])
-            for x, y in [
-                (0, -1), (130, -1), (130, 125), (0, 125),
-                (0, -1), (130, -1), (130, -128), (0, -128),
-                (0, -1),
-            ]
-        ]
         car_pt = self.state["pose"].position.to_numpy_array()
-
-        dist = 10000000
-        for i in range(0, len(pts) - 1):
-            dist = min(
-                dist,
-                np.linalg.norm(
-                    np.cross((car_pt - pts[i]), (car_pt - pts[i + 1]))
-                )
-                / np.linalg.norm(pts[i] - pts[i + 1]),
-            )
+        dist = PATH.distance(car_pt, clamp=False)
 
         # print(dist)
         if dist > THRESH_DIST:
@@ -144,5 +149,6 @@ class AirSimCarEnv(AirSimEnv):
 
     def reset(self):
         self._setup_car()
+        self.observation.reset()
         self._do_action(1)
         return self._get_obs()
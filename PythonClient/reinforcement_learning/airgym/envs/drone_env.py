@@ -8,32 +8,77 @@ from argparse import ArgumentParser
 import gym
 from gym import spaces
 from airgym.envs.airsim_env import AirSimEnv
+from airgym.envs.observation import DepthObservation
+from airgym.envs.path import Polyline
+from airsim.stepped_simulation import SteppedSimulation
+
+
+PATH_POINTS = [
+    np.array([-0.55265, -31.9786, -19.0225]),
+    np.array([48.59735, -63.3286, -60.07256]),
+    np.array([193.5974, -55.0786, -46.32256]),
+    np.array([369.2474, 35.32137, -62.5725]),
+    np.array([541.3474, 143.6714, -32.07256]),
+]
+
+
+PATH = Polyline(PATH_POINTS)
+# drones farther than this from the path end their episode
+THRESH_DIST = 7
+
+
+def compute_reward(quad_pt, velocity, collision):
+    # also works on a batch of drones, with (N, 3) positions and velocities and (N,) collisions
+    thresh_dist = THRESH_DIST
+    beta = 1
+
+    dist = PATH.distance(quad_pt, clamp=False)
+    reward_dist = np.exp(-beta * dist) - 0.5
+    reward_speed = np.linalg.norm(velocity, axis=-1) - 0.5
+    reward = np.where(dist > thresh_dist, -10, reward_dist + reward_speed)
+    reward = np.where(collision, -100, reward)
+
+    done = (reward <= -10).astype(int)
+
+    if np.ndim(reward) == 0:
+        return float(reward), int(done)
+    return reward, done
 
 
 class AirSimDroneEnv(AirSimEnv):
-    def __init__(self, ip_address, step_length, image_shape):
+    def __init__(self, ip_address, step_length, image_shape, sim_step=None):
         super().__init__(image_shape)
         self.step_length = step_length
         self.image_shape = image_shape
+        # with sim_step, each step advances the paused simulation by sim_step seconds instead of running in real time
+        self.sim_step = sim_step
 
         self.state = {
             "position": np.zeros(3),
             "collision": False,
             "prev_position": np.zeros(3),
         }
+        self.step_result = None
 
         self.drone = airsim.MultirotorClient(ip=ip_address)
         self.action_space = spaces.Discrete(7)
-        self._setup_flight()
 
         self.image_request = airsim.ImageRequest(
             3, airsim.ImageType.DepthPerspective, True, False
         )
+        self.observation = DepthObservation(image_shape)
+        self.sim = None
+        if sim_step is not None:
+            self.sim = SteppedSimulation(self.drone, dt=sim_step, image_requests=[self.image_request])
+
+        self._setup_flight()
 
     def __del__(self):
         self.drone.reset()
 
     def _setup_flight(self):
+        if self.sim is not None:
+            self.sim.stop()
         self.drone.reset()
         self.drone.enableApiControl(True)
         self.drone.armDisarm(True)
@@ -41,35 +86,45 @@ class AirSimDroneEnv(AirSimEnv):
         # Set home position and velocity
         self.drone.moveToPositionAsync(-0.55265, -31.9786, -19.0225, 10).join()
         self.drone.moveByVelocityAsync(1, -0.67, -0.8, 5).join()
+        if self.sim is not None:
+            self.sim.start()
 
     def transform_obs(self, responses):
-        img1d = np.array(responses[0].image_data_float, dtype=np.float)
-        img1d = 255 / np.maximum(np.ones(img1d.size), img1d)
-        img2d = np.reshape(img1d, (responses[0].height, responses[0].width))
-
-        from PIL import Image
-
-        image = Image.fromarray(img2d)
-        im_final = np.array(image.resize((84, 84)).convert("L"))
-
-        return im_final.reshape([84, 84, 1])
+        return self.observation(responses[0])
 
     def _get_obs(self):
-        responses = self.drone.simGetImages([self.image_request])
+        if self.sim is not None:
+            # captured at the end of the step, or now after a reset
+            result = self.step_result or self.sim.capture()
+            self.step_result = None
+            responses, self.drone_state, collision_info = result.images, result.state, result.collision
+        else:
+            responses = self.drone.simGetImages([self.image_request], as_numpy=True)
+            self.drone_state = self.drone.getMultirotorState()
+            collision_info = self.drone.simGetCollisionInfo()
         image = self.transform_obs(responses)
-        self.drone_state = self.drone.getMultirotorState()
 
         self.state["prev_position"] = self.state["position"]
         self.state["position"] = self.drone_state.kinematics_estimated.position
         self.state["velocity"] = self.drone_state.kinematics_estimated.linear_velocity
 
-        collision = self.drone.simGetCollisionInfo().has_collided
-        self.state["collision"] = collision
+        self.state["collision"] = collision_info.has_collided
 
         return image
 
     def _do_action(self, action):
         quad_offset = self.interpret_action(action)
+        if self.sim is not None:
+            quad_vel = self.drone_state.kinematics_estimated.linear_velocity
+            self.drone.moveByVelocityAsync(
+                quad_vel.x_val + quad_offset[0],
+                quad_vel.y_val + quad_offset[1],
+                quad_vel.z_val + quad_offset[2],
+                self.sim_step,
+            )
+            self.step_result = self.sim.step()
+            return
+
         quad_vel = self.drone.getMultirotorState().kinematics_estimated.linear_velocity
         self.drone.moveByVelocityAsync(
             quad_vel.x_val + quad_offset[0],
@@ -79,61 +134,14 @@ class AirSimDroneEnv(AirSimEnv):
         ).join()
 
     def _compute_reward(self):
-        thresh_dist = 7
-        beta = 1
-
-        z = -10
-        pts = [
-            np.array([-0.55265, -31.9786, -19.0225]),
-            np.array([48.59735, -63.3286, -60.07256]),
-            np.array([193.5974, -55.0786, -46.32256]),
-            np.array([369.2474, 35.32137, -62.5725]),
-            np.array([541.3474, 143.6714, -32.07256]),
-        ]
-
-        quad_pt = np.array(
-            list(
-                (
-                    self.state["position"].x_val,
-                    self.state["position"].y_val,
-                    self.state["position"].z_val,
-                )
-            )
+        position = self.state["position"]
+        velocity = self.state["velocity"]
+        return compute_reward(
+            np.array([position.x_val, position.y_val, position.z_val]),
+            np.array([velocity.x_val, velocity.y_val, velocity.z_val]),
+            self.state["collision"],
         )
 
-        if self.state["collision"]:
-            reward = -100
-        else:
-            dist = 10000000
-            for i in range(0, len(pts) - 1):
-                dist = min(
-                    dist,
-                    np.linalg.norm(np.cross((quad_pt - pts[i]), (quad_pt - pts[i + 1])))
-                    / np.linalg.norm(pts[i] - pts[i + 1]),
-                )
-
-            if dist > thresh_dist:
-                reward = -10
-            else:
-                reward_dist = math.exp(-beta * dist) - 0.5
-                reward_speed = (
-                    np.linalg.norm(
-                        [
-                            self.state["velocity"].x_val,
-                            self.state["velocity"].y_val,
-                            self.state["velocity"].z_val,
-                        ]
-                    )
-                    - 0.5
-                )
-                reward = reward_dist + reward_speed
-
-        done = 0
-        if reward <= -10:
-            done = 1
-
-        return reward, done
-
     def step(self, action):
         self._do_action(action)
         obs = self._get_obs()
@@ -143,6 +151,7 @@ class AirSimDroneEnv(AirSimEnv):
 
     def reset(self):
         self._setup_flight()
+        self.observation.reset()
         return self._get_obs()
 
     def interpret_action(self, action):
@@ -0,0 +1,271 @@
+import airsim
+import numpy as np
+import time
+
+from gym import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from airgym.envs.drone_env import compute_reward, PATH, PATH_POINTS, THRESH_DIST
+from airgym.envs.observation import DepthObservation
+
+# attributes holding one entry per drone, which get_attr and set_attr access per index
+PER_AGENT_ATTRS = ("positions", "velocities", "collisions", "observations", "start_positions", "path_offsets")
+
+# Velocity offset of each discrete action, in units of step_length, same as AirSimDroneEnv.interpret_action
+ACTION_OFFSETS = np.array(
+    [[1, 0, 0], [0, 1, 0], [0, 0, 1], [-1, 0, 0], [0, -1, 0], [0, 0, -1], [0, 0, 0]],
+    dtype=np.float64,
+)
+
+
+class AirSimDroneVecEnv(VecEnv):
+    """
+    Vectorized version of AirSimDroneEnv, flying many drones in one or more simulators
+
+    Each simulator is given as (ip_address, port, vehicle_names). The vehicles must be declared in the simulator's
+    settings.json: AirSim sizes its RPC server thread pool once at startup, from the vehicles spawned then, and
+    each moveByVelocity holds a server thread for its whole duration. Drones added later with simAddVehicle would
+    have their moves run one after another, and in sim_step mode could starve simContinueForTime. All commands and observation requests of a step are sent before waiting on any of them,
+    pipelined over one connection per simulator, so a step costs about one round trip per simulator whatever the
+    number of drones. Observations are stacked into a single (num_envs, *image_shape) array.
+
+        env = AirSimDroneVecEnv(
+            [("127.0.0.1", 41451, ["Drone{}".format(i) for i in range(8)]),
+             ("127.0.0.1", 41452, ["Drone{}".format(i) for i in range(8)])],
+            step_length=0.25,
+            image_shape=(84, 84, 1),
+        )
+
+    Drones are reset individually, by moving them to their start position, so an episode ending for one
+    drone does not reset the others. As with other VecEnvs, done drones are reset automatically and the last
+    observation of their episode is in info["terminal_observation"]. This reset only teleports the done drones,
+    without advancing the simulations, and their start velocity is applied with their next action.
+    """
+
+    def __init__(
+        self,
+        simulators,
+        step_length,
+        image_shape,
+        action_duration=5,
+        sim_step=None,
+        start_position=PATH_POINTS[0],
+        start_spacing=2.0,
+        start_velocity=(1, -0.67, -0.8),
+        timeout_value=3600,
+    ):
+        self.step_length = step_length
+        self.image_shape = image_shape
+        # with sim_step, each step advances the paused simulations by sim_step seconds instead of running in real time
+        self.action_duration = action_duration if sim_step is None else sim_step
+        self.sim_step = sim_step
+        self.start_velocity = np.array(start_velocity, dtype=np.float64)
+
+        self.clients = []
+        self.agents = []
+        for ip_address, port, vehicle_names in simulators:
+            client = airsim.MultirotorClient(ip=ip_address, port=port, timeout_value=timeout_value)
+            client.confirmConnection()
+            self.clients.append(client)
+            missing = sorted(set(vehicle_names) - set(client.listVehicles()))
+            if missing:
+                raise ValueError(
+                    "Vehicles {} are not in the settings.json of the simulator at {}:{}, declare every drone there "
+                    "so the RPC server has a thread for each of them".format(missing, ip_address, port)
+                )
+            for vehicle_name in vehicle_names:
+                self.agents.append((client, vehicle_name))
+
+        num_envs = len(self.agents)
+        super().__init__(
+            num_envs,
+            spaces.Box(0, 255, shape=image_shape, dtype=np.uint8),
+            spaces.Discrete(len(ACTION_OFFSETS)),
+        )
+
+        # drones of the same simulator start side by side, so they do not collide with each other
+        slots = {}
+        self.start_positions = np.empty((num_envs, 3))
+        for i, (client, _) in enumerate(self.agents):
+            slot = slots.setdefault(id(client), 0)
+            slots[id(client)] = slot + 1
+            self.start_positions[i] = np.asarray(start_position) + (0, slot * start_spacing, 0)
+
+        # each drone follows the path shifted by its start offset, so the side by side starts are all on their path
+        self.path_offsets = self.start_positions - np.asarray(start_position)
+        start_distances = PATH.distance(self.start_positions - self.path_offsets, clamp=False)
+        if np.any(start_distances >= THRESH_DIST):
+            raise ValueError(
+                "start_position {} is {:.1f} m from the path, drones must start within {} m of it".format(
+                    start_position, start_distances.max(), THRESH_DIST
+                )
+            )
+
+        self.image_request = airsim.ImageRequest(
+            3, airsim.ImageType.DepthPerspective, True, False
+        )
+        self.stages = [DepthObservation(image_shape) for _ in range(num_envs)]
+        self.positions = np.zeros((num_envs, 3))
+        self.velocities = np.zeros((num_envs, 3))
+        self.collisions = np.zeros(num_envs, dtype=bool)
+        self.observations = np.zeros((num_envs,) + tuple(image_shape), dtype=np.uint8)
+        self.actions = None
+
+        self.pipelines = {id(client): client.pipelined() for client in self.clients}
+        futures = []
+        for client, vehicle_name in self.agents:
+            pipeline = self.pipelines[id(client)]
+            futures.append(pipeline.enableApiControl(True, vehicle_name))
+            futures.append(pipeline.armDisarm(True, vehicle_name))
+        for future in futures:
+            future.join()
+
+        if sim_step is not None:
+            for client in self.clients:
+                client.simPause(True)
+
+    def _pipeline(self, index):
+        client, vehicle_name = self.agents[index]
+        return self.pipelines[id(client)], vehicle_name
+
+    def _teleport(self, indices):
+        for i in indices:
+            self.stages[i].reset()
+        futures = []
+        for i in indices:
+            pipeline, vehicle_name = self._pipeline(i)
+            pose = airsim.Pose(airsim.Vector3r(*self.start_positions[i]))
+            futures.append(pipeline.simSetVehiclePose(pose, True, vehicle_name))
+        for future in futures:
+            future.join()
+
+    def _reset_agents(self, indices):
+        self._teleport(indices)
+        futures = []
+        for i in indices:
+            client, vehicle_name = self.agents[i]
+            futures.append(client.moveByVelocityAsync(*self.start_velocity, self.action_duration, vehicle_name=vehicle_name))
+        self._run(futures)
+
+    def _run(self, move_futures):
+        # moves run for action_duration in real time, or for one step of the paused simulations
+        if self.sim_step is None:
+            for future in move_futures:
+                future.join()
+            return
+
+        for client in self.clients:
+            client.simContinueForTime(self.sim_step)
+        for client in self.clients:
+            while not client.simIsPause():
+                time.sleep(0.001)
+
+    def _capture(self, indices):
+        futures = []
+        for i in indices:
+            pipeline, vehicle_name = self._pipeline(i)
+            futures.append(
+                (
+                    pipeline.simGetImages([self.image_request], vehicle_name, as_numpy=True),
+                    pipeline.getMultirotorState(vehicle_name),
+                    pipeline.simGetCollisionInfo(vehicle_name),
+                )
+            )
+
+        for i, (images, state, collision) in zip(indices, futures):
+            self.observations[i] = self.stages[i](images.join()[0])
+            kinematics = state.join().kinematics_estimated
+            self.positions[i] = kinematics.position.to_numpy_array()
+            self.velocities[i] = kinematics.linear_velocity.to_numpy_array()
+            self.collisions[i] = collision.join().has_collided
+
+    def reset(self):
+        indices = range(self.num_envs)
+        self._reset_agents(indices)
+        self._capture(indices)
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions)
+
+    def step_wait(self):
+        velocities = self.velocities + ACTION_OFFSETS[self.actions] * self.step_length
+        futures = []
+        for (client, vehicle_name), velocity in zip(self.agents, velocities):
+            futures.append(client.moveByVelocityAsync(*velocity, self.action_duration, vehicle_name=vehicle_name))
+        self._run(futures)
+
+        indices = range(self.num_envs)
+        self._capture(indices)
+
+        rewards, dones = compute_reward(self.positions - self.path_offsets, self.velocities, self.collisions)
+        rewards = rewards.astype(np.float32)
+        dones = dones.astype(bool)
+        infos = []
+        for i in indices:
+            infos.append(
+                {
+                    "position": self.positions[i].copy(),
+                    "velocity": self.velocities[i].copy(),
+                    "collision": bool(self.collisions[i]),
+                }
+            )
+
+        obs = self.observations.copy()
+        done_indices = np.flatnonzero(dones)
+        if len(done_indices):
+            for i in done_indices:
+                infos[i]["terminal_observation"] = obs[i].copy()
+            # moving the done drones would advance every simulation and leave the observations of the
+            # other drones stale, so they are only teleported, and get their start velocity with the next action
+            self._teleport(done_indices)
+            self._capture(done_indices)
+            self.velocities[done_indices] = self.start_velocity
+            obs[done_indices] = self.observations[done_indices]
+
+        return obs, rewards, dones, infos
+
+    def close(self):
+        if self.sim_step is not None:
+            for client in self.clients:
+                client.simPause(False)
+        for client, vehicle_name in self.agents:
+            client.armDisarm(False, vehicle_name)
+            client.enableApiControl(False, vehicle_name)
+
+    def seed(self, seed=None):
+        return [None] * self.num_envs
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    # the drones are not separate env objects: per drone state is read and written by index, attributes shared by
+    # all drones can only be set for all of them, and methods act on every drone so they are not dispatched per index
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        if attr_name in PER_AGENT_ATTRS:
+            return [value[i] for i in self._indices(indices)]
+        return [value for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        indices = list(self._indices(indices))
+        if attr_name in PER_AGENT_ATTRS:
+            getattr(self, attr_name)[indices] = value
+        elif sorted(indices) == list(range(self.num_envs)):
+            setattr(self, attr_name, value)
+        else:
+            raise NotImplementedError("{} is shared by all drones and cannot be set per drone".format(attr_name))
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise NotImplementedError(
+            "AirSimDroneVecEnv has no per drone envs, call {} on the VecEnv itself".format(method_name)
+        )
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
+
+    def get_images(self):
+        return list(self.observations)
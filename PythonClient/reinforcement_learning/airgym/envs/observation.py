@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+
+class DepthObservation:
+    """
+    Turns depth image responses into uint8 observations of shape image_shape
+
+    Depth is clamped to at least 1 and inverted to 255 / depth, so near obstacles are bright, then resized
+    with area interpolation. If image_shape has more than one channel, the channels hold the last
+    image_shape[2] frames, oldest first.
+
+    Decoding is zero-copy for responses of `simGetImages(..., as_numpy=True)`, and the clamp and invert are
+    done in place, so the float image of the response is overwritten. Resizing writes into buffers allocated
+    once, and each call returns a copy of the stacked frames, since vec envs keep the last observation of an
+    episode as terminal_observation while reset() builds the next one.
+    """
+
+    def __init__(self, image_shape):
+        self.image_shape = tuple(image_shape)
+        self.height, self.width, self.stack = self.image_shape
+
+        self._resized = np.empty((self.height, self.width), dtype=np.float32)
+        self._frame = np.empty((self.height, self.width), dtype=np.uint8)
+        self.obs = np.zeros(self.image_shape, dtype=np.uint8)
+        self._frames = 0
+
+    def reset(self):
+        """
+        Forgets the stacked frames, the next observation repeats its frame in every channel
+        """
+        self._frames = 0
+
+    def __call__(self, response):
+        depth = np.asarray(response.image_data_float, dtype=np.float32).reshape(response.height, response.width)
+        np.maximum(depth, 1, out=depth)
+        np.divide(255, depth, out=depth)
+
+        cv2.resize(depth, (self.width, self.height), dst=self._resized, interpolation=cv2.INTER_AREA)
+        np.copyto(self._frame, self._resized, casting="unsafe")
+
+        if self.stack == 1:
+            self.obs[..., 0] = self._frame
+        elif self._frames == 0:
+            self.obs[...] = self._frame[..., np.newaxis]
+        else:
+            self.obs[..., :-1] = self.obs[..., 1:]
+            self.obs[..., -1] = self._frame
+        self._frames += 1
+
+        return self.obs.copy()
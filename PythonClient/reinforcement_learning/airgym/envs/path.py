@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class Polyline:
+    """
+    Reference path made of straight segments between waypoints, for distance based rewards
+
+    Segment arrays are built once, and distances are computed for a batch of positions at once,
+    so reward evaluation stays cheap for long paths and many agents.
+
+        path = Polyline([(0, 0, 0), (10, 0, 0), (10, 10, 0)])
+        path.distance((5, 1, 0))                # 1.0
+        path.distance(positions)                # (N,) distances of (N, 3) positions
+
+    Waypoints and positions can be 2D or 3D, as long as they match. Consecutive duplicate
+    waypoints are ignored.
+    """
+
+    def __init__(self, waypoints):
+        waypoints = np.asarray(waypoints, dtype=np.float64)
+        if waypoints.ndim != 2 or len(waypoints) < 2:
+            raise ValueError("A polyline needs at least two waypoints, got shape {}".format(waypoints.shape))
+
+        directions = np.diff(waypoints, axis=0)
+        lengths = np.linalg.norm(directions, axis=1)
+        keep = lengths > 0
+        if not keep.any():
+            raise ValueError("All waypoints of the polyline are the same")
+
+        self.waypoints = waypoints
+        self.starts = waypoints[:-1][keep]
+        self.lengths = lengths[keep]
+        self.units = directions[keep] / self.lengths[:, np.newaxis]
+
+    def distance(self, positions, clamp=True):
+        """
+        Returns the distance from each position to the nearest segment
+
+        With clamp=False, the distance is to the infinite line through each segment instead, as the
+        sample envs have always measured it.
+
+        Args:
+            positions: A single position, or an (N, D) array of them
+
+        Returns:
+            A float for a single position, else an (N,) array
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        single = positions.ndim == 1
+        positions = np.atleast_2d(positions)
+
+        # offset of every position from the start of every segment, (N, M, D)
+        offsets = positions[:, np.newaxis, :] - self.starts[np.newaxis]
+        along = np.einsum("nmd,md->nm", offsets, self.units)
+        if clamp:
+            np.clip(along, 0, self.lengths, out=along)
+        offsets -= along[..., np.newaxis] * self.units
+        distances = np.sqrt(np.einsum("nmd,nmd->nm", offsets, offsets).min(axis=1))
+
+        return float(distances[0]) if single else distances
@@ -0,0 +1,76 @@
+"""
+Measures the per-step cost of turning a depth image response into an observation, for the
+previous PIL implementation and for DepthObservation, without a running simulator
+"""
+import setup_path
+import argparse
+import time
+
+import numpy as np
+from airsim import ImageResponse
+from airgym.envs.observation import DepthObservation
+
+
+def pil_transform(response):
+    # transform_obs of the sample envs before DepthObservation
+    img1d = np.array(response.image_data_float, dtype=np.float64)
+    img1d = 255 / np.maximum(np.ones(img1d.size), img1d)
+    img2d = np.reshape(img1d, (response.height, response.width))
+
+    from PIL import Image
+
+    image = Image.fromarray(img2d)
+    im_final = np.array(image.resize((84, 84)).convert("L"))
+
+    return im_final.reshape([84, 84, 1])
+
+
+def make_response(depth, as_numpy):
+    response = ImageResponse()
+    response.width, response.height = depth.shape[1], depth.shape[0]
+    response.image_data_float = depth.copy() if as_numpy else depth.ravel().tolist()
+    return response
+
+
+def benchmark(name, transform, responses):
+    start = time.perf_counter()
+    for response in responses:
+        transform(response)
+    elapsed = time.perf_counter() - start
+    print("{:<40} {:8.3f} ms/step".format(name, 1000 * elapsed / len(responses)))
+
+
+def check_copies(observation, response):
+    # observations are kept by vec envs and replay buffers, so a call must not overwrite the previous one
+    first = observation(response)
+    second = observation(response)
+    assert not np.shares_memory(first, second), "DepthObservation returned its internal buffer"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--height", type=int, default=144)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--stack", type=int, default=4)
+    args = parser.parse_args()
+
+    depth = np.random.default_rng(0).uniform(0.5, 100, (args.height, args.width)).astype(np.float32)
+    print("{}x{} depth image, {} steps".format(args.width, args.height, args.steps))
+
+    # responses are built up front, the conversion of as_numpy responses to arrays happens in the client
+    # while decoding the reply, and is not timed here
+    lists = [make_response(depth, False) for _ in range(args.steps)]
+    arrays = [make_response(depth, True) for _ in range(args.steps)]
+
+    check_copies(DepthObservation((84, 84, args.stack)), make_response(depth, True))
+
+    benchmark("PIL, list response", pil_transform, lists)
+    benchmark("DepthObservation, list response", DepthObservation((84, 84, 1)), lists)
+    benchmark("DepthObservation, as_numpy response", DepthObservation((84, 84, 1)), arrays)
+    arrays = [make_response(depth, True) for _ in range(args.steps)]
+    benchmark("DepthObservation, {} stacked frames".format(args.stack), DepthObservation((84, 84, args.stack)), arrays)
+
+
+if __name__ == "__main__":
+    main()